@@ -9,18 +9,20 @@ Created on Mon Oct 11 13:46:02 2021
 # from functions.dataPrepFunctions import *
 import numpy as np
 import pytz
-from datetime import datetime as dt
-from datetime import timedelta
 import datetime
-import math
-import collections
 import pandas as pd
-import tkinter as tk
 import re
 import os
-from tkinter import filedialog
-import requests
-from pandas import json_normalize
+import glob
+import time
+import concurrent.futures
+
+from areas import areaNameDict
+from daybounds import day_boundaries, assign_days, stamps_to_ns, study_dates
+from doors import door_ids_by_name, out_of_home_intervals
+from event_cache import load_events
+from instrumentation import Run, stage
+from long_store import long_from_wide, write_long
 pd.set_option('mode.chained_assignment',None)
 
 # def find_all(name, path):
@@ -32,228 +34,156 @@ pd.set_option('mode.chained_assignment',None)
 #     return result
 
 
-def areaNameDict():
-    list_of_areas = ['BATHROOM_1','BATHROOM_2','BATHROOM_3','BATHROOM_4','BATHROOM_5',
-                      'BEDROOM_1', 'BEDROOM_2','BEDROOM_3','BEDROOM_4','BEDROOM_5',
-                      'COMPUTER_ROOM_1','COMPUTER_ROOM_2',
-                      'CONFERENCE_ROOM_1','CONFERENCE_ROOM_2',
-                      'CRAFT_ROOM_1','CRAFT_ROOM_2',
-                      'DINING_ROOM_1','DINING_ROOM_2',
-                      'ENTRANCE_HALLWAY_1','ENTRANCE_HALLWAY_2',
-                      'GARAGE_1','GARAGE_2',
-                      'HALLWAY_1','HALLWAY_2','HALLWAY_3','HALLWAY_4',
-                      'KITCHEN_1','KITCHEN_2',
-                      'LAUNDRY_ROOM_1','LAUNDRY_ROOM_2',
-                      'LIBRARY_1','LIBRARY_2',
-                      'LIVING_ROOM_1','LIVING_ROOM_2',
-                      'LOUNGE_1','LOUNGE_2',
-                      'OFFICE_1','OFFICE_2',
-                      'OTHER_1','OTHER_2','OTHER_3','OTHER_4',
-                      'PARTY_ROOM_1','PARTY_ROOM_2',
-                      'SERVER_ROOM_1','SERVER_ROOM_2',
-                      'SHED_1','SHED_2',
-                      'STAIRS_1','STAIRS_2','STAIRS_3','STAIRS_4',
-                      'STUDY_1','STUDY_2',
-                      'WALK_IN_CLOSET_1','WALK_IN_CLOSET_2','WALK_IN_CLOSET_3',
-                      'SENSOR_LINE','EXTRA_SENSOR_LINE',
-                      'NONE',
-                      'BALCONY_1']
+nyce_tz = pytz.timezone('US/Pacific')
 
-    list_of_doors = (['FRONT_DOOR', 'BACK_DOOR', 'REFRIGERATOR', 'OTHER_DOOR', 'OTHER_DOOR_2',
-                      'BALCONY_DOOR', 'GARAGE_DOOR'])
+# Doors whose open/close changes split the day into in-home / out-of-home candidates
+tooh_door_names = ['FRONT_DOOR', 'BACK_DOOR', 'OTHER_DOOR', 'OTHER_DOOR_2', 'GARAGE_DOOR']
 
-    list_of_doors_CO = (['FRONT_DOOR', 'BACK_DOOR', 'GARAGE_DOOR', 'OTHER_DOOR', 'OTHER_DOOR_2', 'BALCONY_DOOR'])
 
-    list_of_actions = ['LEAVING_BEDROOM', 'LEAVING_HOME', 'IN_OUT_OF_BED', 'MEDICATION_TAKING']
+def tooh_daily(nyce, unique_date, areaDicts, door_ids=None):
+    """
+    Hours out of home per local day, for every day of one home at once.
 
+    A gap between two consecutive door changes (or a day bound) counts as out of home when
+    fewer than one in-home area activation per hour happened strictly inside it.
 
-    areaDict = {}
-    r = requests.get("https://api.orcatech.org/orcatech/latest/homes/areas")
-    if r.status_code ==200:
-        df = json_normalize(r.json())
-        df["areaname"] = df["areaname"].replace(" ", "_", regex=True).str.upper()
-        areaDict["AreaID"] = df[df.areaname.isin(list_of_areas)].set_index("areaid").to_dict()["areaname"]
-        areaDict["DoorID"] = df[df.areaname.isin(list_of_doors)].set_index("areaid").to_dict()["areaname"]
-        areaDict["ActionID"] = df[df.areaname.isin(list_of_actions)].set_index("areaid").to_dict()["areaname"]
-        areaDict["DoorsID_CO"] = df[df.areaname.isin(list_of_doors_CO)].set_index("areaid").to_dict()["areaname"]
-        # .set_index("areaid").to_dict()["areaname"]
+    Args:
+        nyce (pd.DataFrame): Events of one home with 'stamp' (UTC), 'areaid' and 'event'
+        unique_date (pd.DatetimeIndex): Consecutive local dates; day m runs from
+            unique_date[m] to unique_date[m + 1]
+        areaDicts (dict): Output of areaNameDict()
+        door_ids (list, optional): Doors to segment on; defaults to tooh_door_names
 
+    Returns:
+        tuple: (pd.Series of hours indexed by unique_date[:-1], pd.DataFrame of
+        out-of-home periods with 'start', 'end' and 'durations')
+    """
+    if door_ids is None:
+        door_ids = [d for d in door_ids_by_name(tooh_door_names) if d in areaDicts["DoorsID_CO"]]
 
-    return areaDict
+    n_days = len(unique_date) - 1
+    bounds = day_boundaries(unique_date, nyce_tz)
+    stamps = stamps_to_ns(nyce['stamp'])
+    areaid = nyce['areaid'].values
+    event = nyce['event'].values
+    day = assign_days(stamps, bounds)
+    in_range = day >= 0
 
+    # No events: NaN, no activations at all: 24 hours out, otherwise sum the out-of-home gaps
+    daily_summary = np.full(n_days, np.nan)
+    has_data = np.bincount(day[in_range], minlength=n_days) > 0
+    has_activation = np.bincount(day[in_range & (event == 1)], minlength=n_days) > 0
+    daily_summary[has_data] = 24
+    scored = has_data & has_activation
+    daily_summary[scored] = 0
 
+    start, end, ooh_day, durations = out_of_home_intervals(
+        stamps, areaid, event, day, bounds, np.flatnonzero(scored), door_ids, list(areaDicts['AreaID'].keys())
+    )
+    daily_summary[scored] += np.bincount(ooh_day, weights=durations / 3600, minlength=n_days)[scored]
 
-
-
-
-# single_residents = pd.read_csv(r"C:\Users\auyeungm\Box\My Files\Single_Resident_Homes_CART.csv")
-unique_date = pd.date_range(start= '2022-01-01', end = str(datetime.date.today()))
-
-#folder = r"C:\Users\auyeungm\OneDrive - Oregon Health & Science University\ADA - ORCATECH\ADA_DataPull_2024-09-19\NYCE_Data_Pull_ADA_2024-09-19"
-
-folder = r"C:\Users\ufone\OneDrive\Documents\DETECT\DETECT_DataPull_2024-09-23\NYCE_Data_Pull_DETECT_2024-09-23"
-
-areaDicts = areaNameDict()
-
-all_home_summary = pd.DataFrame(index = unique_date[:-1])
-file_list =os.listdir(folder)         
-            
-
-nyce_tz = pytz.timezone('US/Pacific')        
-
-for file in file_list:
-
-    file_path = folder + os.path.sep + file
-    nyce = pd.read_csv(file_path)
-    
-    #    nyce = rawDataPullerNYCE(sensorList, token, time_lb, time_ub)
-    # nyce = nyce[~((nyce['areaid'].apply(lambda a: a in list(areaDicts['AreaID'].keys()))) & (nyce['event'] == 49))]  # Remove "door opening" events in areas
-    nyce['local_t']= pd.to_datetime(nyce['stamp']).apply(lambda d: d.tz_localize('UTC').tz_convert(nyce_tz))    
-    nyce['local_t'] = pd.to_datetime(nyce['local_t'])
-    nyce['local_t_index'] = nyce['local_t']
-    nyce = nyce.sort_values("stamp")
-    nyce.set_index('local_t_index', inplace=True)
-    
-     
-    
-    
-    
-    
-     
-    daily_summary = pd.Series(index = unique_date[:-1], data =0)
     times_ooh = pd.DataFrame()
-    start_times=[]
-    end_times=[]
-    durations =[]
-    
-    for m in range(unique_date.__len__()-1):
-        
-        
-        
-        test_start_dt = dt.strptime(str(unique_date[m]), "%Y-%m-%d %H:%M:%S")
-        test_end_dt = dt.strptime(str(unique_date[m+1]), "%Y-%m-%d %H:%M:%S")
-    
-     
-    
-        test_start_dt_tzaware = nyce_tz.localize(test_start_dt)
-        test_end_dt_tzaware = nyce_tz.localize(test_end_dt)
-    
-     
-    
-        try:
-            nyce_one_day = nyce[str(unique_date[m]).split()[0]] 
-        
-        except:
-            daily_summary.loc[unique_date[m]] = np.nan
-            continue
-        
-        unique_areaids = list(nyce_one_day.areaid.unique())
-        
-        
-        unique_areaids = list(set(unique_areaids).difference(set(areaDicts["DoorsID_CO"].keys())))
-    
-    
-        if not nyce_one_day.empty:
-    
-     
-    
-     
-    
-            if (nyce_one_day[nyce_one_day.event == 1].shape[0]==0):
-                daily_summary.loc[unique_date[m]]=24
-    
-     
-    
-            else:
-    
-     
-    
-    
-                nyce_door_co = nyce_one_day[nyce_one_day['areaid'].apply(lambda a: a in list(areaDicts["DoorsID_CO"].keys()))]
-                
-                front_door = nyce_door_co[nyce_door_co.areaid == 56]
-                
-                front_door_open = front_door[front_door.event.diff()==1]
-                front_door_close = front_door[front_door.event.diff()==-1]
-                            
-                back_door = nyce_door_co[nyce_door_co.areaid ==57]
-                
-                back_door_open = back_door[back_door.event.diff()==1]
-                back_door_close = back_door[back_door.event.diff()==-1]
-                
-                
-                other_door = nyce_door_co[nyce_door_co.areaid ==59]
-            
-                other_door_open = other_door[other_door.event.diff()==1]
-                other_door_close = other_door[other_door.event.diff()==-1]
-                
-                other_door_2 = nyce_door_co[nyce_door_co.areaid ==62]
-                
-                other_door_2_open = other_door_2[other_door_2.event.diff()==1]
-                other_door_2_close = other_door_2[other_door_2.event.diff()==-1]
-            
-                garage_door = nyce_door_co[nyce_door_co.areaid ==61]
-                
-                garage_door_open = garage_door[garage_door.event.diff()==1]
-                garage_door_close = garage_door[garage_door.event.diff()==-1]
-                
-                
-                all_door_changes =pd.DataFrame()
-                all_door_changes = all_door_changes.append(front_door_open, ignore_index=True)
-                all_door_changes = all_door_changes.append(front_door_close, ignore_index=True)
-                all_door_changes = all_door_changes.append(back_door_open, ignore_index=True)
-                all_door_changes = all_door_changes.append(back_door_close, ignore_index=True)
-                all_door_changes = all_door_changes.append(other_door_open, ignore_index=True)
-                all_door_changes = all_door_changes.append(other_door_close, ignore_index=True)            
-                all_door_changes = all_door_changes.append(other_door_2_open, ignore_index=True)
-                all_door_changes = all_door_changes.append(other_door_2_close, ignore_index=True)             
-                all_door_changes = all_door_changes.append(garage_door_open, ignore_index=True)
-                all_door_changes = all_door_changes.append(garage_door_close, ignore_index=True)  
-                
-                
-                
-                
-                all_door_changes.sort_values(by = "stamp", inplace = True)
-                
-                all_door_changes_local_t = all_door_changes.local_t.tolist()
-                all_door_changes_local_t.insert(0, test_start_dt_tzaware)
-                all_door_changes_local_t.append(test_end_dt_tzaware)
-    
-                
-    
-                
-                for i in range(len(all_door_changes_local_t) - 1):
-                    temp = nyce_one_day[(nyce_one_day.local_t>all_door_changes_local_t[i]) & (nyce_one_day.local_t<all_door_changes_local_t[i + 1])]
-                    areas = list(areaDicts['AreaID'].keys())
-                    temp = temp[temp.areaid.isin(areas)]
-                    
-                    try:
-                        if temp[temp.event==1].shape[0]*3600/(all_door_changes_local_t[i + 1]-all_door_changes_local_t[i]).total_seconds()<1:
-                            start_time = all_door_changes_local_t[i]
-                            end_time = all_door_changes_local_t[i+1]
-                            daily_summary.loc[unique_date[m]] = daily_summary.loc[unique_date[m]] + (end_time-start_time).total_seconds()/60/60
-                            start_times.append(start_time)
-                            end_times.append(end_time)
-                            durations.append((end_time-start_time).total_seconds())
-                    
-                    except:
-                        pass
-                     
-        elif (nyce_one_day.empty):
-            daily_summary.loc[unique_date[m]] = np.nan
-        print(file)
-        print(unique_date[m])
-    
-    times_ooh['start'] = start_times
-    times_ooh['end'] = end_times
+    times_ooh['start'] = pd.to_datetime(start, utc=True).tz_convert(nyce_tz)
+    times_ooh['end'] = pd.to_datetime(end, utc=True).tz_convert(nyce_tz)
     times_ooh['durations'] = durations
-    # times_ooh.to_csv('C:/Users/auyeungm/OneDrive - Oregon Health & Science University/From_Box/My Files/Project - MODERATE/' + file + '_times_ooh_only_door_changes.csv')
-    all_home_summary[re.sub("[^0-9]", "", file) ] = daily_summary.values
-    
-#all_home_summary.to_csv('C:/Users/auyeungm/OneDrive - Oregon Health & Science University/From_Box/My Files/Project - ADA/' + str(datetime.date.today()) + '_ADA_in-home_NYCE_TOOH_only_door_changes.csv')
+    return pd.Series(daily_summary, index=unique_date[:-1]), times_ooh
+
+
+def tooh_home(file_path, unique_date=None):
+    """
+    TOOH hours per day for one home file.
+
+    Args:
+        file_path (str): Path to a NYCE_Area_Data_DETECT_<home>.csv file
+        unique_date (pd.DatetimeIndex, optional): Defaults to study_dates()
+
+    Returns:
+        pd.Series: Hours indexed by unique_date[:-1], named after the homeid
+    """
+    if unique_date is None:
+        unique_date = study_dates()
+    with stage('load') as s:
+        nyce = load_events(file_path)
+        s.rows_out = len(nyce)
+    with stage('tooh_daily', len(nyce)) as s:
+        daily_summary, times_ooh = tooh_daily(nyce, unique_date, areaNameDict())
+        s.rows_out = len(daily_summary)
+    # times_ooh.to_csv('C:/Users/auyeungm/OneDrive - Oregon Health & Science University/From_Box/My Files/Project - MODERATE/' + os.path.basename(file_path) + '_times_ooh_only_door_changes.csv')
+    return daily_summary.rename(re.sub("[^0-9]", "", os.path.basename(file_path)))
+
+
+def directory(input_dir, output, max_workers=None, unique_date=None, metrics_path=None, profile_top=0,
+              long_output=None):
+    """
+    Compute TOOH for every home file of a pull folder in parallel and write the wide summary.
+
+    Args:
+        input_dir (str): NYCE_Data_Pull folder with NYCE_Area_Data_DETECT_<home>.csv files
+        output (str): Output csv path (one column per homeid, one row per date); None to only
+            write long_output
+        max_workers (int, optional): Worker processes, defaults to the number of cores
+        unique_date (pd.DatetimeIndex, optional): Defaults to study_dates()
+        metrics_path (str, optional): Append per-home stage timings to this JSON lines file
+            (see instrumentation.Run)
+        profile_top (int): Keep cProfile stats of this many slowest homes next to the metrics
+        long_output (str, optional): Also write the non-empty cells as a long, compressed store
+            (home, date, 'tooh_hours', value) to this directory, see long_store.py; the wide csv can
+            be exported from it again with long_store.wide_view
+
+    Returns:
+        pd.DataFrame: The all_home_summary that was written
+    """
+    start_time = time.time()
+    if unique_date is None:
+        unique_date = study_dates()
+    data_files = sorted(glob.glob(os.path.join(input_dir, "*NYCE_Area_Data_DETECT_*.csv")))
+
+    run = Run('tooh', len(data_files), metrics_path, profile_top)
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            run.submit(executor, tooh_home, f, unique_date): f
+            for f in data_files
+        }
+
+        for future in concurrent.futures.as_completed(futures):
+            file_path = futures[future]
+            try:
+                results[file_path] = run.result(future)
+            except Exception as e:
+                run.failed()
+                print(f"Error processing {file_path}: {e}")
+
+    all_home_summary = pd.DataFrame(index = unique_date[:-1])
+    for f in data_files:
+        if f in results:
+            all_home_summary[results[f].name] = results[f].values
+    if long_output:
+        with run.stage('write_long', len(all_home_summary)) as s:
+            columns = long_from_wide(all_home_summary, 'tooh_hours')
+            write_long(long_output, columns)
+            s.rows_out = columns['value'].size
+    if output:
+        with run.stage('to_csv', len(all_home_summary)):
+            all_home_summary.to_csv(output)
+    run.close()
+    print(f"Processing completed in {time.time() - start_time:.2f} seconds")
+    return all_home_summary
+
+
+if __name__ == "__main__":
+    # single_residents = pd.read_csv(r"C:\Users\auyeungm\Box\My Files\Single_Resident_Homes_CART.csv")
+
+    #folder = r"C:\Users\auyeungm\OneDrive - Oregon Health & Science University\ADA - ORCATECH\ADA_DataPull_2024-09-19\NYCE_Data_Pull_ADA_2024-09-19"
+
+    folder = r"C:\Users\ufone\OneDrive\Documents\DETECT\DETECT_DataPull_2024-09-23\NYCE_Data_Pull_DETECT_2024-09-23"
+
+    #output = 'C:/Users/auyeungm/OneDrive - Oregon Health & Science University/From_Box/My Files/Project - ADA/' + str(datetime.date.today()) + '_ADA_in-home_NYCE_TOOH_only_door_changes.csv'
+
+    output = 'C:/Users/ufone/OneDrive/Documents/DETECT/DETECT_DataPull_2024-09-23/' + str(datetime.date.today()) + '_ADA_in-home_NYCE_TOOH_only_door_changes.csv'
+
+    directory(folder, output, max_workers=None, unique_date=study_dates('2022-01-01'))
 
-all_home_summary.to_csv('C:/Users/ufone/OneDrive/Documents/DETECT/DETECT_DataPull_2024-09-23/' + str(datetime.date.today()) + '_ADA_in-home_NYCE_TOOH_only_door_changes.csv')    
-    
 #%%
 
 # import matplotlib.pyplot as plt
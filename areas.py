@@ -0,0 +1,188 @@
+import os
+import json
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+AREAS_URL = os.environ.get('ORCATECH_AREAS_URL', "https://api.orcatech.org/orcatech/latest/homes/areas")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+AREA_DICTIONARY = os.path.join(HERE, 'area_dictionary.xlsx')
+REGISTRY_PATH = os.environ.get('NYCE_AREA_REGISTRY', os.path.join(HERE, 'area_registry.json'))
+
+# Area categories returned by categories()
+ROOM, DOOR, ACTION, NON_AREA = 0, 1, 2, 3
+
+list_of_areas = ['BATHROOM_1','BATHROOM_2','BATHROOM_3','BATHROOM_4','BATHROOM_5',
+                 'BEDROOM_1', 'BEDROOM_2','BEDROOM_3','BEDROOM_4','BEDROOM_5',
+                 'COMPUTER_ROOM_1','COMPUTER_ROOM_2',
+                 'CONFERENCE_ROOM_1','CONFERENCE_ROOM_2',
+                 'CRAFT_ROOM_1','CRAFT_ROOM_2',
+                 'DINING_ROOM_1','DINING_ROOM_2',
+                 'ENTRANCE_HALLWAY_1','ENTRANCE_HALLWAY_2',
+                 'GARAGE_1','GARAGE_2',
+                 'HALLWAY_1','HALLWAY_2','HALLWAY_3','HALLWAY_4',
+                 'KITCHEN_1','KITCHEN_2',
+                 'LAUNDRY_ROOM_1','LAUNDRY_ROOM_2',
+                 'LIBRARY_1','LIBRARY_2',
+                 'LIVING_ROOM_1','LIVING_ROOM_2',
+                 'LOUNGE_1','LOUNGE_2',
+                 'OFFICE_1','OFFICE_2',
+                 'OTHER_1','OTHER_2','OTHER_3','OTHER_4',
+                 'PARTY_ROOM_1','PARTY_ROOM_2',
+                 'SERVER_ROOM_1','SERVER_ROOM_2',
+                 'SHED_1','SHED_2',
+                 'STAIRS_1','STAIRS_2','STAIRS_3','STAIRS_4',
+                 'STUDY_1','STUDY_2',
+                 'WALK_IN_CLOSET_1','WALK_IN_CLOSET_2','WALK_IN_CLOSET_3',
+                 'SENSOR_LINE','EXTRA_SENSOR_LINE',
+                 'NONE',
+                 'BALCONY_1']
+
+list_of_doors = ['FRONT_DOOR', 'BACK_DOOR', 'REFRIGERATOR', 'OTHER_DOOR', 'OTHER_DOOR_2',
+                 'BALCONY_DOOR', 'GARAGE_DOOR']
+
+list_of_doors_CO = ['FRONT_DOOR', 'BACK_DOOR', 'GARAGE_DOOR', 'OTHER_DOOR', 'OTHER_DOOR_2', 'BALCONY_DOOR']
+
+list_of_actions = ['LEAVING_BEDROOM', 'LEAVING_HOME', 'IN_OUT_OF_BED', 'MEDICATION_TAKING']
+
+
+def normalize_name(name):
+    return str(name).replace(" ", "_").upper()
+
+
+class AreaRegistry:
+    """
+    Area id -> name map with O(1) name lookups and vectorized category lookups.
+
+    Args:
+        names (dict): areaid (int) -> area name as written in area_dictionary.xlsx
+    """
+
+    def __init__(self, names):
+        self.names = {int(k): v for k, v in names.items()}
+        normalized = {k: normalize_name(v) for k, v in self.names.items()}
+
+        self.room_ids = sorted(k for k, v in normalized.items() if v in list_of_areas)
+        self.door_ids = sorted(k for k, v in normalized.items() if v in list_of_doors)
+        self.door_co_ids = sorted(k for k, v in normalized.items() if v in list_of_doors_CO)
+        self.action_ids = sorted(k for k, v in normalized.items() if v in list_of_actions)
+
+        # Dense lookup table indexed by areaid + 1 so that -1 (unassigned sensor) is slot 0
+        size = max(self.names, default=0) + 2
+        self._categories = np.full(size, NON_AREA, dtype=np.int8)
+        self._categories[np.array(self.room_ids, dtype=np.int64) + 1] = ROOM
+        self._categories[np.array(self.door_ids, dtype=np.int64) + 1] = DOOR
+        self._categories[np.array(self.action_ids, dtype=np.int64) + 1] = ACTION
+
+    def name(self, areaid):
+        return self.names.get(int(areaid), f'Area_{areaid}')
+
+    def categories(self, areaids):
+        """
+        Category (ROOM, DOOR, ACTION or NON_AREA) of every area id in an array.
+        """
+        idx = np.asarray(areaids, dtype=np.int64) + 1
+        out = np.full(idx.shape, NON_AREA, dtype=np.int8)
+        known = (idx >= 0) & (idx < self._categories.size)
+        out[known] = self._categories[idx[known]]
+        return out
+
+    def area_name_dict(self):
+        """
+        The {"AreaID", "DoorID", "ActionID", "DoorsID_CO"} dicts ILSA and TOOH work with.
+        """
+        def pick(ids):
+            return {i: normalize_name(self.names[i]) for i in ids}
+        return {
+            "AreaID": pick(self.room_ids),
+            "DoorID": pick(self.door_ids),
+            "ActionID": pick(self.action_ids),
+            "DoorsID_CO": pick(self.door_co_ids),
+        }
+
+
+def names_from_dictionary(path=AREA_DICTIONARY):
+    """
+    Read areaid -> areaname from area_dictionary.xlsx (needs openpyxl).
+    """
+    df = pd.read_excel(path)
+    df['areaname'] = df['areaname'].fillna('None')
+    return dict(zip(df['areaid'].astype(int), df['areaname'].astype(str)))
+
+
+def names_from_api(url=AREAS_URL, timeout=10):
+    """
+    Fetch areaid -> areaname from the ORCATECH areas endpoint.
+    """
+    import requests
+
+    r = requests.get(url, timeout=timeout)
+    r.raise_for_status()
+    df = pd.json_normalize(r.json())
+    return dict(zip(df['areaid'].astype(int), df['areaname'].fillna('None').astype(str)))
+
+
+def build_registry(source='dictionary', path=REGISTRY_PATH, url=AREAS_URL, timeout=10):
+    """
+    Compile the local registry cache.
+
+    Args:
+        source (str): 'dictionary' to read area_dictionary.xlsx, 'api' to fetch from url
+        path (str): Where to write the compiled cache
+        url (str): Areas endpoint, e.g. a local stand-in server
+        timeout (float): Request timeout in seconds for source='api'
+
+    Returns:
+        AreaRegistry: The freshly compiled registry; when the api cannot be reached, the
+            registry already at path (or compiled from area_dictionary.xlsx) is kept
+    """
+    if source == 'api':
+        try:
+            names = names_from_api(url, timeout)
+        except (OSError, ValueError) as e:
+            # requests' errors are OSErrors, bad JSON a ValueError
+            print(f"Could not refresh areas from {url}: {e}; keeping the local registry")
+            get_registry.cache_clear()
+            return get_registry(path)
+    else:
+        names = names_from_dictionary()
+
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'w') as f:
+        json.dump({'source': url if source == 'api' else os.path.basename(AREA_DICTIONARY),
+                   'areas': {str(k): v for k, v in sorted(names.items())}}, f, indent=1)
+    os.replace(tmp, path)
+    get_registry.cache_clear()
+    return AreaRegistry(names)
+
+
+@lru_cache(maxsize=None)
+def get_registry(path=REGISTRY_PATH):
+    """
+    The area registry, loaded from the compiled cache; never touches the network.
+    """
+    if not os.path.exists(path):
+        return build_registry('dictionary', path)
+    with open(path) as f:
+        return AreaRegistry(json.load(f)['areas'])
+
+
+def area_name(areaid):
+    return get_registry().name(areaid)
+
+
+def categories(areaids):
+    return get_registry().categories(areaids)
+
+
+def areaNameDict():
+    return get_registry().area_name_dict()
+
+
+if __name__ == "__main__":
+    import sys
+
+    registry = build_registry(sys.argv[1] if len(sys.argv) > 1 else 'dictionary')
+    print(f"Wrote {len(registry.names)} areas to {REGISTRY_PATH}")
@@ -0,0 +1,178 @@
+import os
+import time
+import argparse
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+import ILSA
+import TOOH
+import raw
+import self_script
+from event_cache import load_events
+from plotTime import filter_transitions
+from shared_state import SLEEP_PATH, SUBJECTS_PATH, reset_state
+from synthetic_data import generate_pull
+
+
+def _unique_date(nyce):
+    first = nyce['stamp'].min().normalize() - pd.Timedelta(days=1)
+    last = nyce['stamp'].max().normalize() + pd.Timedelta(days=2)
+    return pd.date_range(first, last)
+
+
+def _dwell_times(nyce):
+    # getDwellTimes works on one area at a time, as the scripts call it
+    nyce = nyce.assign(unix=nyce['stamp'].values.astype('datetime64[s]').astype(np.int64))
+    return [ILSA.getDwellTimes(group) for _, group in nyce.groupby('areaid')]
+
+
+def _events(f):
+    return (load_events(f),)
+
+
+def _daily(f):
+    nyce = load_events(f)
+    return nyce, _unique_date(nyce)
+
+
+# Benchmarked entry points: name -> (input kind, setup(path) -> args, call(*args)).
+# Setup (csv parsing for the frame based ones) is not timed.
+ENTRY_POINTS = {
+    'getDwellTimes': ('area', _events, _dwell_times),
+    'ilsa_daily': ('area', _daily, ILSA.ilsa_daily),
+    'tooh_daily': ('area', lambda f: _daily(f) + (TOOH.areaNameDict(),), TOOH.tooh_daily),
+    'calculate_daily_area_occupancy': ('area', lambda f: (f,), self_script.calculate_daily_area_occupancy),
+    'filter_transitions': ('area', _events, filter_transitions),
+    'calculate_most_activation': ('watch', lambda f: (f, [(4, 1)], False), raw.most_activation),
+}
+
+
+@contextmanager
+def _in_pull(pull_dir):
+    # The entry points look subjects and sleep windows up in the pull's subid_homeid.csv and sleep_summary.csv
+    reset_state(os.path.join(pull_dir, SUBJECTS_PATH), os.path.join(pull_dir, SLEEP_PATH))
+    try:
+        yield
+    finally:
+        reset_state()
+
+
+def time_call(call, args, repeat=3):
+    """
+    Median wall time of call(*args) after one warm-up call, and its peak traced memory.
+
+    Args:
+        call (callable): Function to time
+        args (tuple): Its arguments
+        repeat (int): Timed calls
+
+    Returns:
+        tuple: (seconds, peak_bytes); peak_bytes comes from a separate tracemalloc run
+    """
+    call(*args)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        call(*args)
+        times.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    try:
+        call(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return float(np.median(times)), peak
+
+
+def benchmark_pull(pull_dir, entry_points=None, repeat=3):
+    """
+    Time every entry point on every file of a pull.
+
+    Args:
+        pull_dir (str): Directory from synthetic_data.generate_pull (or any pull with the two
+            subject csvs next to the files)
+        entry_points (list, optional): Names from ENTRY_POINTS, defaults to all
+        repeat (int): Timed calls per file
+
+    Returns:
+        pd.DataFrame: One row per entry point: files, rows (events or watch readings), seconds
+            (summed over files), rows_per_s and peak_mb (largest single file)
+    """
+    pull_dir = os.path.abspath(pull_dir)
+    patterns = {'area': "NYCE_Area_Data_DETECT_", 'watch': "Watch_Raw_Data_DETECT_"}
+    files = {
+        kind: sorted(os.path.join(pull_dir, f) for f in os.listdir(pull_dir) if f.startswith(prefix))
+        for kind, prefix in patterns.items()
+    }
+
+    results = []
+    with _in_pull(pull_dir):
+        for name in entry_points or ENTRY_POINTS:
+            kind, setup, call = ENTRY_POINTS[name]
+            rows, seconds, peak = 0, 0.0, 0
+            for f in files[kind]:
+                rows += len(pd.read_csv(f, usecols=[0]))
+                elapsed, file_peak = time_call(call, setup(f), repeat)
+                seconds += elapsed
+                peak = max(peak, file_peak)
+            results.append({
+                'entry_point': name,
+                'files': len(files[kind]),
+                'rows': rows,
+                'seconds': seconds,
+                'rows_per_s': rows / seconds if seconds else np.nan,
+                'peak_mb': peak / 2**20,
+            })
+    return pd.DataFrame(results)
+
+
+def scaling(work_dir, densities=(1, 2, 4, 8), home_counts=(1, 2, 4), days=14, entry_points=None,
+            repeat=3, seed=0):
+    """
+    Benchmark every entry point over synthetic pulls of growing event density and home count.
+
+    Args:
+        work_dir (str): Pulls are generated under work_dir/density_<d>_homes_<h>
+        densities (tuple): Awake room visits per hour (see synthetic_data.simulate_home)
+        home_counts (tuple): Homes per pull
+        days (int): Days per home
+        entry_points (list, optional): Names from ENTRY_POINTS, defaults to all
+        repeat (int): Timed calls per file
+        seed (int): Generator seed
+
+    Returns:
+        pd.DataFrame: benchmark_pull rows with their 'density' and 'homes'
+    """
+    results = []
+    for density in densities:
+        for homes in home_counts:
+            pull_dir = os.path.join(work_dir, f"density_{density}_homes_{homes}")
+            generate_pull(pull_dir, homes=homes, days=days, visits_per_hour=density, seed=seed)
+            result = benchmark_pull(pull_dir, entry_points, repeat)
+            result.insert(0, 'homes', homes)
+            result.insert(0, 'density', density)
+            results.append(result)
+            print(result.to_string(index=False))
+    return pd.concat(results, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the NYCE and watch entry points on synthetic data.")
+    parser.add_argument('work_dir')
+    parser.add_argument('--densities', type=float, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--homes', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--entry-points', nargs='+', choices=list(ENTRY_POINTS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Csv of the results, to compare against a later run")
+    args = parser.parse_args()
+
+    results = scaling(args.work_dir, args.densities, args.homes, args.days, args.entry_points, args.repeat)
+    # Throughput of each entry point by event density and by home count
+    for column in ('density', 'homes'):
+        print(results.pivot_table(index='entry_point', columns=column, values='rows_per_s').round(0).to_string())
+    if args.output:
+        results.to_csv(args.output, index=False)
@@ -0,0 +1,54 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytz
+
+nyce_tz = pytz.timezone("US/Pacific")
+
+
+def day_boundaries(unique_date, tz=nyce_tz):
+    """
+    DST-aware table of local midnights as UTC nanoseconds.
+
+    Day m spans [bounds[m], bounds[m + 1]), so a table built from N dates describes N - 1 days,
+    the same way ILSA.py and TOOH.py walk unique_date[m] to unique_date[m + 1].
+
+    Args:
+        unique_date (pd.DatetimeIndex): Consecutive naive local dates
+        tz (pytz.timezone): Local timezone of the homes
+
+    Returns:
+        np.ndarray: int64 UTC nanoseconds of every local midnight
+    """
+    local = pd.DatetimeIndex(unique_date).tz_localize(tz)
+    return local.tz_convert("UTC").asi8
+
+
+def assign_days(stamps_ns, bounds):
+    """
+    Local day index of every timestamp.
+
+    Args:
+        stamps_ns (np.ndarray): int64 UTC nanoseconds
+        bounds (np.ndarray): Output of day_boundaries
+
+    Returns:
+        np.ndarray: Day index per stamp, -1 for stamps outside the table
+    """
+    day = np.searchsorted(bounds, stamps_ns, side="right") - 1
+    day[day >= len(bounds) - 1] = -1
+    return day
+
+
+def stamps_to_ns(stamps):
+    """
+    Convert a naive UTC 'stamp' column to int64 nanoseconds.
+    """
+    return pd.to_datetime(stamps).values.astype("datetime64[ns]").astype(np.int64)
+
+
+def study_dates(start='2022-01-01', end=None):
+    """
+    The unique_date range the daily summaries are indexed by: start through today.
+    """
+    return pd.date_range(start=start, end=end or str(datetime.date.today()))
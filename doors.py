@@ -0,0 +1,101 @@
+import numpy as np
+
+from areas import get_registry, normalize_name
+
+
+def door_ids_by_name(names, registry=None):
+    """
+    Area ids of the doors with the given normalized names (e.g. 'FRONT_DOOR').
+    """
+    registry = registry or get_registry()
+    wanted = set(names)
+    return [i for i in registry.door_ids if normalize_name(registry.names[i]) in wanted]
+
+
+def door_transitions(stamps, areaid, event, day, door_ids):
+    """
+    Open/close changes of every door in door_ids, in one grouped diff.
+
+    A change is an event that differs by one from the previous event of the same door on the
+    same local day, so the first door event of a day never counts as a change.
+
+    Args:
+        stamps (np.ndarray): int64 UTC nanoseconds per event
+        areaid (np.ndarray): Area id per event
+        event (np.ndarray): 0/1 event per event
+        day (np.ndarray): Local day index per event (-1 outside the day table)
+        door_ids (list): Door area ids to track
+
+    Returns:
+        np.ndarray: Row indices of the door changes
+    """
+    idx = np.flatnonzero((day >= 0) & np.isin(areaid, door_ids))
+    if idx.size == 0:
+        return idx
+    idx = idx[np.lexsort((stamps[idx], areaid[idx], day[idx]))]
+    same_group = (day[idx][1:] == day[idx][:-1]) & (areaid[idx][1:] == areaid[idx][:-1])
+    changed = same_group & (np.abs(np.diff(event[idx].astype(np.int64))) == 1)
+    return idx[1:][changed]
+
+
+def door_segments(bounds, days, change_stamps, change_days):
+    """
+    Split each day into the intervals between consecutive door changes.
+
+    Args:
+        bounds (np.ndarray): Day boundary table (see daybounds.day_boundaries)
+        days (np.ndarray): Day indices to segment
+        change_stamps (np.ndarray): int64 UTC nanoseconds of the door changes
+        change_days (np.ndarray): Day index of every door change
+
+    Returns:
+        tuple: (start, end, day) arrays, one entry per interval, ordered by day and time
+    """
+    points = np.concatenate([bounds[days], change_stamps, bounds[days + 1]])
+    point_day = np.concatenate([days, change_days, days])
+    # Day start first and day end last when a change shares their timestamp
+    point_kind = np.concatenate([np.zeros(days.size), np.ones(change_stamps.size), np.full(days.size, 2)])
+    order = np.lexsort((point_kind, points, point_day))
+    points, point_day = points[order], point_day[order]
+
+    seg = np.flatnonzero(point_day[1:] == point_day[:-1])
+    return points[seg], points[seg + 1], point_day[seg]
+
+
+def count_between(sorted_stamps, start, end):
+    """
+    Number of sorted_stamps strictly inside each (start, end) interval.
+    """
+    return np.searchsorted(sorted_stamps, end, side='left') - np.searchsorted(sorted_stamps, start, side='right')
+
+
+def out_of_home_intervals(stamps, areaid, event, day, bounds, days, door_ids, area_ids, max_per_hour=1):
+    """
+    Door-delimited intervals with fewer than max_per_hour in-home activations per hour.
+
+    Cost is O((events + door changes) log events), however often the doors are used.
+
+    Args:
+        stamps (np.ndarray): int64 UTC nanoseconds per event, for one home
+        areaid (np.ndarray): Area id per event
+        event (np.ndarray): 0/1 event per event
+        day (np.ndarray): Local day index per event (-1 outside the day table)
+        bounds (np.ndarray): Day boundary table
+        days (np.ndarray): Day indices to evaluate
+        door_ids (list): Doors whose changes delimit the intervals
+        area_ids (list): In-home areas whose activations (event == 1) are counted
+        max_per_hour (float): Activation rate below which an interval counts as out of home
+
+    Returns:
+        tuple: (start, end, day, durations) arrays of the out-of-home intervals, durations in seconds
+    """
+    changes = door_transitions(stamps, areaid, event, day, door_ids)
+    changes = changes[np.isin(day[changes], days)]
+    start, end, seg_day = door_segments(bounds, days, stamps[changes], day[changes])
+    durations = (end - start) / 1e9
+
+    activations = np.sort(stamps[np.isin(areaid, area_ids) & (event == 1)])
+    count = count_between(activations, start, end)
+
+    ooh = (durations > 0) & (count * 3600 < max_per_hour * durations)
+    return start[ooh], end[ooh], seg_day[ooh], durations[ooh]
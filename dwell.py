@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+
+from daybounds import stamps_to_ns
+
+SECOND_NS = 10**9
+DAY_NS = 86400 * SECOND_NS
+
+# Open-interval policies
+LEADING = ('keep', 'drop', 'day_start')
+TRAILING = ('drop', 'cap', 'last_event', 'day_end')
+
+
+def dwell_intervals(stamps, areaid, event, day, leading='keep', trailing='drop', cap=300 * SECOND_NS,
+                    day_start=None, day_end=None):
+    """
+    Presence intervals of every (day, area) group of a home in one grouped pass.
+
+    Within a group a dwell starts at a 0 -> 1 change (or at a first event of 1) and stops at the
+    next 1 -> 0 change. Open intervals are resolved by policy:
+
+    leading (the group's first event is already 1):
+        'keep' starts at that event, 'drop' discards the interval, 'day_start' starts at day_start(day)
+    trailing (the group's last dwell never stops):
+        'drop' discards it, 'cap' stops it cap after its start, 'last_event' stops it at the group's
+        last event, 'day_end' stops it at day_end(day)
+
+    Args:
+        stamps (np.ndarray): int64 event times in any unit (e.g. UTC ns, unix seconds)
+        areaid (np.ndarray): Area id per event
+        event (np.ndarray): 0/1 event per event
+        day (np.ndarray): Integer day key per event (e.g. local day index)
+        leading (str): One of LEADING
+        trailing (str): One of TRAILING
+        cap (int): Cap length for trailing='cap', in the unit of stamps
+        day_start (callable, optional): Day keys -> day start times, for leading='day_start'
+        day_end (callable, optional): Day keys -> day end times, for trailing='day_end'
+
+    Returns:
+        dict: 'areaid', 'start', 'stop' and 'day' arrays, sorted by (day, areaid, start)
+    """
+    if leading not in LEADING or trailing not in TRAILING:
+        raise ValueError(f"leading must be one of {LEADING} and trailing one of {TRAILING}")
+
+    stamps, areaid, event, day = (np.asarray(a) for a in (stamps, areaid, event, day))
+    if stamps.size == 0:
+        return {'areaid': areaid[:0], 'start': stamps[:0], 'stop': stamps[:0], 'day': day[:0]}
+
+    # lexsort is stable, so equal stamps keep their input order
+    order = np.lexsort((stamps, areaid, day))
+    stamps, areaid, event, day = stamps[order], areaid[order], event[order], day[order]
+
+    first = np.ones(stamps.size, dtype=bool)
+    first[1:] = (day[1:] != day[:-1]) | (areaid[1:] != areaid[:-1])
+    group = np.cumsum(first) - 1
+    group_last = np.flatnonzero(np.append(first[1:], True))
+
+    prev = np.empty_like(event)
+    prev[1:] = event[:-1]
+    is_start = (event == 1) & (first | (prev == 0))
+    is_stop = (event == 0) & ~first & (prev == 1)
+
+    start_idx = np.flatnonzero(is_start)
+    stop_idx = np.flatnonzero(is_stop)
+    n_groups = group[-1] + 1
+    n_start = np.bincount(group[start_idx], minlength=n_groups)
+    n_stop = np.bincount(group[stop_idx], minlength=n_groups)
+
+    # Starts and stops alternate, so a group is open when it has one start more than stops
+    start_group = group[start_idx]
+    last_start = np.append(start_group[1:] != start_group[:-1], True)
+    open_start = last_start & (n_start > n_stop)[start_group]
+    closed_start = start_idx[~open_start]
+    open_start = start_idx[open_start]
+
+    begin = [stamps[closed_start]]
+    end = [stamps[stop_idx]]
+    rows = [closed_start]
+    if trailing != 'drop' and open_start.size:
+        if trailing == 'cap':
+            end.append(stamps[open_start] + cap)
+        elif trailing == 'last_event':
+            end.append(stamps[group_last[group[open_start]]])
+        else:
+            end.append(np.asarray(day_end(day[open_start]), dtype=stamps.dtype))
+        begin.append(stamps[open_start])
+        rows.append(open_start)
+
+    rows = np.concatenate(rows)
+    start = np.concatenate(begin)
+    stop = np.concatenate(end)
+
+    leading_open = first[rows]
+    if leading == 'drop':
+        rows, start, stop = rows[~leading_open], start[~leading_open], stop[~leading_open]
+    elif leading == 'day_start' and leading_open.any():
+        start = start.copy()
+        start[leading_open] = np.asarray(day_start(day[rows[leading_open]]), dtype=stamps.dtype)
+
+    order = np.argsort(rows, kind='stable')
+    rows = rows[order]
+    return {'areaid': areaid[rows], 'start': start[order], 'stop': stop[order], 'day': day[rows]}
+
+
+def local_days(stamps_ns, tz=None):
+    """
+    Day key (days since 1970-01-01 of the local date) of every UTC ns stamp.
+
+    tz=None keeps UTC dates, which is what self_script, testing and plotTime group by.
+    """
+    if tz is not None:
+        stamps_ns = pd.DatetimeIndex(stamps_ns, tz='UTC').tz_convert(tz).tz_localize(None).asi8
+    return stamps_ns // DAY_NS
+
+
+def day_key_start(days, tz=None):
+    """
+    UTC ns of the local midnight starting each day key.
+    """
+    midnight = np.asarray(days, dtype=np.int64) * DAY_NS
+    if tz is None:
+        return midnight
+    return pd.DatetimeIndex(midnight).tz_localize(tz).tz_convert('UTC').asi8
+
+
+def day_key_end(days, tz=None):
+    """
+    UTC ns of 23:59:59 local time on each day key.
+    """
+    return day_key_start(np.asarray(days, dtype=np.int64) + 1, tz) - SECOND_NS
+
+
+def dwell_table(nyce, tz=None, leading='keep', trailing='drop', cap_seconds=300):
+    """
+    Columnar dwell table of a home: one row per presence interval of every area.
+
+    Args:
+        nyce (pd.DataFrame): Events with 'stamp' (naive UTC), 'areaid' and 'event'
+        tz (pytz.timezone, optional): Local timezone for local_date; None groups by UTC date
+        leading (str): Leading open interval policy, see dwell_intervals
+        trailing (str): Trailing open interval policy, see dwell_intervals
+        cap_seconds (float): Cap length for trailing='cap'
+
+    Returns:
+        pd.DataFrame: 'areaid', 'start', 'stop' (naive UTC), 'duration' (seconds) and 'local_date'
+    """
+    stamps = stamps_to_ns(nyce['stamp'])
+    day = local_days(stamps, tz)
+    out = dwell_intervals(
+        stamps, nyce['areaid'].values, nyce['event'].values, day,
+        leading=leading, trailing=trailing, cap=int(cap_seconds * SECOND_NS),
+        day_start=lambda d: day_key_start(d, tz), day_end=lambda d: day_key_end(d, tz),
+    )
+    table = pd.DataFrame({
+        'areaid': out['areaid'],
+        'start': out['start'].view('datetime64[ns]'),
+        'stop': out['stop'].view('datetime64[ns]'),
+    })
+    table['duration'] = (out['stop'] - out['start']) / SECOND_NS
+    table['local_date'] = (out['day'] * DAY_NS).view('datetime64[ns]')
+    table['local_date'] = table['local_date'].dt.date
+    return table
@@ -0,0 +1,221 @@
+import io
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+
+# Binary column layout of a cached NYCE_Area_Data pull file
+COLUMNS = {
+    'stamp': np.int64,   # UTC nanoseconds
+    'areaid': np.int16,
+    'event': np.int8,
+}
+
+CACHE_DIR = os.environ.get(
+    'NYCE_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'nyce_events')
+)
+
+
+def _path_key(file_path):
+    return hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16]
+
+
+def cache_entry(file_path, cache_dir=None):
+    """
+    Cache directory for the current version of a source file.
+
+    Entries are keyed by absolute source path, size and mtime, so a new pull written over an
+    old one gets a new entry.
+    """
+    st = os.stat(file_path)
+    name = f"{_path_key(file_path)}_{st.st_size}_{st.st_mtime_ns}"
+    return os.path.join(cache_dir or CACHE_DIR, name)
+
+
+def parse_events(file_path, offset=0):
+    """
+    Parse a NYCE_Area_Data csv into compact, time-sorted columns.
+
+    Args:
+        file_path (str): Path to a NYCE_Area_Data_DETECT_<home>.csv file
+        offset (int): Only parse the rows from this byte offset (a line start) on
+
+    Returns:
+        dict: 'stamp', 'areaid' and 'event' numpy arrays (see COLUMNS)
+    """
+    with stage('read_csv') as s:
+        source = file_path
+        if offset:
+            with open(file_path, 'rb') as f:
+                header = f.readline()
+                f.seek(offset)
+                source = io.BytesIO(header + f.read())
+        df = pd.read_csv(source, usecols=['stamp', 'areaid', 'event'])
+        s.rows_out = len(df)
+    with stage('to_datetime', len(df)):
+        stamp = pd.to_datetime(df['stamp'], errors='coerce')
+    valid = stamp.notna().values
+    stamp = stamp.values[valid].astype('datetime64[ns]').astype(np.int64)
+    order = np.argsort(stamp, kind='stable')
+    return {
+        'stamp': stamp[order],
+        'areaid': df['areaid'].values[valid][order].astype(COLUMNS['areaid']),
+        'event': df['event'].values[valid][order].astype(COLUMNS['event']),
+    }
+
+
+def write_entry(columns, entry, layout=COLUMNS, meta=None):
+    """
+    Write columns to a cache entry atomically, replacing older entries of the same source.
+
+    layout maps every column name to its dtype and defaults to the pull file COLUMNS; meta is
+    an optional dict stored with the columns as source.json.
+    """
+    parent = os.path.dirname(entry)
+    os.makedirs(parent, exist_ok=True)
+    tmp = f"{entry}.tmp{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    for name, dtype in layout.items():
+        np.save(os.path.join(tmp, name + '.npy'), np.ascontiguousarray(columns[name], dtype=dtype))
+    if meta is not None:
+        with open(os.path.join(tmp, 'source.json'), 'w') as f:
+            json.dump(meta, f)
+    try:
+        os.rename(tmp, entry)
+    except OSError:
+        # Another worker finished the same entry first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    prefix = os.path.basename(entry).split('_')[0] + '_'
+    for other in os.listdir(parent):
+        if other.startswith(prefix) and other != os.path.basename(entry) and '.tmp' not in other:
+            shutil.rmtree(os.path.join(parent, other), ignore_errors=True)
+
+
+def load_columns(file_path, use_cache=True, cache_dir=None):
+    """
+    Compact event columns of a pull file, memory-mapped from the cache when possible.
+
+    The first call on a file parses the csv and stores it; later calls on the unchanged
+    file skip csv parsing entirely.
+
+    Args:
+        file_path (str): Path to a NYCE_Area_Data_DETECT_<home>.csv file
+        use_cache (bool): Set to False to always parse the csv
+        cache_dir (str, optional): Overrides CACHE_DIR / $NYCE_CACHE_DIR
+
+    Returns:
+        dict: 'stamp' (int64 UTC ns), 'areaid' (int16) and 'event' (int8) arrays, sorted by time
+    """
+    if not use_cache:
+        return parse_events(file_path)
+
+    entry = cache_entry(file_path, cache_dir)
+    if not os.path.isdir(entry):
+        columns = parse_events(file_path)
+        try:
+            write_entry(columns, entry)
+        except OSError:
+            return columns
+    return {name: np.load(os.path.join(entry, name + '.npy'), mmap_mode='r') for name in COLUMNS}
+
+
+# Bytes fingerprinted at both ends of the already cached part of a home file
+FINGERPRINT_BYTES = 1 << 16
+
+
+def _fingerprint(f, size):
+    # Hashes of the first and the last FINGERPRINT_BYTES of the file's first size bytes
+    f.seek(0)
+    head = hashlib.sha1(f.read(min(size, FINGERPRINT_BYTES))).hexdigest()
+    f.seek(max(size - FINGERPRINT_BYTES, 0))
+    tail = hashlib.sha1(f.read(min(size, FINGERPRINT_BYTES))).hexdigest()
+    return head, tail
+
+
+def home_entry(file_path, cache_dir=None):
+    """
+    Cache entry prefix of a home, keyed by file name only, so it is shared by every pull folder.
+    """
+    return os.path.join(cache_dir or CACHE_DIR, f"home-{_path_key(os.path.basename(file_path))}")
+
+
+def load_home_columns(file_path, cache_dir=None):
+    """
+    Event columns of a home file, reusing the columns cached from an earlier pull of that home.
+
+    Daily pulls land in new folders (NYCE_Data_Pull_DETECT_<date>), so the path keyed cache of
+    load_columns misses on every refresh. This cache is keyed by the file name instead and
+    remembers how many bytes of the source it holds. When the new file starts with those same
+    bytes (checked by hashing both ends of that prefix), only the appended rows are parsed and
+    merged in; any other file is parsed in full.
+
+    Args:
+        file_path (str): Path to a NYCE_Area_Data_DETECT_<home>.csv file
+        cache_dir (str, optional): Overrides CACHE_DIR / $NYCE_CACHE_DIR
+
+    Returns:
+        dict: Columns as from load_columns, sorted by time
+    """
+    prefix = home_entry(file_path, cache_dir)
+    parent = os.path.dirname(prefix)
+    size = os.path.getsize(file_path)
+    cached = None
+    if os.path.isdir(parent):
+        for name in os.listdir(parent):
+            entry = os.path.join(parent, name)
+            if name.startswith(os.path.basename(prefix) + '_') and '.tmp' not in name \
+                    and os.path.exists(os.path.join(entry, 'source.json')):
+                cached = entry
+
+    with open(file_path, 'rb') as f:
+        meta = None
+        if cached is not None:
+            with open(os.path.join(cached, 'source.json')) as m:
+                meta = json.load(m)
+            old = meta['size']
+            f.seek(max(old - 1, 0))
+            if old > size or f.read(1) != b'\n' or list(_fingerprint(f, old)) != [meta['head'], meta['tail']]:
+                meta = None
+        head, tail = _fingerprint(f, size)
+
+    entry = f"{prefix}_{size}"
+    if meta is not None and meta['size'] == size:
+        return {name: np.load(os.path.join(cached, name + '.npy'), mmap_mode='r') for name in COLUMNS}
+    if meta is not None:
+        old = {name: np.load(os.path.join(cached, name + '.npy'), mmap_mode='r') for name in COLUMNS}
+        new = parse_events(file_path, offset=meta['size'])
+        # Stable: equal stamps keep file order, as parsing the whole file would
+        order = np.argsort(np.concatenate([old['stamp'], new['stamp']]), kind='stable')
+        columns = {name: np.concatenate([old[name], new[name]])[order] for name in COLUMNS}
+    else:
+        columns = parse_events(file_path)
+    try:
+        write_entry(columns, entry, meta={'size': size, 'head': head, 'tail': tail})
+    except OSError:
+        pass
+    return columns
+
+
+def load_events(file_path, use_cache=True, cache_dir=None):
+    """
+    Load a pull file as the frame the scripts work with.
+
+    Args:
+        file_path (str): Path to a NYCE_Area_Data_DETECT_<home>.csv file
+        use_cache (bool): Set to False to always parse the csv
+        cache_dir (str, optional): Overrides CACHE_DIR / $NYCE_CACHE_DIR
+
+    Returns:
+        pd.DataFrame: 'stamp' (naive UTC datetime64), 'areaid' and 'event', sorted by stamp
+    """
+    columns = load_columns(file_path, use_cache, cache_dir)
+    return pd.DataFrame({
+        'stamp': np.asarray(columns['stamp']).view('datetime64[ns]'),
+        'areaid': np.asarray(columns['areaid']),
+        'event': np.asarray(columns['event']),
+    })
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+
+from areas import get_registry
+from daybounds import assign_days, day_boundaries, nyce_tz, stamps_to_ns
+from event_cache import COLUMNS, load_columns
+
+
+def local_dates(stamps_ns, tz=nyce_tz):
+    """
+    The unique_date range covering every stamp: its first through last local date, plus the
+    closing midnight (N + 1 dates describe N days, see daybounds.day_boundaries).
+    """
+    first, last = pd.to_datetime([stamps_ns.min(), stamps_ns.max()]).tz_localize('UTC').tz_convert(tz)
+    return pd.date_range(first.date(), last.date() + pd.Timedelta(days=1))
+
+
+class EventStream:
+    """
+    Events of one home in contiguous arrays, sorted by (local day, area, time), with a CSR
+    offset index: the events of day d and area a are rows offsets[d * n_areas + i] to
+    offsets[d * n_areas + i + 1], where i is a's position in areas. Every (day, area) slice is
+    found in O(1) and returned as views, without boolean masks over the whole home.
+
+    Build it with from_frame / from_columns / from_file rather than directly.
+
+    Attributes:
+        stamp (np.ndarray): int64 UTC ns
+        areaid (np.ndarray): int16 area id
+        event (np.ndarray): int8 0/1 event
+        day (np.ndarray): Local day index of every event, into dates
+        source (np.ndarray): Row of every event in the frame / columns it was built from
+        dates (pd.DatetimeIndex): Local date of every day index (one more closing date)
+        areas (np.ndarray): Sorted area ids present
+        offsets (np.ndarray): int64, len(dates[:-1]) * len(areas) + 1 row offsets
+    """
+
+    def __init__(self, stamp, areaid, event, unique_date=None, tz=nyce_tz):
+        stamp = np.asarray(stamp, dtype=COLUMNS['stamp'])
+        areaid = np.asarray(areaid, dtype=COLUMNS['areaid'])
+        event = np.asarray(event, dtype=COLUMNS['event'])
+        if unique_date is None:
+            unique_date = local_dates(stamp, tz) if stamp.size else pd.DatetimeIndex([])
+        self.dates = pd.DatetimeIndex(unique_date)
+        self.tz = tz
+        n_days = max(len(self.dates) - 1, 0)
+
+        # Events outside the dates are left out; lexsort is stable, so equal stamps keep their order
+        day = assign_days(stamp, day_boundaries(self.dates, tz)) if n_days else np.full(stamp.size, -1)
+        rows = np.flatnonzero(day >= 0)
+        order = rows[np.lexsort((stamp[rows], areaid[rows], day[rows]))]
+        self.stamp = np.ascontiguousarray(stamp[order])
+        self.areaid = np.ascontiguousarray(areaid[order])
+        self.event = np.ascontiguousarray(event[order])
+        self.day = day[order]
+        self.source = order
+
+        self.areas = np.unique(self.areaid)
+        self._column = {int(a): i for i, a in enumerate(self.areas)}
+        key = self.day * self.areas.size + np.searchsorted(self.areas, self.areaid)
+        counts = np.bincount(key, minlength=n_days * self.areas.size)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    @classmethod
+    def from_frame(cls, df, unique_date=None, tz=nyce_tz):
+        """
+        Stream of a frame with 'stamp' (naive UTC), 'areaid' and 'event', e.g. from load_events.
+        """
+        return cls(stamps_to_ns(df['stamp']), df['areaid'].values, df['event'].values, unique_date, tz)
+
+    @classmethod
+    def from_columns(cls, columns, unique_date=None, tz=nyce_tz):
+        """
+        Stream of event_cache columns ('stamp' int64 UTC ns, 'areaid', 'event').
+        """
+        return cls(columns['stamp'], columns['areaid'], columns['event'], unique_date, tz)
+
+    @classmethod
+    def from_file(cls, file_path, unique_date=None, tz=nyce_tz, use_cache=True):
+        """
+        Stream of a NYCE_Area_Data_DETECT_<home>.csv file, read through the event cache.
+        """
+        return cls.from_columns(load_columns(file_path, use_cache), unique_date, tz)
+
+    def __len__(self):
+        return self.stamp.size
+
+    @property
+    def n_days(self):
+        return max(len(self.dates) - 1, 0)
+
+    def day_index(self, date):
+        """
+        Day index of a local date, -1 when the stream does not cover it.
+        """
+        i = self.dates.get_indexer([pd.Timestamp(date).normalize()])[0]
+        return i if i < self.n_days else -1
+
+    def bounds(self, day, areaid=None):
+        """
+        (start, stop) rows of a day, or of one area on that day; (0, 0) for an area never seen.
+        Raises IndexError for a day outside 0 .. n_days - 1 (day_index gives -1 for those).
+        """
+        if not 0 <= day < self.n_days:
+            raise IndexError(f"Day {day} is outside the stream's {self.n_days} days")
+        n_areas = self.areas.size
+        if areaid is None:
+            return self.offsets[day * n_areas], self.offsets[(day + 1) * n_areas]
+        i = self._column.get(int(areaid))
+        if i is None:
+            return 0, 0
+        return self.offsets[day * n_areas + i], self.offsets[day * n_areas + i + 1]
+
+    def slice(self, day, areaid=None):
+        """
+        Views of the events of a day (all areas, ordered by area then time) or of one area on it.
+
+        Returns:
+            dict: 'stamp', 'areaid' and 'event' array views
+        """
+        lo, hi = self.bounds(day, areaid)
+        return {'stamp': self.stamp[lo:hi], 'areaid': self.areaid[lo:hi], 'event': self.event[lo:hi]}
+
+    def counts(self):
+        """
+        Events per (day, area) as an (n_days, len(areas)) array.
+        """
+        return np.diff(self.offsets).reshape(self.n_days, self.areas.size)
+
+    def area_names(self):
+        """
+        Area name of every event as a categorical, one registry lookup per area.
+        """
+        registry = get_registry()
+        names = pd.Index([registry.name(a) for a in self.areas])
+        codes = np.searchsorted(self.areas, self.areaid)
+        # Several ids can share a name; categories must be unique
+        categories = names.unique()
+        return pd.Categorical.from_codes(categories.get_indexer(names)[codes], categories)
+
+    def to_frame(self, order='source'):
+        """
+        The stream as the frame the scripts use.
+
+        Args:
+            order (str): 'source' for the rows in the order they were built from (time order for
+                load_events frames), 'stream' for (day, area, time) order
+
+        Returns:
+            pd.DataFrame: 'stamp' (naive UTC datetime64), 'areaid', 'event' and 'local_date'
+        """
+        rows = np.argsort(self.source, kind='stable') if order == 'source' else slice(None)
+        return pd.DataFrame({
+            'stamp': self.stamp[rows].view('datetime64[ns]'),
+            'areaid': self.areaid[rows],
+            'event': self.event[rows],
+            'local_date': self.dates[:self.n_days].date[self.day[rows]],
+        })
+
+    def to_columns(self):
+        """
+        event_cache columns of the stream, in the order it was built from (time order, ties
+        in their source order, for load_events frames and cache columns).
+        """
+        rows = np.argsort(self.source, kind='stable')
+        return {name: getattr(self, name)[rows] for name in COLUMNS}
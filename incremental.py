@@ -0,0 +1,239 @@
+import os
+import re
+import glob
+import json
+import time
+import concurrent.futures
+import numpy as np
+import pandas as pd
+
+from areas import areaNameDict
+from daybounds import day_boundaries, study_dates, nyce_tz
+from event_cache import load_home_columns
+
+PATTERN = "*NYCE_Area_Data_DETECT_*.csv"
+
+
+def load_checkpoints(output):
+    path = output + '.checkpoint.json'
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoints(output, checkpoints):
+    path = output + '.checkpoint.json'
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'w') as f:
+        json.dump(checkpoints, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def events_since(file_path, checkpoint, day_start_ns):
+    """
+    Events of a home from the first day after its checkpoint on.
+
+    Each pull is a superset of the previous one: the home's columns are extended from the
+    previous pull's cache entry with only the rows appended since (see
+    event_cache.load_home_columns), and only the days after the checkpoint are returned. If
+    the pull no longer starts with the same event, the checkpoint is ignored and the whole
+    home is returned.
+
+    Args:
+        file_path (str): Path to a NYCE_Area_Data_DETECT_<home>.csv file
+        checkpoint (dict or None): {'last_day': 'YYYY-MM-DD', 'first_stamp': int UTC ns}
+        day_start_ns (callable): Maps a date string to the UTC ns its day starts at
+
+    Returns:
+        tuple: (events frame, first_stamp of the file, first recomputed date or None for all)
+    """
+    columns = load_home_columns(file_path)
+    stamps = columns['stamp']
+    first_stamp = int(stamps[0]) if len(stamps) else None
+
+    first_new = None
+    start = 0
+    if checkpoint and checkpoint.get('first_stamp') == first_stamp and checkpoint.get('last_day'):
+        first_new = pd.Timestamp(checkpoint['last_day']) + pd.Timedelta(days=1)
+        start = int(np.searchsorted(stamps, day_start_ns(first_new), side='left'))
+
+    nyce = pd.DataFrame({
+        'stamp': np.array(stamps[start:]).view('datetime64[ns]'),
+        'areaid': np.array(columns['areaid'][start:]),
+        'event': np.array(columns['event'][start:]),
+    })
+    return nyce, first_stamp, first_new
+
+
+def _local_day_start(date):
+    return day_boundaries(pd.DatetimeIndex([date]), nyce_tz)[0]
+
+
+def _utc_day_start(date):
+    return pd.Timestamp(date).value
+
+
+def _next_checkpoint(nyce, first_stamp, local):
+    """
+    Last complete day: the day before the one the pull's last event falls in.
+    """
+    if nyce.empty:
+        return None
+    last = pd.Timestamp(nyce['stamp'].iloc[-1])
+    if local:
+        last = last.tz_localize('UTC').tz_convert(nyce_tz).tz_localize(None)
+    last_day = last.normalize() - pd.Timedelta(days=1)
+    return {'last_day': str(last_day.date()), 'first_stamp': first_stamp}
+
+
+def ilsa_increment(file_path, unique_date, checkpoint):
+    from ILSA import ilsa_daily
+
+    nyce, first_stamp, first_new = events_since(file_path, checkpoint, _local_day_start)
+    daily = ilsa_daily(nyce, unique_date)
+    if first_new is not None:
+        daily = daily[daily.index >= first_new]
+    return daily.rename(os.path.basename(file_path)), _next_checkpoint(nyce, first_stamp, True) or checkpoint
+
+
+def tooh_increment(file_path, unique_date, checkpoint):
+    from TOOH import tooh_daily
+
+    nyce, first_stamp, first_new = events_since(file_path, checkpoint, _local_day_start)
+    daily, _ = tooh_daily(nyce, unique_date, areaNameDict())
+    if first_new is not None:
+        daily = daily[daily.index >= first_new]
+    name = re.sub("[^0-9]", "", os.path.basename(file_path))
+    return daily.rename(name), _next_checkpoint(nyce, first_stamp, True) or checkpoint
+
+
+def occupancy_increment(file_path, min_duration_seconds, checkpoint):
+    from self_script import daily_area_occupancy, extract_patient_number
+
+    homeid = extract_patient_number(file_path)
+    nyce, first_stamp, first_new = events_since(file_path, checkpoint, _utc_day_start)
+    rows = daily_area_occupancy(nyce, int(homeid), min_duration_seconds) if homeid else pd.DataFrame()
+    return (rows, int(homeid) if homeid else None, first_new), _next_checkpoint(nyce, first_stamp, False) or checkpoint
+
+
+def _run(increment, input_dir, output, args, max_workers, initializer=None, initargs=()):
+    data_files = sorted(glob.glob(os.path.join(input_dir, PATTERN)))
+    checkpoints = load_checkpoints(output)
+
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, initializer=initializer, initargs=initargs
+    ) as executor:
+        futures = {
+            executor.submit(increment, f, *args, checkpoints.get(os.path.basename(f))): f
+            for f in data_files
+        }
+        for future in concurrent.futures.as_completed(futures):
+            file_path = futures[future]
+            try:
+                results[file_path] = future.result()
+            except Exception as e:
+                print(f"Error processing {file_path}: {e}")
+    return data_files, checkpoints, results
+
+
+def upsert_wide(output, index, series_list):
+    """
+    Write new days of every home into a wide (date x home) summary, keeping all other cells.
+    """
+    if os.path.exists(output):
+        summary = pd.read_csv(output, index_col=0, parse_dates=True)
+        summary = summary.reindex(index.union(summary.index))
+    else:
+        summary = pd.DataFrame(index=index)
+    for s in series_list:
+        if s.name not in summary.columns:
+            summary[s.name] = np.nan
+        summary.loc[s.index, s.name] = s.values
+    summary.to_csv(output)
+    return summary
+
+
+def update_wide(kind, input_dir, output, max_workers=None, unique_date=None):
+    """
+    Incrementally refresh an ILSA or TOOH summary after a new data pull.
+
+    Only the days after each home's checkpoint are recomputed and upserted into output;
+    the first run on a new output computes everything.
+
+    Args:
+        kind (str): 'ilsa' or 'tooh'
+        input_dir (str): NYCE_Data_Pull folder with NYCE_Area_Data_DETECT_<home>.csv files
+        output (str): Wide summary csv to update in place
+        max_workers (int, optional): Worker processes, defaults to the number of cores
+        unique_date (pd.DatetimeIndex, optional): Defaults to study_dates()
+    """
+    start_time = time.time()
+    if unique_date is None:
+        unique_date = study_dates()
+    increment = ilsa_increment if kind == 'ilsa' else tooh_increment
+    data_files, checkpoints, results = _run(increment, input_dir, output, (unique_date,), max_workers)
+
+    index = unique_date if kind == 'ilsa' else unique_date[:-1]
+    summary = upsert_wide(output, index, [results[f][0] for f in data_files if f in results])
+    for f in data_files:
+        if f in results and results[f][1]:
+            checkpoints[os.path.basename(f)] = results[f][1]
+    save_checkpoints(output, checkpoints)
+    print(f"Update completed in {time.time() - start_time:.2f} seconds")
+    return summary
+
+
+def update_occupancy(input_dir, output, max_workers=None, min_duration_seconds=90):
+    """
+    Incrementally refresh the self_script daily area occupancy output after a new data pull.
+    """
+    from shared_state import get_state, init_worker
+
+    start_time = time.time()
+    data_files, checkpoints, results = _run(
+        occupancy_increment, input_dir, output, (min_duration_seconds,), max_workers,
+        initializer=init_worker, initargs=(get_state().entry,),
+    )
+
+    final_df = pd.read_csv(output) if os.path.exists(output) else pd.DataFrame()
+    if not final_df.empty:
+        final_df['Date'] = pd.to_datetime(final_df['Date']).dt.date
+    new_parts = []
+    for f in data_files:
+        if f not in results:
+            continue
+        (rows, homeid, first_new), checkpoint = results[f]
+        if not final_df.empty and homeid is not None:
+            stale = final_df['homeid'] == homeid
+            if first_new is not None:
+                stale &= final_df['Date'] >= first_new.date()
+            final_df = final_df[~stale]
+        if rows is not None and not rows.empty:
+            new_parts.append(rows)
+        if checkpoint:
+            checkpoints[os.path.basename(f)] = checkpoint
+
+    final_df = pd.concat([final_df] + new_parts, ignore_index=True)
+    if not final_df.empty:
+        final_df = final_df.sort_values(by=['subid', 'Date'])
+        final_df.to_csv(output, index=False)
+    save_checkpoints(output, checkpoints)
+    print(f"Update completed in {time.time() - start_time:.2f} seconds")
+    return final_df
+
+
+if __name__ == "__main__":
+    import sys
+
+    input_dir = r"C:\Users\nguyphu2\Desktop\OHSU_data\NYCE_Data_Pull_DETECT_2024-09-23"
+    output_dir = r"C:\Users\nguyphu2\Desktop\OHSU_data"
+    kind = sys.argv[1] if len(sys.argv) > 1 else 'occupancy'
+
+    if kind == 'occupancy':
+        update_occupancy(input_dir, os.path.join(output_dir, "daily_area_hours_combined_output.csv"))
+    elif kind == 'ilsa':
+        update_wide('ilsa', input_dir, os.path.join(output_dir, "NYCE_ILSA.csv"))
+    else:
+        update_wide('tooh', input_dir, os.path.join(output_dir, "in-home_NYCE_TOOH_only_door_changes.csv"))
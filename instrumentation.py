@@ -0,0 +1,261 @@
+import os
+import sys
+import json
+import time
+import marshal
+import cProfile
+from contextlib import contextmanager
+
+# Peak RSS comes from resource on Unix and psutil elsewhere, when installed
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Recorder of the home being processed in this process, set by run_home
+_current = None
+
+
+def reset_peak_rss():
+    """
+    Restart peak RSS tracking at the current RSS (Linux only, via /proc/self/clear_refs), so that
+    peak_rss_mb() measures from here on instead of over the process's lifetime.
+
+    Returns:
+        bool: Whether the peak was reset
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process in MB, since the last reset_peak_rss() where that
+    works, else over its lifetime; None when it cannot be measured.
+    """
+    try:
+        # VmHWM follows reset_peak_rss(); ru_maxrss never goes down
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kB on Linux, bytes on macOS
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 2**20
+    return None
+
+
+class Stage:
+    """
+    Handle of a running stage; set rows_out once the stage's output is known.
+    """
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+
+
+class Recorder:
+    """
+    Stage records of one home: wall time, rows in/out and peak RSS after the stage.
+
+    peak_rss_scope says what the peak covers: 'home' when it was reset as the home started
+    (see reset_peak_rss), else 'process', the peak over the process's lifetime, which in a
+    reused pool worker includes every home it processed before.
+    """
+
+    def __init__(self, home, peak_rss_scope='process'):
+        self.home = home
+        self.peak_rss_scope = peak_rss_scope
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        handle = Stage(name, rows_in)
+        start = time.perf_counter()
+        try:
+            yield handle
+        finally:
+            self.records.append({
+                'home': self.home,
+                'stage': name,
+                'seconds': time.perf_counter() - start,
+                'rows_in': handle.rows_in,
+                'rows_out': handle.rows_out,
+                'peak_rss_mb': peak_rss_mb(),
+                'peak_rss_scope': self.peak_rss_scope,
+                'pid': os.getpid(),
+            })
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """
+    Record a pipeline stage of the home being processed; only a handle when nothing records.
+
+    Usage:
+        with stage('read_csv') as s:
+            df = pd.read_csv(file_path)
+            s.rows_out = len(df)
+    """
+    if _current is None:
+        yield Stage(name, rows_in)
+    else:
+        with _current.stage(name, rows_in) as handle:
+            yield handle
+
+
+def run_home(func, file_path, *args, profile=False):
+    """
+    Call func(file_path, *args) in a worker, recording its stages. file_path may also be a list
+    of files handled by one call.
+
+    Returns:
+        tuple: (result, records, profile) where records are the stage records (the last one is
+            'total') and profile is the marshalled cProfile stats when profile is set, else None
+    """
+    global _current
+    if isinstance(file_path, (list, tuple)):
+        # A work unit of several homes is recorded under its first one
+        home = os.path.basename(file_path[0]) + (f"+{len(file_path) - 1}" if len(file_path) > 1 else '')
+    else:
+        home = os.path.basename(file_path)
+    # Pool workers are reused across homes; measure this home's peak only
+    _current = Recorder(home, 'home' if reset_peak_rss() else 'process')
+    profiler = cProfile.Profile() if profile else None
+    try:
+        with _current.stage('total'):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                result = func(file_path, *args)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        stats = None
+        if profiler is not None:
+            profiler.create_stats()
+            stats = marshal.dumps(profiler.stats)
+        return result, _current.records, stats
+    finally:
+        _current = None
+
+
+class Run:
+    """
+    Instrumentation of one directory() run.
+
+    Homes are submitted through run_home. Their stage records are appended to a JSON lines
+    metrics file as they complete, stdout gets a progress line at most every progress_every
+    seconds, and with profile_top the cProfile stats of the slowest homes are kept as .prof files
+    (readable with pstats).
+
+    Args:
+        name (str): Run name, written with every record
+        total (int): Number of homes
+        metrics_path (str, optional): JSON lines file to append the records to
+        profile_top (int): Keep the profiles of this many slowest homes, 0 to not profile
+        profile_dir (str, optional): Where the .prof files go; defaults to the metrics file's
+            directory, else the working directory
+        progress_every (float): Seconds between progress lines
+        rows_stage (str): Stage whose rows_out counts a home's events
+    """
+
+    def __init__(self, name, total, metrics_path=None, profile_top=0, profile_dir=None, progress_every=5.0,
+                 rows_stage='load'):
+        self.name = name
+        self.total = total
+        self.done = 0
+        self.rows = 0
+        self.profile_top = profile_top
+        self.profile_dir = profile_dir or (os.path.dirname(os.path.abspath(metrics_path)) if metrics_path else '.')
+        self.progress_every = progress_every
+        self.rows_stage = rows_stage
+        self.profiles = []
+        self.metrics = open(metrics_path, 'a') if metrics_path else None
+        self.start = time.perf_counter()
+        self.last_progress = self.start
+
+    def submit(self, executor, func, file_path, *args):
+        return executor.submit(run_home, func, file_path, *args, profile=self.profile_top > 0)
+
+    def result(self, future):
+        """
+        The home's result; records its stages and progress. Raises what the home raised.
+        """
+        result, records, stats = future.result()
+        self.write(records)
+        rows = next((r['rows_out'] for r in records if r['stage'] == self.rows_stage), None)
+        self.rows += rows or 0
+        if stats is not None:
+            self.profiles.append((records[-1]['seconds'], records[-1]['home'], stats))
+            self.profiles = sorted(self.profiles, key=lambda p: p[0], reverse=True)[:self.profile_top]
+        self.progress()
+        return result
+
+    def failed(self):
+        self.progress()
+
+    def write(self, records):
+        if self.metrics is None:
+            return
+        for record in records:
+            self.metrics.write(json.dumps(dict(record, run=self.name)) + '\n')
+        self.metrics.flush()
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Record a stage of the run itself, e.g. writing the combined output.
+        """
+        recorder = Recorder(None)
+        with recorder.stage(name, rows_in) as handle:
+            yield handle
+        self.write(recorder.records)
+
+    def progress(self):
+        self.done += 1
+        now = time.perf_counter()
+        if self.done < self.total and now - self.last_progress < self.progress_every:
+            return
+        self.last_progress = now
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else float('nan')
+        print(f"[{self.name}] {self.done}/{self.total} homes, {self.rows / elapsed if elapsed else 0:,.0f} events/s, "
+              f"{elapsed:.1f}s elapsed, eta {eta:.0f}s", flush=True)
+
+    def close(self):
+        """
+        Write the kept profiles and close the metrics file.
+
+        Returns:
+            list: Paths of the .prof files written
+        """
+        paths = []
+        if self.profiles:
+            os.makedirs(self.profile_dir, exist_ok=True)
+        for seconds, home, stats in self.profiles:
+            path = os.path.join(self.profile_dir, f"{self.name}_{os.path.splitext(home)[0]}.prof")
+            with open(path, 'wb') as f:
+                f.write(stats)
+            paths.append(path)
+            print(f"[{self.name}] profile of {home} ({seconds:.2f}s) written to {path}")
+        if self.metrics is not None:
+            self.metrics.close()
+        return paths
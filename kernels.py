@@ -0,0 +1,88 @@
+import numpy as np
+
+# numba is optional: without it the kernels run as plain Python with identical results
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    njit = None
+    HAVE_NUMBA = False
+
+
+def _debounce_loop(stamps, events, starts, min_gap, keep):
+    for g in range(len(starts) - 1):
+        lo, hi = starts[g], starts[g + 1]
+        # Always keep the first row
+        keep[lo] = True
+        last_stable = events[lo]
+        potential = -1
+        for i in range(lo + 1, hi):
+            if events[i] != last_stable:
+                # New potential transition, or the state changed again before it stabilized
+                if potential < 0 or events[i] != events[potential]:
+                    potential = i
+            elif potential >= 0 and stamps[i] - stamps[potential] >= min_gap:
+                keep[potential] = True
+                last_stable = events[potential]
+                potential = -1
+        # A potential transition that lasted until the last row
+        if potential >= 0 and stamps[hi - 1] - stamps[potential] >= min_gap:
+            keep[potential] = True
+    return keep
+
+
+_debounce_jit = njit(cache=True, nogil=True)(_debounce_loop) if HAVE_NUMBA else None
+
+
+def debounce_mask(stamps, events, groups, min_gap, use_jit=True):
+    """
+    Keep-mask of the stable state changes of every group (plotTime.filter_transitions).
+
+    Per group, the first row is kept. A row that changes the last stable state becomes a
+    potential transition, and is kept once the group returns to the old state at least
+    min_gap after it (or the group ends at least min_gap after it).
+
+    Args:
+        stamps (np.ndarray): int64 event times, sorted within each group
+        events (np.ndarray): Event per row (int8)
+        groups (np.ndarray): Group id per row (e.g. areaid), rows of a group contiguous
+        min_gap (int): Minimum stable time, in the unit of stamps
+        use_jit (bool): Use the numba kernel when numba is installed
+
+    Returns:
+        np.ndarray: Boolean mask of the rows to keep
+    """
+    stamps = np.ascontiguousarray(stamps, dtype=np.int64)
+    events = np.ascontiguousarray(events, dtype=np.int8)
+    groups = np.asarray(groups)
+    keep = np.zeros(stamps.size, dtype=bool)
+    if stamps.size == 0:
+        return keep
+
+    starts = np.flatnonzero(np.append(True, groups[1:] != groups[:-1]))
+    starts = np.append(starts, stamps.size).astype(np.int64)
+    kernel = _debounce_jit if use_jit and HAVE_NUMBA else _debounce_loop
+    return kernel(stamps, events, starts, np.int64(min_gap), keep)
+
+
+def debounce(nyce, min_time_diff=60, use_jit=True):
+    """
+    Drop the transitions of every area that do not last min_time_diff seconds.
+
+    Usable as a preprocessing stage before any of the daily computations.
+
+    Args:
+        nyce (pd.DataFrame): Events with 'stamp' (naive UTC), 'areaid' and 'event'
+        min_time_diff (float): Minimum stable time in seconds
+        use_jit (bool): Use the numba kernel when numba is installed
+
+    Returns:
+        pd.DataFrame: The kept rows ordered by (areaid, stamp), with a fresh index
+    """
+    stamps = nyce['stamp'].values.astype('datetime64[ns]').view(np.int64)
+    areaid = nyce['areaid'].values
+    order = np.lexsort((stamps, areaid))
+    keep = debounce_mask(
+        stamps[order], nyce['event'].values[order], areaid[order], int(min_time_diff * 10**9), use_jit
+    )
+    return nyce.iloc[order[keep]].reset_index(drop=True)
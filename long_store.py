@@ -0,0 +1,254 @@
+import os
+import re
+import glob
+import json
+import numpy as np
+import pandas as pd
+
+# Monthly partitions; temporary and other files never match
+PARTITION_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9].npz"
+
+# Columns of a long, sparse metrics store: one row per (home, subid, date, metric) with a value.
+# subid is -1 for home-level metrics (ILSA, TOOH); day counts days since 1970-01-01.
+LONG_COLUMNS = {
+    'home': np.int64,
+    'subid': np.int64,
+    'day': np.int32,
+    'metric': np.int16,    # index into the partition's metric_names
+    'value': np.float64,
+}
+
+
+def _days(dates):
+    return np.asarray(pd.to_datetime(pd.Index(dates)).values.astype('datetime64[D]').astype(np.int64))
+
+
+def _homeid(label):
+    # 'NYCE_Area_Data_DETECT_1093.csv' and '1093' are both home 1093
+    match = re.search(r"(\d+)(?:\.csv)?$", str(label))
+    return int(match.group(1)) if match else -1
+
+
+def long_from_wide(summary, metric):
+    """
+    Long rows of a wide (dates x homes) summary such as ILSA.directory's, without its empty cells.
+
+    Args:
+        summary (pd.DataFrame): Index of dates, one column per home (homeid or home file name)
+        metric (str): Metric name of the values
+
+    Returns:
+        dict: LONG_COLUMNS arrays ('metric' holds the name) sorted by (home, day), and 'labels':
+            {metric: the summary's column labels}, so wide_view can rebuild every column
+    """
+    values = summary.to_numpy(dtype=np.float64)
+    row, col = np.nonzero(~np.isnan(values))
+    homes = np.array([_homeid(c) for c in summary.columns], dtype=np.int64)
+    order = np.lexsort((row, homes[col]))
+    row, col = row[order], col[order]
+    return {
+        'home': homes[col],
+        'subid': np.full(row.size, -1, dtype=np.int64),
+        'day': _days(summary.index)[row],
+        'metric': np.full(row.size, metric, dtype=object),
+        'value': values[row, col],
+        'labels': {metric: [str(c) for c in summary.columns]},
+    }
+
+
+def long_from_rows(rows, home='homeid', subid='subid', date='Date'):
+    """
+    Long rows of a per-(date, subid) table such as self_script.directory's; every numeric column
+    other than the keys becomes a metric, text columns are left out.
+    """
+    metrics = [c for c in rows.columns if c not in (home, subid, date) and pd.api.types.is_numeric_dtype(rows[c])]
+    values = rows[metrics].to_numpy(dtype=np.float64)
+    row, col = np.nonzero(~np.isnan(values))
+    return {
+        'home': rows[home].to_numpy(dtype=np.int64)[row],
+        'subid': rows[subid].to_numpy(dtype=np.int64)[row],
+        'day': _days(rows[date])[row],
+        'metric': np.array(metrics, dtype=object)[col],
+        'value': values[row, col],
+    }
+
+
+LABELS_NAME = 'labels.json'
+
+
+def _load_partition(path):
+    with np.load(path) as part:
+        part = dict(part)
+    part['metric'] = part.pop('metric_names')[part['metric']]
+    return part
+
+
+def _save_partition(path, part):
+    names, metric = np.unique(np.asarray(part['metric'], dtype=str), return_inverse=True)
+    order = np.lexsort((metric, part['day'], part['subid'], part['home']))
+    # A file object, so that savez does not append .npz to the temporary name
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        np.savez_compressed(
+            f, home=part['home'][order].astype(LONG_COLUMNS['home']),
+            subid=part['subid'][order].astype(LONG_COLUMNS['subid']),
+            day=part['day'][order].astype(LONG_COLUMNS['day']),
+            metric=metric[order].astype(LONG_COLUMNS['metric']),
+            value=part['value'][order].astype(LONG_COLUMNS['value']), metric_names=names,
+        )
+    os.replace(tmp, path)
+
+
+def write_long(store_dir, columns):
+    """
+    Replace the metrics in columns in the store in store_dir, one compressed partition per month.
+
+    Rows of other metrics are kept, so several drivers can share one store: every partition
+    holding a written metric is rewritten without that metric's old rows, then with the new ones.
+    Partitions are written atomically, rows sorted by (home, subid, day, metric) within each.
+
+    Args:
+        store_dir (str): Store directory
+        columns (dict): Arrays from long_from_wide / long_from_rows, or several concatenated
+
+    Returns:
+        list: Partition files written
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    metric = np.asarray(columns['metric'], dtype=str)
+    written_metrics = np.unique(metric)
+    if 'labels' in columns:
+        written_metrics = np.union1d(written_metrics, list(columns['labels']))
+    new = {
+        'home': np.asarray(columns['home'], dtype=LONG_COLUMNS['home']),
+        'subid': np.asarray(columns['subid'], dtype=LONG_COLUMNS['subid']),
+        'day': np.asarray(columns['day'], dtype=np.int64),
+        'metric': metric,
+        'value': np.asarray(columns['value'], dtype=LONG_COLUMNS['value']),
+    }
+    month = new['day'].astype('datetime64[D]').astype('datetime64[M]')
+
+    paths = {os.path.join(store_dir, f"{m}.npz") for m in np.unique(month)}
+    paths |= set(glob.glob(os.path.join(store_dir, PARTITION_GLOB)))
+    written = []
+    for path in sorted(paths):
+        rows = month == np.datetime64(os.path.basename(path)[:7], 'M')
+        part = {name: values[rows] for name, values in new.items()}
+        if os.path.exists(path):
+            old = _load_partition(path)
+            keep = ~np.isin(old['metric'], written_metrics)
+            if keep.all() and not rows.any():
+                continue
+            part = {name: np.concatenate([old[name][keep], part[name]]) for name in part}
+        if part['day'].size:
+            _save_partition(path, part)
+            written.append(path)
+        else:
+            os.remove(path)
+
+    if 'labels' in columns:
+        labels = read_labels(store_dir)
+        labels.update(columns['labels'])
+        path = os.path.join(store_dir, LABELS_NAME)
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, 'w') as f:
+            json.dump(labels, f, indent=1)
+        os.replace(tmp, path)
+    return written
+
+
+def read_labels(store_dir):
+    """
+    {metric: wide column labels} of the metrics written from wide summaries.
+    """
+    path = os.path.join(store_dir, LABELS_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_long(store_dir, start=None, end=None, homes=None, metrics=None):
+    """
+    Read part of a store, opening only the months between start and end.
+
+    Args:
+        store_dir (str): Directory written by write_long
+        start, end (str or date, optional): Inclusive date range
+        homes (list, optional): Homeids to keep
+        metrics (list, optional): Metric names to keep
+
+    Returns:
+        pd.DataFrame: 'home', 'subid', 'date', 'metric' (categorical) and 'value'
+    """
+    first = np.datetime64(pd.Timestamp(start).date(), 'D') if start is not None else None
+    last = np.datetime64(pd.Timestamp(end).date(), 'D') if end is not None else None
+
+    parts = []
+    for path in sorted(glob.glob(os.path.join(store_dir, PARTITION_GLOB))):
+        month = np.datetime64(os.path.basename(path)[:7], 'M')
+        if (first is not None and month < first.astype('datetime64[M]')) or \
+                (last is not None and month > last.astype('datetime64[M]')):
+            continue
+        with np.load(path) as part:
+            part = dict(part)
+        keep = np.ones(part['day'].size, dtype=bool)
+        if first is not None:
+            keep &= part['day'] >= first.astype(np.int64)
+        if last is not None:
+            keep &= part['day'] <= last.astype(np.int64)
+        if homes is not None:
+            keep &= np.isin(part['home'], np.asarray(homes, dtype=np.int64))
+        names = part['metric_names']
+        if metrics is not None:
+            keep &= np.isin(names[part['metric']], list(metrics))
+        parts.append(pd.DataFrame({
+            'home': part['home'][keep],
+            'subid': part['subid'][keep],
+            'date': part['day'][keep].astype('datetime64[D]').astype('datetime64[ns]'),
+            'metric': names[part['metric'][keep]],
+            'value': part['value'][keep],
+        }))
+
+    if not parts:
+        return pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in
+                             (('home', np.int64), ('subid', np.int64), ('date', 'datetime64[ns]'),
+                              ('metric', 'category'), ('value', np.float64))})
+    df = pd.concat(parts, ignore_index=True)
+    df['metric'] = df['metric'].astype('category')
+    return df
+
+
+def wide_view(store_dir, metric, unique_date=None, home_label=None):
+    """
+    The wide (dates x homes) export of one home-level metric of a store.
+
+    Metrics written from a wide summary (long_from_wide) come back with that summary's columns,
+    in its order and including homes without a single value, so with the summary's unique_date
+    the view writes the same csv (ILSA.directory passes unique_date, TOOH.directory
+    unique_date[:-1]).
+
+    Args:
+        store_dir (str): Directory written by write_long
+        metric (str): Metric name
+        unique_date (pd.DatetimeIndex, optional): Rows of the view; defaults to the stored dates
+        home_label (callable, optional): Column name of a homeid; defaults to the stored labels,
+            else str
+
+    Returns:
+        pd.DataFrame: Index of dates, one column per home, empty cells NaN
+    """
+    start, end = (unique_date[0], unique_date[-1]) if unique_date is not None else (None, None)
+    df = read_long(store_dir, start, end, metrics=[metric])
+    wide = df.pivot_table(index='date', columns='home', values='value', aggfunc='first')
+    if unique_date is not None:
+        wide = wide.reindex(pd.DatetimeIndex(unique_date))
+    wide.index.name = None
+
+    labels = read_labels(store_dir).get(metric)
+    if home_label is None and labels is not None:
+        wide = wide.reindex(columns=[_homeid(label) for label in labels])
+        wide.columns = labels
+        return wide
+    wide.columns = [(home_label or str)(h) for h in wide.columns]
+    return wide
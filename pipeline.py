@@ -0,0 +1,266 @@
+import os
+import glob
+import argparse
+import concurrent.futures
+import numpy as np
+import pandas as pd
+
+import ILSA
+import TOOH
+import testing
+import timeplot
+import self_script
+from areas import areaNameDict
+from daybounds import stamps_to_ns, study_dates
+from dwell import DAY_NS
+from event_cache import load_events
+from instrumentation import Run, stage
+from kernels import debounce
+from shared_state import get_state, init_worker
+
+# Intermediates and metrics of one home: name -> (dependencies, func(home, *dependency values)).
+# Metrics are the nodes listed in METRICS; everything else is a shared intermediate.
+NODES = {}
+
+VISIT_COLUMNS = ['Date', 'subid', 'homeid', 'Bathroom_Visits', 'Night_Bathroom_Visits',
+                 'Kitchen_Visits', 'Night_Kitchen_Visits']
+
+
+def node(name, *deps):
+    def register(func):
+        NODES[name] = (deps, func)
+        return func
+    return register
+
+
+def _rows(value):
+    if isinstance(value, dict):
+        return len(next(iter(value.values()), ()))
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class Home:
+    """
+    Lazily evaluated NODES of one home file; every node is computed at most once.
+
+    Args:
+        file_path (str): NYCE_Area_Data_DETECT_<home>.csv file
+        unique_date (pd.DatetimeIndex): Local dates of the daily ILSA / TOOH summaries
+        debounce_seconds (float, optional): Debounce the events once before every metric
+        min_duration_seconds (float): Shortest dwell counted by occupancy and timelines
+    """
+
+    def __init__(self, file_path, unique_date, debounce_seconds=None, min_duration_seconds=90):
+        self.file_path = file_path
+        self.homeid = self_script.extract_patient_number(file_path)
+        self.unique_date = unique_date
+        self.debounce_seconds = debounce_seconds
+        self.min_duration_seconds = min_duration_seconds
+        self.values = {}
+
+    def get(self, name):
+        if name not in self.values:
+            deps, func = NODES[name]
+            args = [self.get(dep) for dep in deps]
+            with stage(name) as s:
+                value = func(self, *args)
+                s.rows_out = _rows(value)
+            self.values[name] = value
+        return self.values[name]
+
+
+@node('events')
+def _events(home):
+    return load_events(home.file_path)
+
+
+@node('debounced', 'events')
+def _debounced(home, events):
+    if not home.debounce_seconds:
+        return events
+    return debounce(events, home.debounce_seconds).sort_values('stamp', kind='stable').reset_index(drop=True)
+
+
+@node('rooms', 'debounced')
+def _rooms(home, events):
+    # Room events ordered by (date, area, stamp), as the occupancy and timeline scripts use them
+    rooms = events[~events['areaid'].isin(self_script.NON_AREAS)].copy()
+    rooms['date'] = rooms['stamp'].dt.date
+    return rooms.sort_values(['date', 'areaid', 'stamp'])
+
+
+@node('dwells', 'rooms')
+def _dwells(home, rooms):
+    # Per-day partitions happen inside dwell_intervals, grouped by (UTC day, area)
+    stamps = stamps_to_ns(rooms['stamp'])
+    return self_script.standard_dwells(
+        stamps, rooms['areaid'].values.astype(np.int64), rooms['event'].values, stamps // DAY_NS
+    )
+
+
+@node('ilsa', 'debounced')
+def _ilsa(home, events):
+    return ILSA.ilsa_daily(events, home.unique_date).rename(os.path.basename(home.file_path))
+
+
+@node('tooh', 'debounced')
+def _tooh(home, events):
+    daily_summary, _ = TOOH.tooh_daily(events, home.unique_date, areaNameDict())
+    return daily_summary.rename(home.homeid)
+
+
+@node('occupancy', 'rooms', 'dwells')
+def _occupancy(home, rooms, dwells):
+    if not home.homeid:
+        return pd.DataFrame()
+    return self_script.daily_area_occupancy(rooms, int(home.homeid), home.min_duration_seconds, dwells=dwells)
+
+
+@node('visits', 'occupancy')
+def _visits(home, occupancy):
+    return occupancy[[c for c in VISIT_COLUMNS if c in occupancy.columns]]
+
+
+@node('percentages', 'debounced')
+def _percentages(home, events):
+    return testing.daily_area_percentages(events).assign(homeid=home.homeid)
+
+
+@node('timelines', 'rooms', 'dwells')
+def _timelines(home, rooms, dwells):
+    if not home.homeid:
+        return pd.DataFrame()
+    return pd.DataFrame(timeplot.track_dwell(rooms, home.homeid, home.min_duration_seconds, dwells=dwells))
+
+
+def _wide(unique_date, closing_row=True):
+    # As ILSA.directory (every date, aligned by date) or TOOH.directory (no closing date, by position)
+    def combine(results):
+        if closing_row:
+            summary = pd.DataFrame(index=unique_date)
+            for series in results:
+                summary[series.name] = series
+        else:
+            summary = pd.DataFrame(index=unique_date[:-1])
+            for series in results:
+                summary[series.name] = series.values
+        return summary
+    return combine
+
+
+def _long(*sort_by):
+    def combine(results):
+        results = [df for df in results if df is not None and not df.empty]
+        if not results:
+            return pd.DataFrame()
+        return pd.concat(results, ignore_index=True).sort_values(list(sort_by), kind='stable')
+    return combine
+
+
+# Metric -> (combine(unique_date) -> function of the per-home results, whether to write the index)
+METRICS = {
+    'ilsa': (_wide, True),
+    'tooh': (lambda unique_date: _wide(unique_date, closing_row=False), True),
+    'occupancy': (lambda unique_date: _long('subid', 'Date'), False),
+    'visits': (lambda unique_date: _long('subid', 'Date'), False),
+    'percentages': (lambda unique_date: _long('homeid', 'Date'), False),
+    'timelines': (lambda unique_date: _long('subid', 'stamp_start'), False),
+}
+
+# Metrics that need the subject mapping and sleep windows (shared_state)
+SUBJECT_METRICS = ['occupancy', 'visits', 'timelines']
+
+
+def compute_home(file_path, metrics, unique_date, debounce_seconds=None, min_duration_seconds=90):
+    """
+    The requested metrics of one home, sharing its intermediates.
+
+    Returns:
+        dict: Metric name -> value
+    """
+    home = Home(file_path, unique_date, debounce_seconds, min_duration_seconds)
+    return {name: home.get(name) for name in metrics}
+
+
+def run(input_dir, output_dir, metrics=None, max_workers=None, unique_date=None,
+        debounce_seconds=None, min_duration_seconds=90, metrics_path=None, profile_top=0):
+    """
+    Compute any subset of METRICS for every home file of a pull folder.
+
+    Every home is processed once in a worker, which parses its events and builds the shared
+    intermediates (debounced events, room events, dwell intervals) only for the metrics asked for.
+
+    Args:
+        input_dir (str): NYCE_Data_Pull folder with NYCE_Area_Data_DETECT_<home>.csv files
+        output_dir (str): One <metric>.csv per metric is written here
+        metrics (list, optional): Names from METRICS, defaults to all
+        max_workers (int, optional): Worker processes, defaults to the number of cores
+        unique_date (pd.DatetimeIndex, optional): Defaults to study_dates()
+        debounce_seconds (float, optional): Debounce every home's events first (kernels.debounce)
+        min_duration_seconds (float): Shortest dwell counted by occupancy and timelines
+        metrics_path (str, optional): Append per-home, per-node stage timings to this JSON lines file
+        profile_top (int): Keep cProfile stats of this many slowest homes next to the metrics
+
+    Returns:
+        dict: Metric name -> combined DataFrame that was written
+    """
+    metrics = list(metrics or METRICS)
+    unknown = [name for name in metrics if name not in METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics {unknown}; choose from {list(METRICS)}")
+    if unique_date is None:
+        unique_date = study_dates()
+    os.makedirs(output_dir, exist_ok=True)
+    data_files = sorted(glob.glob(os.path.join(input_dir, "*NYCE_Area_Data_DETECT_*.csv")))
+
+    # Only these read subid_homeid.csv and sleep_summary.csv
+    initializer, initargs = None, ()
+    if set(metrics) & set(SUBJECT_METRICS):
+        initializer, initargs = init_worker, (get_state().entry,)
+
+    instrument = Run('pipeline', len(data_files), metrics_path, profile_top, rows_stage='events')
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, initializer=initializer, initargs=initargs
+    ) as executor:
+        futures = {
+            instrument.submit(executor, compute_home, f, metrics, unique_date, debounce_seconds, min_duration_seconds): f
+            for f in data_files
+        }
+        for future in concurrent.futures.as_completed(futures):
+            file_path = futures[future]
+            try:
+                results[file_path] = instrument.result(future)
+            except Exception as e:
+                instrument.failed()
+                print(f"Error processing {file_path}: {e}")
+
+    outputs = {}
+    for name in metrics:
+        combine, index = METRICS[name]
+        outputs[name] = combine(unique_date)([results[f][name] for f in data_files if f in results])
+        with instrument.stage(f'to_csv_{name}', len(outputs[name])):
+            outputs[name].to_csv(os.path.join(output_dir, f"{name}.csv"), index=index)
+    instrument.close()
+    return outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute NYCE metrics for a pull folder, sharing parsed events and dwells.")
+    parser.add_argument('input_dir', help="NYCE_Data_Pull folder")
+    parser.add_argument('output_dir', help="Folder for the <metric>.csv outputs")
+    parser.add_argument('--metrics', nargs='+', choices=list(METRICS), help="Defaults to all")
+    parser.add_argument('--start', default='2022-01-01', help="First date of the ILSA / TOOH summaries")
+    parser.add_argument('--end', help="Last date of the ILSA / TOOH summaries, defaults to today")
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--debounce', type=float, help="Debounce events first, in seconds")
+    parser.add_argument('--min-duration', type=float, default=90)
+    parser.add_argument('--metrics-file', help="JSON lines file of per-stage timings")
+    parser.add_argument('--profile-top', type=int, default=0)
+    args = parser.parse_args()
+
+    run(args.input_dir, args.output_dir, args.metrics, args.workers, study_dates(args.start, args.end),
+        args.debounce, args.min_duration, args.metrics_file, args.profile_top)
@@ -1,4 +1,5 @@
 import os
+import numpy as np
 import pandas as pd
 import re
 import glob
@@ -46,94 +47,285 @@ def sector_to_window(sector, min_per_seg):
     return f"{start_str}–{end_str}"
 
 
-def calculate_most_activation(file_path, number_of_day_sectors=4, k=1):
-    subid = extract_patient_number(file_path)
-    if top_k>day_division:
+MINUTES_PER_DAY = 1440
+
+
+def check_sectors(number_of_day_sectors, k):
+    if k > number_of_day_sectors:
         raise ValueError("top_k must be less then day_division")
-    if 1440 % number_of_day_sectors != 0:
+    if MINUTES_PER_DAY % number_of_day_sectors != 0:
         raise ValueError("x must divide by 1440 evenly")
-    
-    min_per_seg = 1440 // number_of_day_sectors
-    df = pd.read_csv(file_path, parse_dates=['stamp'])
-
-    df['date'] = df['stamp'].dt.date
-    df['minutes_since_midnight'] = df['stamp'].dt.hour * 60 + df['stamp'].dt.minute
-    df['time_sector'] = (df['minutes_since_midnight'] // min_per_seg) + 1 
-
-    step_summary = df.groupby(['date', 'time_sector'])['steps'].sum().reset_index()
-    top_k_by_day = (
-        step_summary
-        .sort_values(['date', 'steps'], ascending=[True, False])
-        .groupby('date')
-        .head(k)
-        .reset_index(drop=True)
-    )
-
-    top_k_by_day['rank'] = (
-        top_k_by_day
-        .groupby('date')['steps']
-        .rank(method='first', ascending=False)
-        .astype(int)
-    )
-    
-    
-    # Uncomment for Optional Formating : if users want to see the time split instead sector (3 -> 12:00:00-18:00:00) 
-   
 
-    # top_k_by_day['window'] = top_k_by_day['time_sector'].apply(lambda s: sector_to_window(s, min_per_seg))
-    # wide = top_k_by_day.pivot(index='date', columns='rank', values=['window', 'steps'])
-    # wide.columns = [f"{col[0]}_{col[1]}" for col in wide.columns]
-    # wide = wide.reset_index()
-    # wide['subid'] = subid
 
-    # cols = ['subid', 'date'] + [col for col in wide.columns if col not in ['subid', 'date']]
-    # wide = wide[cols]
+def minute_steps(df):
+    """
+    Bins the step counts of a watch file into one row of 1440 minutes per day.
 
+    Parameters:
+        df (pd.DataFrame): Watch data with 'stamp' (datetime) and 'steps' columns.
 
-    wide = top_k_by_day.pivot(index='date', columns='rank', values=['time_sector', 'steps'])
-    wide.columns = [f"{col[0]}_{col[1]}" for col in wide.columns]  
-    wide = wide.reset_index()
+    Returns:
+        tuple: (dates, steps, readings) where dates lists the days with data in order, and steps
+            and readings are (days x 1440) arrays of the step sum and number of rows of every minute.
+    """
+    stamps = df['stamp']
+    if stamps.dt.tz is not None:
+        stamps = stamps.dt.tz_localize(None)
+    valid = stamps.notna().values
+    minutes = stamps.values[valid].astype('datetime64[m]').astype(np.int64)
+    weights = df['steps'].values[valid]
 
-    # Add subid to every row
-    wide['subid'] = subid
+    days, day_index = np.unique(minutes // MINUTES_PER_DAY, return_inverse=True)
+    cell = day_index * MINUTES_PER_DAY + minutes % MINUTES_PER_DAY
+    size = days.size * MINUTES_PER_DAY
+    steps = np.bincount(cell, weights=np.nan_to_num(weights.astype(np.float64)), minlength=size)
+    if np.issubdtype(weights.dtype, np.integer):
+        steps = steps.astype(np.int64)
+    readings = np.bincount(cell, minlength=size)
+
+    dates = list(days.astype('datetime64[D]').astype(object))
+    return dates, steps.reshape(-1, MINUTES_PER_DAY), readings.reshape(-1, MINUTES_PER_DAY)
+
+
+def sector_sums(minutes, number_of_day_sectors):
+    """
+    Sums (days x 1440) minute values into (days x number_of_day_sectors) equal sectors.
+    """
+    dtype = np.result_type(minutes.dtype, np.int64)
+    return minutes.reshape(minutes.shape[0], number_of_day_sectors, -1).sum(axis=2, dtype=dtype)
+
+
+def top_k_sectors(steps, present, k):
+    """
+    Selects the k busiest sectors of every day with argpartition.
+
+    Sectors with equal steps are ranked by time, and sectors without any readings are never selected.
+
+    Parameters:
+        steps (np.ndarray): (days x sectors) step sums.
+        present (np.ndarray): (days x sectors) mask of the sectors with readings.
+        k (int): Number of sectors per day.
+
+    Returns:
+        tuple: (sector, steps, found) (days x k) arrays of the 1-based sector, its steps and
+            whether the day had that many sectors with readings, ordered by rank.
+    """
+    values = np.where(present, steps, -np.inf)
+    n_days, n_sectors = values.shape
+    rows = np.arange(n_days)[:, None]
+
+    # k-th largest value of every day; the sectors above it are in the top k, and the earliest
+    # sectors equal to it fill the remaining places
+    kth = np.argpartition(values, n_sectors - k, axis=1)[:, n_sectors - k]
+    kth = values[rows[:, 0], kth][:, None]
+    tied = values == kth
+    need = k - (values > kth).sum(axis=1)
+    take = (values > kth) | (tied & (np.cumsum(tied, axis=1) <= need[:, None]))
+
+    day, sector = np.nonzero(take)
+    order = np.lexsort((sector, -values[day, sector], day))
+    sector = sector[order].reshape(n_days, k)
+    found = present[rows, sector]
+    return sector + 1, steps[rows, sector], found
+
+
+def top_k_table(subid, dates, sector, steps, found, sector_name='time_sector'):
+    """
+    Lays out top-k picks as one row per day: subid, date, time_sector_1..k, steps_1..k.
+    """
+    wide = {'subid': subid, 'date': dates}
+    for name, values in ((sector_name, sector), ('steps', steps)):
+        for rank in range(values.shape[1]):
+            # A rank no day reaches gets no column
+            if found[:, rank].all():
+                wide[f"{name}_{rank + 1}"] = values[:, rank]
+            elif found[:, rank].any():
+                wide[f"{name}_{rank + 1}"] = pd.Series(values[:, rank]).where(found[:, rank])
+    return pd.DataFrame(wide)
+
+
+def read_minutes(file_path, use_store=False):
+    """
+    Reads a watch file once into (subid, dates, steps, readings), see minute_steps.
+
+    With use_store the per-minute arrays come from the step_store materialization of the file,
+    built on first use (under the event cache directory), so later queries skip the csv.
+    """
+    if use_store:
+        from step_store import load_minutes
+        return load_minutes(file_path)
+    df = pd.read_csv(file_path, usecols=['stamp', 'steps'], parse_dates=['stamp'])
+    return (extract_patient_number(file_path),) + minute_steps(df)
+
+
+def most_activation(file_path, combos, use_store=False):
+    """
+    Top-k activity sectors of every day for several (number_of_day_sectors, k) combinations,
+    reading and binning the file once.
+
+    Parameters:
+        file_path (str): Watch_Raw_Data_DETECT_*.csv file.
+        combos (list): (number_of_day_sectors, k) pairs.
+        use_store (bool): Read the per-minute step store instead of the csv (see read_minutes).
+
+    Returns:
+        dict: (number_of_day_sectors, k) -> wide DataFrame, as calculate_most_activation.
+    """
+    for number_of_day_sectors, k in combos:
+        check_sectors(number_of_day_sectors, k)
+    subid, dates, steps, readings = read_minutes(file_path, use_store)
+
+    results = {}
+    for number_of_day_sectors, k in combos:
+        sector, sector_steps, found = top_k_sectors(
+            sector_sums(steps, number_of_day_sectors), sector_sums(readings, number_of_day_sectors) > 0, k
+        )
+        results[(number_of_day_sectors, k)] = top_k_table(subid, dates, sector, sector_steps, found)
+    return results
+
+
+def calculate_most_activation(file_path, number_of_day_sectors=4, k=1, use_store=False):
+    """
+    The k busiest of number_of_day_sectors equal sectors of every day, as one row per day:
+    subid, date, time_sector_1..k, steps_1..k. use_store as in most_activation.
+    """
+    # Optional Formating : if users want to see the time split instead sector (3 -> 12:00:00-18:00:00),
+    # map the time_sector_i columns with sector_to_window(s, 1440 // number_of_day_sectors)
+    return most_activation(file_path, [(number_of_day_sectors, k)], use_store)[(number_of_day_sectors, k)]
+
+
+def minute_to_clock(minute):
+    return f"{(minute % 1440) // 60:02d}:{(minute % 1440) % 60:02d}"
+
+
+def top_k_windows(steps, readings, window_minutes, k):
+    """
+    Selects the k busiest non-overlapping windows of window_minutes minutes of every day.
+
+    Window sums come from one prefix sum over the minutes of each day, so every window length costs
+    O(days x 1440). Windows are picked greedily, busiest first and earliest on ties, and every pick
+    rules out the windows overlapping it. Windows without readings are never picked.
+
+    Parameters:
+        steps (np.ndarray): (days x 1440) per-minute step sums from minute_steps.
+        readings (np.ndarray): (days x 1440) per-minute readings from minute_steps.
+        window_minutes (int): Window length in minutes.
+        k (int): Number of windows per day.
+
+    Returns:
+        tuple: (start, steps, found) (days x k) arrays of the window's start minute, its steps and
+            whether the day had that many windows, ordered by rank.
+    """
+    if not 1 <= window_minutes <= MINUTES_PER_DAY:
+        raise ValueError("window_minutes must be between 1 and 1440")
+    n_days = steps.shape[0]
+    rows = np.arange(n_days)
+
+    def window_sums(minutes):
+        prefix = np.zeros((n_days, MINUTES_PER_DAY + 1), dtype=np.result_type(minutes.dtype, np.int64))
+        np.cumsum(minutes, axis=1, out=prefix[:, 1:])
+        return prefix[:, window_minutes:] - prefix[:, :-window_minutes]
+
+    sums = window_sums(steps)
+    values = np.where(window_sums(readings) > 0, sums, -np.inf)
+    offsets = np.arange(values.shape[1])
+
+    start = np.zeros((n_days, k), dtype=np.int64)
+    found = np.zeros((n_days, k), dtype=bool)
+    for rank in range(k):
+        best = values.argmax(axis=1)
+        found[:, rank] = values[rows, best] > -np.inf
+        start[:, rank] = best
+        # Windows starting less than window_minutes from the pick overlap it
+        overlap = np.abs(offsets[None, :] - best[:, None]) < window_minutes
+        values[overlap & found[:, rank][:, None]] = -np.inf
+    return start, sums[rows[:, None], start], found
 
-    # Optional: Reorder columns for cleaner output
-    cols = ['subid', 'date'] + [col for col in wide.columns if col not in ['subid', 'date']]
-    wide = wide[cols]
-    
-    return wide  
 
+def peak_windows(file_path, combos, use_store=False):
+    """
+    Top-k non-overlapping activity windows of every day for several (window_minutes, k)
+    combinations, reading and binning the file once.
+
+    Parameters:
+        file_path (str): Watch_Raw_Data_DETECT_*.csv file.
+        combos (list): (window_minutes, k) pairs.
+        use_store (bool): Read the per-minute step store instead of the csv (see read_minutes).
 
+    Returns:
+        dict: (window_minutes, k) -> one row per day: subid, date, window_1..k ('HH:MM–HH:MM'),
+            steps_1..k.
+    """
+    subid, dates, steps, readings = read_minutes(file_path, use_store)
 
+    results = {}
+    for window_minutes, k in combos:
+        start, window_steps, found = top_k_windows(steps, readings, window_minutes, k)
+        windows = np.array([
+            [f"{minute_to_clock(s)}–{minute_to_clock(s + window_minutes)}" for s in day] for day in start
+        ], dtype=object).reshape(start.shape)
+        results[(window_minutes, k)] = top_k_table(subid, dates, windows, window_steps, found, 'window')
+    return results
 
-def directory(input_dir, output_dir, max_workers = None):
+
+def combo_path(output_path, label):
+    root, ext = os.path.splitext(output_path)
+    return f"{root}_{label}{ext}"
+
+
+# directory() modes: per-file task and the output csv label of a combination
+MODES = {
+    'sectors': (most_activation, "{}x{}"),
+    'windows': (peak_windows, "{}minx{}"),
+}
+
+
+def directory(input_dir, output_dir, max_workers = None, combos = None, mode = 'sectors', use_store = False):
+    """
+    Top-k activity of every Watch_Raw_Data_DETECT_*.csv file in input_dir.
+
+    Parameters:
+        input_dir (str): Directory of the watch files.
+        output_dir (str): Output csv. With several combos, one csv per combination named
+            <output>_<number_of_day_sectors>x<k>.csv (<output>_<window_minutes>minx<k>.csv for windows).
+        max_workers (int, optional): Worker processes, None for one per core.
+        combos (list, optional): (number_of_day_sectors, k) pairs, or (window_minutes, k) pairs for
+            the windows mode; each file is read once for all of them. Defaults to [(day_division, top_k)].
+        mode (str): 'sectors' for the busiest fixed sectors (most_activation), 'windows' for the
+            busiest sliding windows (peak_windows).
+        use_store (bool): Read every file through the per-minute step store (see step_store.py),
+            built on first use, so later runs with other combos skip the csvs.
+    """
+    combos = [(day_division, top_k)] if combos is None else list(combos)
+    task, label = MODES[mode]
     pattern = os.path.join(input_dir, "Watch_Raw_Data_DETECT_*.csv")
     data_files = glob.glob(pattern)
     
-    all_results = []
+    all_results = defaultdict(list)
     
     with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
         futures = {
-            executor.submit(calculate_most_activation, f, day_division, top_k): f
+            executor.submit(task, f, combos, use_store): f
             for f in data_files
         }
 
         for future in concurrent.futures.as_completed(futures):
             file_path = futures[future]
             try:
-                df = future.result() 
-                if df is not None and not df.empty:
-                    all_results.append(df)
+                for combo, df in future.result().items():
+                    if df is not None and not df.empty:
+                        all_results[combo].append(df)
             except Exception as e:
                 print(f"Error processing {file_path}: {e}")
 
-    if all_results:
-        final_df = pd.concat(all_results, ignore_index=True)
-        final_df = final_df.sort_values(by=['subid', 'date'])
-        final_df.to_csv(output_dir, index=False)
-        
-    else:
-        print("No results to save.")
+    for combo in combos:
+        if all_results[combo]:
+            final_df = pd.concat(all_results[combo], ignore_index=True)
+            final_df = final_df.sort_values(by=['subid', 'date'])
+            final_df.to_csv(output_dir if len(combos) == 1 else combo_path(output_dir, label.format(*combo)), index=False)
+            
+        else:
+            print("No results to save.")
 
 if __name__ == "__main__":
     input_dir = r"C:\Users\nguyphu2\Desktop\OHSU_data\RAW"
@@ -1,4 +1,5 @@
 import os
+import numpy as np
 import pandas as pd
 import re
 import glob
@@ -6,10 +7,18 @@ import concurrent.futures
 import logging
 import time
 from functools import lru_cache
-from datetime import datetime
 from datetime import timedelta
 from typing import Dict, Optional
-from collections import defaultdict
+
+from areas import get_registry
+from daybounds import stamps_to_ns
+from dwell import DAY_NS, dwell_intervals
+from event_cache import load_events
+from instrumentation import Run, stage
+from long_store import long_from_rows, write_long
+from kernels import debounce
+from shared_state import get_state, init_worker
+from sleep_windows import day_windows, window_of
 
 NON_AREAS = [58,59,60,61,62,63,64,65,66,67,68,69,82,83,-1]
 ROOMS = [4,5,6,9,10,11,12,13,14,25,26,39,40,41,42,51,52,71,72]
@@ -22,328 +31,267 @@ standard_tracking_areas = [
 
 PATIENT_PATTERN = r'DETECT_(\d+)\.csv'
 
-area_mapping = {
-    1: "Bathroom 1", 2: "Bathroom 2", 3: "Bathroom 3", 4: "Bedroom 1", 5: "Bedroom 2", 6: "Bedroom 3",
-    23: "Kitchen 1", 24: "Kitchen 2", 51: "Bathroom 4", 52: "Bathroom 5", 71: "Bedroom 4", 72: "Bedroom 5",
-}
+# Sleep windows of days without sleep_summary records, as offsets from midnight
+DEFAULT_SLEEP_WINDOWS = [
+    (timedelta(hours=0), timedelta(hours=5)),                                             # 00:00:00 - 05:00:00
+    (timedelta(hours=21), timedelta(hours=23, minutes=59, seconds=59, microseconds=999999)),  # 21:00:00 - 23:59:59.999999
+]
+BATHROOMS = [1, 2, 3, 51, 52]
+KITCHENS = [23, 24]
 
-# mapping each subids to homeids
-sub_home_df = pd.read_csv('subid_homeid.csv')
+area_mapping = get_registry().names
 
-home_to_subids = defaultdict(list)
-
-for index, row in sub_home_df.iterrows():
-    homeid = int(row['homeid'])
-    subid = int(row['subid'])
-    home_to_subids[homeid].append(subid)
-    
-# Load the CSV file first
-try:
-    sleep_df = pd.read_csv('sleep_summary.csv', parse_dates=['start_sleep', 'end_sleep'])
-    # Drop rows with missing values
-    sleep_df = sleep_df.dropna(subset=['subid', 'date', 'start_sleep', 'end_sleep'])
-    # Convert 'date' to just the date part
-    sleep_df['date'] = pd.to_datetime(sleep_df['date']).dt.normalize()
-    # No aggregation — preserve multiple rows per subid/date
-    sleep_df['subid'] = sleep_df['subid'].astype(int)
-
-    sleep_dict = sleep_df.groupby(['subid', 'date'])[['start_sleep', 'end_sleep']].apply(
-        lambda x: list(x.to_dict('records'))
-    ).to_dict()
-    
-    #print(f"Loaded sleep data for {len(sleep_dict)} subid/date combinations")
-    # Print first few entries for debugging
-    # for i, (key, value) in enumerate(sleep_dict.items()):
-    #     if i < 3:  # Show first 3 entries
-    #         print(f"Sleep key: {key}, Value: {value}")
-
-except FileNotFoundError:
-    print("Warning: sleep_summary.csv not found. Using default sleep windows.")
-    sleep_dict = {}
+# subid_homeid.csv and sleep_summary.csv are loaded on first use, see shared_state.py
 
 def extract_patient_number(file_path):
     match = re.search(PATIENT_PATTERN, file_path)
     return match.group(1) if match else None
 
+def next_activation_stops(stamps, events, groups, window_end):
+    """
+    Bedroom dwell kernel: every activation lasts until the next activation of its group.
+
+    Works on whole arrays for any number of (date, area, sleep window) groups in one pass.
+    The last activation of a group is stopped at that group's window end.
+
+    Args:
+        stamps (np.ndarray): Event times (datetime64 or int64), in time order within each group
+        events (np.ndarray): 0/1 event per row
+        groups (np.ndarray): Group id per row, non-decreasing (rows sorted by group, then time)
+        window_end (np.ndarray): Window end per group id, same dtype as stamps
+
+    Returns:
+        tuple: (start, stop, group) arrays, one entry per activation
+    """
+    act = np.flatnonzero(events == 1)
+    start = stamps[act]
+    group = groups[act]
+
+    stop = np.empty_like(start)
+    if act.size:
+        stop[:-1] = start[1:]
+        last = np.append(group[1:] != group[:-1], True)
+        stop[last] = window_end[group[last]]
+    return start, stop, group
+
 def modified_tracking_logic(group, areaid, end_of_day):
     if group.empty:
         return [], []
-    
-    stamps = group['stamp'].tolist()
-    events = group['event'].tolist()
-    start, stop = [], []
-    
-    # Find all activation events (event=1)
-    for i in range(len(events)):
-        if events[i] == 1:
-            start.append(stamps[i])
-            
-            # Find the next activation or end of period
-            next_activation = None
-            for j in range(i + 1, len(events)):
-                if events[j] == 1:
-                    next_activation = stamps[j]
-                    break
-            
-            if next_activation is not None:
-                stop.append(next_activation)
-            else:
-                # No next activation, extend to end of sleep period
-                stop.append(end_of_day)
-    
-    return start, stop
+
+    start, stop, _ = next_activation_stops(
+        group['stamp'].values,
+        group['event'].values,
+        np.zeros(len(group), dtype=np.int64),
+        np.array([pd.Timestamp(end_of_day).to_datetime64()], dtype='datetime64[ns]'),
+    )
+    return list(pd.to_datetime(start)), list(pd.to_datetime(stop))
 
 def standard_tracking_logic(group, areaid, end_of_day):
     if group.empty:
         return [], []
-        
-    stamps = group['stamp'].tolist()
-    events = group['event'].tolist()
-    start, stop = [], []
-    
-    # If first event is activation, start tracking
-    if events[0] == 1:
-        start.append(stamps[0])
-    
-    # Look for on/off transitions
-    for i in range(1, len(events)):
-        if events[i-1] == 0 and events[i] == 1:  # Off to On
-            start.append(stamps[i])
-        elif events[i-1] == 1 and events[i] == 0:  # On to Off
-            stop.append(stamps[i])
-    
-    # If we have more starts than stops, cap the last period
-    if len(stop) < len(start):
-        last_start = start[-1]
-        stop.append(last_start + timedelta(minutes=5))
-    
-    return start, stop
 
-def calculate_daily_area_occupancy(file_path, min_duration_seconds=90):
+    # On/off transitions; an unmatched last start is capped 5 minutes later
+    dwells = dwell_intervals(
+        stamps_to_ns(group['stamp']),
+        np.zeros(len(group), dtype=np.int64),
+        group['event'].values,
+        np.zeros(len(group), dtype=np.int64),
+        leading='keep', trailing='cap', cap=int(timedelta(minutes=5).total_seconds()) * 10**9,
+    )
+    return list(pd.to_datetime(dwells['start'])), list(pd.to_datetime(dwells['stop']))
+
+def night_dwells(stamps, areaid, event, day, windows):
+    """
+    Bedroom dwells inside sleep windows for every (date, area) of a home at once.
+
+    Every activation inside a window lasts until the next activation of the same area and
+    window, the last one until the window ends (modified_tracking_logic per window).
+
+    Args:
+        stamps (np.ndarray): int64 UTC ns, rows sorted by (day, areaid, stamp)
+        areaid (np.ndarray): Area id per row
+        event (np.ndarray): 0/1 event per row
+        day (np.ndarray): UTC day key per row (stamps // DAY_NS)
+        windows (tuple): Merged (day, start, end) sleep windows, see sleep_windows.day_windows
+
+    Returns:
+        dict: 'areaid', 'start', 'stop' and 'day' arrays, one entry per activation
+    """
+    win = window_of(stamps, day, windows)
+    rows = np.flatnonzero(win >= 0)
+    win = win[rows]
+    # A day's windows are disjoint and sorted, so every (day, area, window) segment is contiguous
+    new = np.ones(rows.size, dtype=bool)
+    new[1:] = (day[rows][1:] != day[rows][:-1]) | (areaid[rows][1:] != areaid[rows][:-1]) | (win[1:] != win[:-1])
+    start, stop, segment = next_activation_stops(stamps[rows], event[rows], np.cumsum(new) - 1, windows[2][win[new]])
+    first = rows[new][segment]
+    return {'areaid': areaid[first], 'start': start, 'stop': stop, 'day': day[first]}
+
+def standard_dwells(stamps, areaid, event, day):
+    """
+    Standard tracking dwells of every (day, area): a visit still open at the area's last event
+    of the day lasts 5 minutes. Returns dwell_intervals' dict.
+    """
+    return dwell_intervals(
+        stamps, areaid, event, day,
+        leading='keep', trailing='cap', cap=int(timedelta(minutes=5).total_seconds()) * 10**9,
+    )
+
+def _group_key(day, areaid):
+    # Sorts like (day, areaid); area ids are int16
+    return day * 65536 + (areaid + 32768)
+
+def calculate_daily_area_occupancy(file_path, min_duration_seconds=90, debounce_seconds=None):
     if isinstance(min_duration_seconds, (tuple, list)):
         min_duration_seconds = min_duration_seconds[0] if len(min_duration_seconds) > 0 else 90
     min_duration_seconds = float(min_duration_seconds)
     try:
-        print(f"Processing: {os.path.basename(file_path)}")
-        df = pd.read_csv(
-        file_path,
-        usecols=['stamp', 'areaid', 'event'],
-        dtype={'areaid': 'int32', 'event': 'int8'}
-        )
-        df['stamp'] = pd.to_datetime(df['stamp'], errors='coerce')  # Force datetime with NaT for bad values
-        df = df.dropna(subset=['stamp'])  # Drop rows with invalid timestamps
+        homeid = extract_patient_number(file_path)
+        if not homeid:
+            return pd.DataFrame()
+        with stage('load') as s:
+            df = load_events(file_path)  # Invalid timestamps are dropped when the pull file is cached
+            s.rows_out = len(df)
+        return daily_area_occupancy(df, int(homeid), min_duration_seconds, debounce_seconds)
 
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        import traceback
+        traceback.print_exc()
+        return pd.DataFrame()
+
+def daily_area_occupancy(df, homeid, min_duration_seconds=90, debounce_seconds=None, dwells=None):
+    """
+    Daily tracked hours and visit counts of one home from its events.
+
+    Every day is computed from that day's events only, so any set of whole (UTC) days can be
+    passed in, e.g. one batch at a time from streaming.py.
+
+    Args:
+        df (pd.DataFrame): Events with 'stamp' (UTC), 'areaid' and 'event'
+        homeid (int): Home the events belong to
+        min_duration_seconds (float): Dwells shorter than this are ignored
+        debounce_seconds (float, optional): Drop transitions that do not last this long first
+            (see kernels.debounce)
+        dwells (dict, optional): Standard tracking dwells of df (see standard_dwells) when
+            already computed; any areas, only the standard tracking areas are used
+
+    Returns:
+        pd.DataFrame: One row per (date, subid) of the home
+    """
+    with stage('prepare', len(df)) as s:
+        if debounce_seconds:
+            df = debounce(df, debounce_seconds)
+        df = df.copy()
         df['date'] = df['stamp'].dt.date
-        df['hour'] = df['stamp'].dt.hour
         df = df[~df['areaid'].isin(NON_AREAS)]
         df = df.sort_values(['date', 'areaid', 'stamp'])
-        df['area_name'] = df['areaid'].map(area_mapping).fillna(df['areaid'].apply(lambda x: f'Area_{x}'))
-        homeid = extract_patient_number(file_path)
-        if not homeid:
-            return pd.DataFrame()
-        homeid = int(homeid)
+        s.rows_out = len(df)
 
-        if homeid not in home_to_subids:
-            #print(f"⚠️ Warning: HomeID {homeid} not found in mapping.")
-            return pd.DataFrame()
+    state = get_state()
+    all_subids = state.subids(homeid)
+    if not all_subids:
+        #print(f"⚠️ Warning: HomeID {homeid} not found in mapping.")
+        return pd.DataFrame()
+
+    patient_id = all_subids[0]  # Use one for sleep window lookups
+    if df.empty:
+        return pd.DataFrame()
+
+    registry = get_registry()
+    stamps = stamps_to_ns(df['stamp'])
+    day = stamps // DAY_NS
+    areaid = df['areaid'].values.astype(np.int64)
+    event = df['event'].values
+
+    # (date, area) groups in groupby order
+    first = np.ones(len(df), dtype=bool)
+    first[1:] = (day[1:] != day[:-1]) | (areaid[1:] != areaid[:-1])
+    group = np.cumsum(first) - 1
+    n_groups = group[-1] + 1
+    group_key = _group_key(day[first], areaid[first])
+    group_area = areaid[first]
+    group_date = df['date'].values[first]
+
+    # Sleep windows of every day: the day's sleep_summary records, else the defaults
+    sleep_entry = state.sleep_entry(patient_id)
+    windows = day_windows(sleep_entry, day, DEFAULT_SLEEP_WINDOWS)
+
+    # Standard bathroom/kitchen tracking; a visit is at night when it starts inside a sleep window
+    std = np.isin(areaid, standard_tracking_areas)
+    with stage('standard_tracking', int(std.sum())) as s:
+        if dwells is None:
+            dwells = standard_dwells(stamps[std], areaid[std], event[std], day[std])
+        else:
+            dwells = {key: values[np.isin(dwells['areaid'], standard_tracking_areas)] for key, values in dwells.items()}
+        s.rows_out = dwells['start'].size
+    duration = (dwells['stop'] - dwells['start']) / 1e9
+    ok = duration >= min_duration_seconds
+    night = window_of(dwells['start'], dwells['day'], windows) >= 0
+    dwell_group = np.searchsorted(group_key, _group_key(dwells['day'], dwells['areaid']))
+    hours = np.bincount(dwell_group[ok], weights=duration[ok] / 3600, minlength=n_groups)
+    visits = np.bincount(dwell_group[ok], minlength=n_groups)
+    night_visits = np.bincount(dwell_group[ok & night], minlength=n_groups)
+
+    # Bedroom tracking - night hours only
+    bed = np.isin(areaid, TRACKING)
+    with stage('bedroom_tracking', int(bed.sum())) as s:
+        nights = night_dwells(stamps[bed], areaid[bed], event[bed], day[bed], windows)
+        s.rows_out = nights['start'].size
+    duration = (nights['stop'] - nights['start']) / 1e9
+    ok = duration >= min_duration_seconds
+    night_group = np.searchsorted(group_key, _group_key(nights['day'], nights['areaid']))
+    hours += np.bincount(night_group[ok], weights=duration[ok] / 3600, minlength=n_groups)
+
+    # Sleep window times reported in the output, from the last day processed
+    _, last_start, last_end = day_windows(sleep_entry, day[-1:], DEFAULT_SLEEP_WINDOWS, merge=False)
+    early_start_str = pd.Timestamp(last_start[0]).strftime("%H:%M:%S")
+    early_end_str   = pd.Timestamp(last_end[0]).strftime("%H:%M:%S")
+    late_start_str  = pd.Timestamp(last_start[-1]).strftime("%H:%M:%S")
+    late_end_str    = pd.Timestamp(last_end[-1]).strftime("%H:%M:%S")
+
+    daily_occupancy = {}
+    daily_totals_by_date = {}
+    visit_tracker = {}
+    for g in np.flatnonzero(np.isin(group_area, standard_tracking_areas + TRACKING)):
+        current_date = group_date[g]
+        if current_date not in daily_occupancy:
+            daily_occupancy[current_date] = {}
+            daily_totals_by_date[current_date] = 0
+            visit_tracker[current_date] = {"Bathroom": 0, "Kitchen": 0, "Night_Kitchen": 0, "Night_Bathroom": 0}
+
+        daily_occupancy[current_date][f'{registry.name(group_area[g])}_Hours'] = hours[g]
+        daily_totals_by_date[current_date] += hours[g]
+        if group_area[g] in BATHROOMS:
+            visit_tracker[current_date]["Bathroom"] += visits[g]
+            visit_tracker[current_date]["Night_Bathroom"] += night_visits[g]
+        elif group_area[g] in KITCHENS:
+            visit_tracker[current_date]["Kitchen"] += visits[g]
+            visit_tracker[current_date]["Night_Kitchen"] += night_visits[g]
+
+    # Create output rows
+    results = []
+    for date, data in daily_occupancy.items():
+        row = {
+            'Date': date,
+            'Window': "Full Day",
+            'subid': patient_id,
+            'Total_Tracked_Hours': daily_totals_by_date[date],
+            'Bathroom_Visits': visit_tracker[date]["Bathroom"],
+            'Night_Bathroom_Visits': visit_tracker[date]["Night_Bathroom"],
+            'Kitchen_Visits': visit_tracker[date]["Kitchen"],
+            'Night_Kitchen_Visits': visit_tracker[date]["Night_Kitchen"],
+            'Early_Start_Time': early_start_str,
+            'Early_End_Time': early_end_str,
+            'Late_Start_Time': late_start_str,
+            'Late_End_Time': late_end_str,
+        }
+        row.update(data)
+        results.append(row)
 
-        all_subids = home_to_subids[homeid]
-        patient_id = all_subids[0]  # Use one for sleep_dict lookups
-
-        results = []
-
-        for window_name, window_df in {"Full Day": df}.items():
-            daily_occupancy = {}
-            daily_totals_by_date = {}
-            visit_tracker = {}
-            
-            for (current_date, areaid), group in window_df.groupby(['date', 'areaid']):
-                area_name = group['area_name'].iloc[0]
-                end_of_day = datetime.combine(group['stamp'].iloc[0].date(), datetime.max.time()).replace(hour=23, minute=59, second=59)
-                
-                # Always define fallback windows
-                early_night_start = datetime.combine(current_date, datetime.min.time())  # 00:00:00
-                early_night_end   = early_night_start.replace(hour=5)            # 05:00:00
-                late_night_start  = datetime.combine(current_date, datetime.min.time()).replace(hour=21)  # 21:00:00
-                late_night_end    = datetime.combine(current_date, datetime.max.time()).replace(hour=23, minute=59, second=59)  # 23:59:59
-
-                # Get sleep windows - FIXED SECTION
-                sleep_windows = []
-                
-                # Convert current_date to normalized pandas timestamp for lookup
-                lookup_date = pd.to_datetime(current_date).normalize()
-                sleep_key = (int(patient_id), lookup_date)
-                
-                #print(f"Looking up sleep data for key: {sleep_key}")
-
-                # Use sleep data for the current date
-                if sleep_key in sleep_dict:
-                    #print(f"Found sleep data for {sleep_key}")
-                    for record in sleep_dict[sleep_key]:
-                        try:
-                            start = pd.to_datetime(record['start_sleep'])
-                            end = pd.to_datetime(record['end_sleep'])
-                            if pd.isna(start) or pd.isna(end):
-                                #print(f"Invalid sleep times: start={start}, end={end}")
-                                continue
-                            sleep_windows.append((start, end))
-                            #print(f"Added sleep window: {start} to {end}")
-                        except Exception as e:
-                            #print(f"Error processing sleep record: {e}")
-                            continue
-                # else:
-                #     print(f"No sleep data found for key: {sleep_key}")
-                #     print(f"Available keys: {list(sleep_dict.keys())[:5]}...")  # Show first 5 keys
-                
-                # If no valid sleep data, fallback to default
-                if not sleep_windows:
-                    #print("Using default sleep windows")
-                    sleep_windows = [
-                        (early_night_start, early_night_end),
-                        (late_night_start, late_night_end)
-                    ]
-                
-                # Set time strings for output
-                if sleep_windows:
-                    # Sort all sleep windows by start time
-                    sorted_windows = sorted(sleep_windows, key=lambda x: x[0])
-                    early_start_str = sorted_windows[0][0].strftime("%H:%M:%S")
-                    early_end_str   = sorted_windows[0][1].strftime("%H:%M:%S")
-                    late_start_str  = sorted_windows[-1][0].strftime("%H:%M:%S")
-                    late_end_str    = sorted_windows[-1][1].strftime("%H:%M:%S")
-                else:
-                    # Fallback to default times
-                    early_start_str = early_night_start.strftime("%H:%M:%S")
-                    early_end_str   = early_night_end.strftime("%H:%M:%S")
-                    late_start_str  = late_night_start.strftime("%H:%M:%S")
-                    late_end_str    = late_night_end.strftime("%H:%M:%S")
-
-                group = group.sort_values('stamp').reset_index(drop=True)
-                total_hours = 0
-
-                # Process different area types
-                if areaid in standard_tracking_areas:
-                    # Standard bathroom/kitchen tracking
-                    start, stop = standard_tracking_logic(group, areaid, end_of_day)
-                    for s1, s2 in zip(start, stop):
-                        duration = (s2 - s1).total_seconds()
-                        if duration >= min_duration_seconds:
-                            total_hours += (duration / 3600)   
-                            
-                            if current_date not in visit_tracker:
-                                visit_tracker[current_date] = {
-                                    "Bathroom": 0,
-                                    "Kitchen": 0,
-                                    "Night_Kitchen": 0,
-                                    "Night_Bathroom": 0
-                                }
-
-                            
-                            # Check if s1 falls into *any* of the valid sleep windows
-                            is_nighttime = any(sleep_start <= s1 <= sleep_end for sleep_start, sleep_end in sleep_windows)
-
-                            if areaid in [1,2,3,51,52]:
-                                visit_tracker[current_date]["Bathroom"] += 1
-                                if is_nighttime:
-                                    visit_tracker[current_date]["Night_Bathroom"] += 1
-                            elif areaid in [23,24]:
-                                visit_tracker[current_date]["Kitchen"] += 1
-                                if is_nighttime:
-                                    visit_tracker[current_date]["Night_Kitchen"] += 1
-
-
-
-                elif areaid in TRACKING:
-                    # Bedroom tracking - focus on night hours during sleep periods
-                    night_hours = 0
-                    day_hours = 0
-                    
-                    # Process each sleep window
-                    for sleep_start, sleep_end in sleep_windows:
-                        try:
-                            # Ensure sleep_start and sleep_end are datetime objects
-                            if not isinstance(sleep_start, datetime):
-                                sleep_start = pd.to_datetime(sleep_start)
-                            if not isinstance(sleep_end, datetime):
-                                sleep_end = pd.to_datetime(sleep_end)
-                            
-                            # Filter data for this sleep window
-                            night_mask = (group['stamp'] >= sleep_start) & (group['stamp'] <= sleep_end)
-                            night_data = group[night_mask]
-                            
-                            if not night_data.empty:
-                                night_start, night_stop = modified_tracking_logic(night_data, areaid, sleep_end)
-                                
-                                for j, (s1, s2) in enumerate(zip(night_start, night_stop)):
-                                    duration = (s2 - s1).total_seconds()
-                                    
-                                    if duration >= min_duration_seconds:
-                                        hours = duration / 3600
-                                        night_hours += hours
-                                        
-                        except Exception as e:
-                            #print(f"Error processing sleep window: {e}")
-                            continue
-                    
-                    # Process day hours (everything outside sleep windows)
-                    day_data = group.copy()
-                    for sleep_start, sleep_end in sleep_windows:
-                        try:
-                            # Ensure sleep_start and sleep_end are datetime objects
-                            if not isinstance(sleep_start, datetime):
-                                sleep_start = pd.to_datetime(sleep_start)
-                            if not isinstance(sleep_end, datetime):
-                                sleep_end = pd.to_datetime(sleep_end)
-                            
-                            # Remove sleep window data
-                            sleep_mask = (day_data['stamp'] >= sleep_start) & (day_data['stamp'] <= sleep_end)
-                            day_data = day_data[~sleep_mask]
-                            
-                        except Exception as e:
-                            #print(f"Error processing day hours: {e}")
-                            continue
-                    
-                    if not day_data.empty:
-                        day_start, day_stop = standard_tracking_logic(day_data, areaid, end_of_day)
-                        for s1, s2 in zip(day_start, day_stop):
-                            duration = (s2 - s1).total_seconds()
-                            
-                            if duration >= min_duration_seconds:
-                                day_hours += (duration / 3600)
-                    
-                    # For bedrooms, we primarily care about night hours
-                    total_hours = night_hours
-                
-                # Store results
-                if areaid in standard_tracking_areas or areaid in TRACKING:
-                    if current_date not in daily_occupancy:
-                        daily_occupancy[current_date] = {}
-                        daily_totals_by_date[current_date] = 0
-
-                    daily_occupancy[current_date][f'{area_name}_Hours'] = total_hours
-                    daily_totals_by_date[current_date] += total_hours
-
-            # Create output rows
-            for date, data in daily_occupancy.items():
-                row = {
-                    'Date': date,
-                    'Window': window_name,
-                    'subid': patient_id,
-                    'Total_Tracked_Hours': daily_totals_by_date[date],
-                    'Bathroom_Visits': visit_tracker.get(date, {}).get("Bathroom", 0),
-                    'Night_Bathroom_Visits': visit_tracker.get(date, {}).get("Night_Bathroom", 0),
-                    'Kitchen_Visits': visit_tracker.get(date, {}).get("Kitchen", 0),
-                    'Night_Kitchen_Visits': visit_tracker.get(date, {}).get("Night_Kitchen", 0),
-                    'Early_Start_Time': early_start_str,
-                    'Early_End_Time': early_end_str,
-                    'Late_Start_Time': late_start_str,
-                    'Late_End_Time': late_end_str,
-                }
-                row.update(data)
-                results.append(row)
-
-        has_multiple = 1 if (len(all_subids)>1) else 0
-        
+    has_multiple = 1 if (len(all_subids)>1) else 0
+    
+    with stage('expand', len(results)) as s:
         expanded_results = []
         for row in results:
             for sid in all_subids:
@@ -352,43 +300,268 @@ def calculate_daily_area_occupancy(file_path, min_duration_seconds=90):
                 row_copy['multiple_subids'] = has_multiple
                 row_copy['homeid'] = homeid
                 expanded_results.append(row_copy)
-        return pd.DataFrame(expanded_results)
+        expanded = pd.DataFrame(expanded_results)
+        s.rows_out = len(expanded)
+    return expanded
 
-    except Exception as e:
-        print(f"Error processing {file_path}: {e}")
-        import traceback
-        traceback.print_exc()
+# Virtual days of all homes of a batch must fit int64 nanoseconds
+MAX_BATCH_DAYS = np.iinfo(np.int64).max // DAY_NS - 1
+
+OCCUPANCY_COLUMNS = [
+    'Date', 'Window', 'subid', 'Total_Tracked_Hours', 'Bathroom_Visits', 'Night_Bathroom_Visits',
+    'Kitchen_Visits', 'Night_Kitchen_Visits', 'Early_Start_Time', 'Early_End_Time',
+    'Late_Start_Time', 'Late_End_Time',
+]
+
+def batch_area_occupancy(file_paths, min_duration_seconds=90, debounce_seconds=None):
+    """
+    Daily area occupancy of many (small) homes at once, the rows of calculate_daily_area_occupancy
+    for every file, in file order.
+
+    The homes are laid end to end on one virtual time axis (each shifted by whole days), so the
+    dwell, sleep window and bincount steps run once over all of them instead of once per file.
+
+    Args:
+        file_paths (list): NYCE_Area_Data_DETECT_<home>.csv files
+        min_duration_seconds (float): Dwells shorter than this are ignored
+        debounce_seconds (float, optional): See daily_area_occupancy
+
+    Returns:
+        pd.DataFrame: One row per (home, date, subid)
+    """
+    state = get_state()
+    homes = []
+    with stage('load') as s:
+        s.rows_out = 0
+        for file_path in file_paths:
+            homeid = extract_patient_number(file_path)
+            if not homeid or not state.subids(int(homeid)):
+                continue
+            try:
+                df = load_events(file_path)
+            except Exception as e:
+                print(f"Error processing {file_path}: {e}")
+                continue
+            s.rows_out += len(df)
+            if debounce_seconds:
+                df = debounce(df, debounce_seconds)
+            df = df[~df['areaid'].isin(NON_AREAS)]
+            if not df.empty:
+                homes.append((int(homeid), df))
+    if not homes:
         return pd.DataFrame()
 
-def directory(input_dir, output, max_workers=None):
+    # Homes per pass, so that the virtual time axis stays within int64 nanoseconds
+    results, chunk, chunk_days = [], [], 0
+    for homeid, df in homes:
+        day = stamps_to_ns(df['stamp']) // DAY_NS
+        span = int(day.max() - day.min()) + 1
+        if chunk and chunk_days + span > MAX_BATCH_DAYS:
+            results.append(_batch_occupancy(chunk, min_duration_seconds))
+            chunk, chunk_days = [], 0
+        chunk.append((homeid, df))
+        chunk_days += span
+    results.append(_batch_occupancy(chunk, min_duration_seconds))
+    return pd.concat(results, ignore_index=True)
+
+def _batch_occupancy(homes, min_duration_seconds):
+    state = get_state()
+    registry = get_registry()
+
+    # Home h's days start at offset[h] on the virtual axis; a home's windows stay on its own days
+    stamps, areaid, event, day, home = [], [], [], [], []
+    windows, offsets, last_days = [], [], []
+    offset = 0
+    for h, (homeid, df) in enumerate(homes):
+        s = stamps_to_ns(df['stamp'])
+        d = s // DAY_NS
+        first = d.min()
+        w_day, w_start, w_end = day_windows(state.sleep_entry(state.subids(homeid)[0]), d, DEFAULT_SLEEP_WINDOWS)
+        shift = offset - first
+        stamps.append(s + shift * DAY_NS)
+        day.append(d + shift)
+        areaid.append(df['areaid'].values.astype(np.int64))
+        event.append(df['event'].values)
+        home.append(np.full(d.size, h))
+        windows.append((w_day + shift, w_start + shift * DAY_NS, w_end + shift * DAY_NS))
+        offsets.append(shift)
+        last_days.append(d.max())
+        offset += int(d.max() - first) + 1
+
+    stamps, areaid, event, day, home = (np.concatenate(a) for a in (stamps, areaid, event, day, home))
+    windows = tuple(np.concatenate([w[i] for w in windows]) for i in range(3))
+    # (day, area, stamp) order; lexsort is stable, as sort_values in daily_area_occupancy
+    order = np.lexsort((stamps, areaid, day))
+    stamps, areaid, event, day, home = stamps[order], areaid[order], event[order], day[order], home[order]
+
+    group_key = np.unique(_group_key(day, areaid))
+    n_groups = group_key.size
+    group_day = group_key // 65536
+    group_area = group_key % 65536 - 32768
+
+    with stage('standard_tracking') as s:
+        std = np.isin(areaid, standard_tracking_areas)
+        dwells = standard_dwells(stamps[std], areaid[std], event[std], day[std])
+        duration = (dwells['stop'] - dwells['start']) / 1e9
+        ok = duration >= min_duration_seconds
+        night = window_of(dwells['start'], dwells['day'], windows) >= 0
+        dwell_group = np.searchsorted(group_key, _group_key(dwells['day'], dwells['areaid']))
+        hours = np.bincount(dwell_group[ok], weights=duration[ok] / 3600, minlength=n_groups)
+        visits = np.bincount(dwell_group[ok], minlength=n_groups)
+        night_visits = np.bincount(dwell_group[ok & night], minlength=n_groups)
+        s.rows_out = dwells['start'].size
+
+    with stage('bedroom_tracking') as s:
+        bed = np.isin(areaid, TRACKING)
+        nights = night_dwells(stamps[bed], areaid[bed], event[bed], day[bed], windows)
+        duration = (nights['stop'] - nights['start']) / 1e9
+        ok = duration >= min_duration_seconds
+        night_group = np.searchsorted(group_key, _group_key(nights['day'], nights['areaid']))
+        hours += np.bincount(night_group[ok], weights=duration[ok] / 3600, minlength=n_groups)
+        s.rows_out = nights['start'].size
+
+    with stage('expand') as s:
+        # One row per (home, date) with tracked areas; sums run in (date, area) order
+        tracked = np.flatnonzero(np.isin(group_area, standard_tracking_areas + TRACKING))
+        row_day, row = np.unique(group_day[tracked], return_inverse=True)
+        n_rows = row_day.size
+        if n_rows == 0:
+            return pd.DataFrame()
+        row_home = home[np.searchsorted(day, row_day)]
+
+        def row_sum(values, areas=None):
+            sel = np.ones(tracked.size, dtype=bool) if areas is None else np.isin(group_area[tracked], areas)
+            return np.bincount(row[sel], weights=values[tracked][sel], minlength=n_rows)
+
+        columns = {
+            'Date': [pd.Timestamp(int(d - offsets[h]) * DAY_NS).date() for d, h in zip(row_day, row_home)],
+            'Window': np.full(n_rows, "Full Day", dtype=object),
+            'Total_Tracked_Hours': row_sum(hours),
+            'Bathroom_Visits': row_sum(visits, BATHROOMS).astype(np.int64),
+            'Night_Bathroom_Visits': row_sum(night_visits, BATHROOMS).astype(np.int64),
+            'Kitchen_Visits': row_sum(visits, KITCHENS).astype(np.int64),
+            'Night_Kitchen_Visits': row_sum(night_visits, KITCHENS).astype(np.int64),
+        }
+
+        # Sleep window times of every home, from its last day
+        times = {name: [] for name in OCCUPANCY_COLUMNS[8:]}
+        for h, (homeid, _) in enumerate(homes):
+            _, start, end = day_windows(
+                state.sleep_entry(state.subids(homeid)[0]), np.array([last_days[h]]), DEFAULT_SLEEP_WINDOWS, merge=False
+            )
+            for name, stamp in zip(times, (start[0], end[0], start[-1], end[-1])):
+                times[name].append(pd.Timestamp(stamp).strftime("%H:%M:%S"))
+        for name, values in times.items():
+            columns[name] = np.array(values, dtype=object)[row_home]
+
+        # <area>_Hours columns in order of first appearance
+        names = np.array([f'{registry.name(a)}_Hours' for a in group_area[tracked]], dtype=object)
+        area_columns = list(pd.unique(names))
+        area_hours = np.full((n_rows, len(area_columns)), np.nan)
+        area_hours[row, pd.Index(area_columns).get_indexer(names)] = hours[tracked]
+
+        # Every row once per subid of its home
+        subids = [state.subids(homeid) for homeid, _ in homes]
+        repeat = np.array([len(subids[h]) for h in row_home])
+        rows = np.repeat(np.arange(n_rows), repeat)
+        frame = {name: np.asarray(values, dtype=object if name == 'Date' else None)[rows] for name, values in columns.items()}
+        frame['subid'] = np.concatenate([subids[h] for h in row_home])
+        frame = pd.DataFrame(frame)[OCCUPANCY_COLUMNS]
+        frame = pd.concat([frame, pd.DataFrame(area_hours[rows], columns=area_columns)], axis=1)
+        frame['multiple_subids'] = (repeat[rows] > 1).astype(np.int64)
+        frame['homeid'] = np.array([homes[h][0] for h in row_home])[rows]
+        s.rows_out = len(frame)
+    return frame
+
+def pack_homes(file_paths, unit_bytes):
+    """
+    Work units for directory(): files of at least unit_bytes alone, smaller ones packed together
+    (largest first) into units of up to unit_bytes.
+    """
+    units, small = [], []
+    for file_path in sorted(file_paths, key=os.path.getsize, reverse=True):
+        if os.path.getsize(file_path) >= unit_bytes:
+            units.append([file_path])
+        else:
+            small.append(file_path)
+    bins = []
+    for file_path in small:
+        size = os.path.getsize(file_path)
+        for unit in bins:
+            if unit[0] + size <= unit_bytes:
+                unit[0] += size
+                unit[1].append(file_path)
+                break
+        else:
+            bins.append([size, [file_path]])
+    return units + [sorted(unit) for _, unit in bins]
+
+def directory(input_dir, output, max_workers=None, metrics_path=None, profile_top=0, long_output=None,
+              batch_bytes=None):
+    """
+    Daily area occupancy of every home file of a pull folder, one row per (date, subid).
+
+    With batch_bytes, files smaller than batch_bytes are packed into shared work units that
+    batch_area_occupancy computes at once, instead of one task per file.
+
+    Args:
+        input_dir (str): NYCE_Data_Pull folder with NYCE_Area_Data_DETECT_<home>.csv files
+        output (str): Output csv path; None to only write long_output
+        max_workers (int, optional): Worker processes, defaults to the number of cores
+        metrics_path (str, optional): Append per-home stage timings to this JSON lines file
+        profile_top (int): Keep cProfile stats of this many slowest homes next to the metrics
+        long_output (str, optional): Also write every numeric column as a long, compressed store
+            (home, subid, date, metric, value) to this directory, see long_store.py
+        batch_bytes (int, optional): Work unit size in csv bytes, e.g. 8 * 2**20
+    """
     start_time = time.time()
     pattern = os.path.join(input_dir, "*NYCE_Area_Data_DETECT_*.csv")
     data_files = glob.glob(pattern)
     
+    if batch_bytes:
+        units = [(batch_area_occupancy, unit) for unit in pack_homes(data_files, batch_bytes)]
+    else:
+        units = [(calculate_daily_area_occupancy, f) for f in data_files]
+
     all_results = []
-    
-    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+    run = Run('occupancy', len(units), metrics_path, profile_top)
+
+    # Parse the subject mapping and sleep windows once; workers memory-map the result
+    state = get_state()
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, initializer=init_worker, initargs=(state.entry,)
+    ) as executor:
         futures = {
-            executor.submit(calculate_daily_area_occupancy, f): f
-            for f in data_files
+            run.submit(executor, func, unit): unit
+            for func, unit in units
         }
 
         for future in concurrent.futures.as_completed(futures):
             file_path = futures[future]
             try:
-                df = future.result()
+                df = run.result(future)
                 if df is not None and not df.empty:
                     all_results.append(df)
             except Exception as e:
+                run.failed()
                 print(f"Error processing {file_path}: {e}")
 
     if all_results:
         final_df = pd.concat(all_results, ignore_index=True)
         final_df = final_df.sort_values(by=['subid', 'Date'])
-        final_df.to_csv(output, index=False)
+        if long_output:
+            with run.stage('write_long', len(final_df)) as s:
+                columns = long_from_rows(final_df)
+                write_long(long_output, columns)
+                s.rows_out = columns['value'].size
+        if output:
+            with run.stage('to_csv', len(final_df)):
+                final_df.to_csv(output, index=False)
         print(f"Processing completed in {time.time() - start_time:.2f} seconds")
     else:
         print("No results to save.")
+    run.close()
     
 if __name__ == "__main__":
     input_dir = r"C:\Users\nguyphu2\Desktop\OHSU_data\NYCE_Data_Pull_DETECT_2024-09-23"
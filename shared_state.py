@@ -0,0 +1,147 @@
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+
+from event_cache import CACHE_DIR, cache_entry, write_entry, _path_key
+from sleep_windows import sleep_arrays
+
+SUBJECTS_PATH = 'subid_homeid.csv'
+SLEEP_PATH = 'sleep_summary.csv'
+
+# Flat column layout of the subject mapping and sleep windows
+STATE_COLUMNS = {
+    'homeid': np.int64,        # sorted, one row per (homeid, subid) pair
+    'subid': np.int64,
+    'sleep_subid': np.int64,   # sorted by (subid, day, start)
+    'sleep_day': np.int64,     # record date, days since 1970-01-01
+    'sleep_start': np.int64,   # UTC nanoseconds
+    'sleep_end': np.int64,
+}
+
+_state = None
+
+
+class SubjectState:
+    """
+    Home -> subject mapping and sleep windows as flat sorted arrays (see STATE_COLUMNS).
+
+    Lookups are searchsorted slices, so the arrays can be memory-mapped and shared by every
+    worker process without copying.
+    """
+
+    def __init__(self, columns, entry=None):
+        self.columns = columns
+        self.entry = entry
+
+    @classmethod
+    def open(cls, entry):
+        return cls({name: np.load(os.path.join(entry, name + '.npy'), mmap_mode='r') for name in STATE_COLUMNS}, entry)
+
+    def _range(self, name, key):
+        values = self.columns[name]
+        return np.searchsorted(values, key, side='left'), np.searchsorted(values, key, side='right')
+
+    def subids(self, homeid):
+        """
+        Subjects of a home in subid_homeid.csv order, [] for an unknown home.
+        """
+        lo, hi = self._range('homeid', homeid)
+        return [int(s) for s in self.columns['subid'][lo:hi]]
+
+    def sleep_entry(self, subid):
+        """
+        (day, start, end) sleep windows of a subject sorted by (day, start), None without records.
+        """
+        lo, hi = self._range('sleep_subid', subid)
+        if lo == hi:
+            return None
+        return tuple(np.asarray(self.columns[name][lo:hi]) for name in ('sleep_day', 'sleep_start', 'sleep_end'))
+
+
+def _state_entry(subjects_path, sleep_path, cache_dir=None):
+    versions = cache_entry(subjects_path) + (cache_entry(sleep_path) if os.path.exists(sleep_path) else '')
+    digest = hashlib.sha1(versions.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir or CACHE_DIR, f"{_path_key(subjects_path)}-state_{digest}")
+
+
+def parse_state(subjects_path=SUBJECTS_PATH, sleep_path=SLEEP_PATH):
+    """
+    Read subid_homeid.csv and sleep_summary.csv into STATE_COLUMNS arrays.
+    """
+    subjects = pd.read_csv(subjects_path, usecols=['subid', 'homeid'])
+    homeid = subjects['homeid'].values.astype(np.int64)
+    order = np.argsort(homeid, kind='stable')
+
+    try:
+        sleep_df = pd.read_csv(sleep_path, parse_dates=['start_sleep', 'end_sleep'])
+        sleep = sleep_arrays(sleep_df)
+    except FileNotFoundError:
+        print(f"Warning: {sleep_path} not found. Using default sleep windows.")
+        sleep = {name: np.array([], dtype=np.int64) for name in ('subid', 'day', 'start', 'end')}
+
+    return {
+        'homeid': homeid[order],
+        'subid': subjects['subid'].values.astype(np.int64)[order],
+        'sleep_subid': sleep['subid'],
+        'sleep_day': sleep['day'],
+        'sleep_start': sleep['start'],
+        'sleep_end': sleep['end'],
+    }
+
+
+def load_state(subjects_path=SUBJECTS_PATH, sleep_path=SLEEP_PATH, cache_dir=None):
+    """
+    Subject mapping and sleep windows, parsed once per version of the two files.
+
+    The parsed arrays are stored next to the event cache and memory-mapped, so later runs and
+    worker processes skip csv parsing and share one copy of the data.
+
+    Args:
+        subjects_path (str): subid_homeid.csv
+        sleep_path (str): sleep_summary.csv; when missing, default sleep windows are used
+        cache_dir (str, optional): Overrides CACHE_DIR / $NYCE_CACHE_DIR
+
+    Returns:
+        SubjectState
+    """
+    entry = _state_entry(subjects_path, sleep_path, cache_dir)
+    if not os.path.isdir(entry):
+        columns = parse_state(subjects_path, sleep_path)
+        try:
+            write_entry(columns, entry, STATE_COLUMNS)
+        except OSError:
+            return SubjectState(columns)
+    return SubjectState.open(entry)
+
+
+def get_state():
+    """
+    The process-wide SubjectState, loaded on first use.
+    """
+    global _state
+    if _state is None:
+        _state = load_state()
+    return _state
+
+
+def reset_state(subjects_path=None, sleep_path=SLEEP_PATH, cache_dir=None):
+    """
+    Replace the process-wide SubjectState with the one of the given files, e.g. another pull's,
+    or with subjects_path None clear it, so that get_state() loads the working directory's again.
+
+    Returns:
+        SubjectState or None: The new state
+    """
+    global _state
+    _state = load_state(subjects_path, sleep_path, cache_dir) if subjects_path is not None else None
+    return _state
+
+
+def init_worker(entry):
+    """
+    ProcessPoolExecutor initializer: map the parent's state instead of re-reading the csvs.
+    """
+    global _state
+    if entry is not None:
+        _state = SubjectState.open(entry)
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+from daybounds import stamps_to_ns
+from dwell import DAY_NS
+
+
+def sleep_arrays(sleep_df):
+    """
+    Parse sleep_summary records into flat window arrays sorted by (subid, day, start).
+
+    Args:
+        sleep_df (pd.DataFrame): 'subid', 'date', 'start_sleep' and 'end_sleep' columns
+
+    Returns:
+        dict: 'subid', 'day', 'start' and 'end' int64 arrays; day is the record's date as days
+            since 1970-01-01, start and end are UTC ns
+    """
+    sleep_df = sleep_df.dropna(subset=['subid', 'date', 'start_sleep', 'end_sleep'])
+    subid = sleep_df['subid'].values.astype(np.int64)
+    day = stamps_to_ns(pd.to_datetime(sleep_df['date']).dt.normalize()) // DAY_NS
+    start = stamps_to_ns(sleep_df['start_sleep'])
+    end = stamps_to_ns(sleep_df['end_sleep'])
+
+    # lexsort is stable, so records with equal starts keep their file order
+    order = np.lexsort((start, day, subid))
+    return {'subid': subid[order], 'day': day[order], 'start': start[order], 'end': end[order]}
+
+
+def merge_windows(day, start, end):
+    """
+    Merge the overlapping (inclusive) windows of every day.
+
+    Args:
+        day, start, end (np.ndarray): Windows sorted by (day, start)
+
+    Returns:
+        tuple: (day, start, end) of the merged windows, sorted by (day, start)
+    """
+    if day.size == 0:
+        return day, start, end
+    reach = pd.Series(end).groupby(day).cummax().values
+    new = np.ones(day.size, dtype=bool)
+    new[1:] = (day[1:] != day[:-1]) | (start[1:] > reach[:-1])
+    first = np.flatnonzero(new)
+    return day[first], start[first], np.maximum.reduceat(end, first)
+
+
+def day_windows(entry, days, defaults, previous_day=False, merge=True):
+    """
+    Sleep windows of the given days: each day's own records, else the default windows.
+
+    Args:
+        entry (tuple or None): (day, start, end) records of one subject sorted by (day, start),
+            see shared_state.SubjectState.sleep_entry; None for a subject without records
+        days (np.ndarray): Day keys (days since 1970-01-01)
+        defaults (list): (start, end) offsets from midnight, as timedeltas, for days without records
+        previous_day (bool): Also use the previous day's records that end on the day
+        merge (bool): Merge overlapping windows of a day
+
+    Returns:
+        tuple: (day, start, end) int64 arrays sorted by (day, start)
+    """
+    days = np.unique(np.asarray(days, dtype=np.int64))
+    if entry is None:
+        entry = (np.array([], dtype=np.int64),) * 3
+    w_day, w_start, w_end = entry
+
+    sel = np.isin(w_day, days)
+    parts = [(w_day[sel], w_start[sel], w_end[sel])]
+    if previous_day:
+        sel = np.isin(w_day + 1, days) & (w_end // DAY_NS == w_day + 1)
+        parts.append((w_day[sel] + 1, w_start[sel], w_end[sel]))
+
+    missing = days[~np.isin(days, np.concatenate([p[0] for p in parts]))]
+    for a, b in defaults:
+        midnight = missing * DAY_NS
+        parts.append((missing, midnight + pd.Timedelta(a).value, midnight + pd.Timedelta(b).value))
+
+    day, start, end = (np.concatenate([p[i] for p in parts]) for i in range(3))
+    order = np.lexsort((start, day))
+    day, start, end = day[order], start[order], end[order]
+    if merge:
+        day, start, end = merge_windows(day, start, end)
+    return day, start, end
+
+
+def window_of(stamps, day, windows):
+    """
+    Index of the window of its own day that contains each stamp, in one searchsorted pass.
+
+    Windows are clipped to their day, which keeps them disjoint and globally sorted, so the
+    only candidate for a stamp is the last window starting at or before it.
+
+    Args:
+        stamps (np.ndarray): int64 UTC ns
+        day (np.ndarray): Day key of every stamp (days since 1970-01-01, stamps // DAY_NS)
+        windows (tuple): Merged (day, start, end) from day_windows
+
+    Returns:
+        np.ndarray: Window index per stamp, -1 outside every window of its day
+    """
+    w_day, w_start, w_end = windows
+    lo = np.maximum(w_start, w_day * DAY_NS)
+    hi = np.minimum(w_end, (w_day + 1) * DAY_NS - 1)
+    keep = np.flatnonzero(lo <= hi)
+    if keep.size == 0:
+        return np.full(len(stamps), -1, dtype=np.int64)
+    lo, hi, w_day = lo[keep], hi[keep], w_day[keep]
+
+    cand = np.searchsorted(lo, stamps, side='right') - 1
+    inside = cand >= 0
+    inside[inside] = (stamps[inside] <= hi[cand[inside]]) & (w_day[cand[inside]] == day[inside])
+    return np.where(inside, keep[np.maximum(cand, 0)], -1)
@@ -0,0 +1,137 @@
+import os
+import glob
+import concurrent.futures
+import numpy as np
+import pandas as pd
+
+from event_cache import CACHE_DIR, write_entry, _path_key
+from raw import MINUTES_PER_DAY, extract_patient_number, minute_steps
+
+# Per-minute histogram of a Watch_Raw_Data file. Integer step counts are stored as uint16 when
+# every minute fits, else uint32 (int64 when negative or larger); any other steps as float64, so
+# the store gives the same sums as reading the csv
+STEP_COLUMNS = {
+    'day': np.int64,          # days since 1970-01-01, one row per day with data
+    'steps': np.uint32,       # (days x 1440) step sum of every minute
+    'readings': np.uint16,    # (days x 1440) number of rows of every minute
+}
+
+
+def parse_steps(file_path):
+    """
+    Bin a watch file into STEP_COLUMNS arrays.
+
+    Args:
+        file_path (str): Path to a Watch_Raw_Data_DETECT_<subid>.csv file
+
+    Returns:
+        tuple: (columns, layout) where layout is STEP_COLUMNS with the dtype chosen for steps
+    """
+    df = pd.read_csv(file_path, usecols=['stamp', 'steps'], parse_dates=['stamp'])
+    dates, steps, readings = minute_steps(df)
+
+    # minute_steps keeps integer counts as int64 and anything else as float64
+    layout = dict(STEP_COLUMNS)
+    if not np.issubdtype(steps.dtype, np.integer):
+        layout['steps'] = np.float64
+    elif steps.size == 0 or (steps.min() >= 0 and steps.max() <= np.iinfo(np.uint16).max):
+        layout['steps'] = np.uint16
+    elif steps.min() < 0 or steps.max() > np.iinfo(np.uint32).max:
+        layout['steps'] = np.int64
+    columns = {
+        'day': np.array(dates, dtype='datetime64[D]').astype(np.int64),
+        'steps': steps,
+        'readings': np.minimum(readings, np.iinfo(np.uint16).max),
+    }
+    return columns, layout
+
+
+def store_entry(file_path, cache_dir=None):
+    """
+    Store directory for the current version of a watch file, next to the event cache.
+
+    Keyed by absolute source path, size and mtime like event_cache.cache_entry.
+    """
+    st = os.stat(file_path)
+    name = f"{_path_key(file_path)}-steps_{st.st_size}_{st.st_mtime_ns}"
+    return os.path.join(cache_dir or CACHE_DIR, name)
+
+
+def load_minutes(file_path, start=None, end=None, cache_dir=None):
+    """
+    Per-minute steps of a watch file, materialized on first use and memory-mapped afterwards.
+
+    Any sector size, top-k or window query (see raw.sector_sums, raw.top_k_sectors and
+    raw.top_k_windows) can then be answered from the arrays without reading the csv.
+
+    Args:
+        file_path (str): Path to a Watch_Raw_Data_DETECT_<subid>.csv file
+        start, end (str or date, optional): Inclusive range of days to return
+        cache_dir (str, optional): Overrides CACHE_DIR / $NYCE_CACHE_DIR
+
+    Returns:
+        tuple: (subid, dates, steps, readings) as raw.read_minutes, with (days x 1440) steps and
+            readings memory-mapped from the store
+    """
+    entry = store_entry(file_path, cache_dir)
+    if os.path.isdir(entry):
+        columns = {name: np.load(os.path.join(entry, name + '.npy'), mmap_mode='r') for name in STEP_COLUMNS}
+    else:
+        columns, layout = parse_steps(file_path)
+        try:
+            write_entry(columns, entry, layout)
+            columns = {name: np.load(os.path.join(entry, name + '.npy'), mmap_mode='r') for name in STEP_COLUMNS}
+        except OSError:
+            columns = {name: np.asarray(columns[name], dtype=layout[name]) for name in layout}
+
+    day = np.asarray(columns['day'])
+    lo, hi = 0, day.size
+    if start is not None:
+        lo = np.searchsorted(day, np.datetime64(pd.Timestamp(start).date(), 'D').astype(np.int64), side='left')
+    if end is not None:
+        hi = np.searchsorted(day, np.datetime64(pd.Timestamp(end).date(), 'D').astype(np.int64), side='right')
+
+    dates = list(day[lo:hi].astype('datetime64[D]').astype(object))
+    steps = columns['steps'][lo:hi].reshape(-1, MINUTES_PER_DAY)
+    readings = columns['readings'][lo:hi].reshape(-1, MINUTES_PER_DAY)
+    return extract_patient_number(file_path), dates, steps, readings
+
+
+def _materialize(file_path, cache_dir):
+    entry = store_entry(file_path, cache_dir)
+    if not os.path.isdir(entry):
+        load_minutes(file_path, cache_dir=cache_dir)
+    return entry
+
+
+def materialize(input_dir, max_workers=None, cache_dir=None):
+    """
+    Build the per-minute store of every Watch_Raw_Data_DETECT_*.csv file in input_dir.
+
+    Files whose store is current are skipped, so this can run after every data pull.
+
+    Args:
+        input_dir (str): Directory of the watch files
+        max_workers (int, optional): Worker processes, None for one per core
+        cache_dir (str, optional): Overrides CACHE_DIR / $NYCE_CACHE_DIR
+
+    Returns:
+        dict: File path -> store directory, for the files that succeeded
+    """
+    data_files = sorted(glob.glob(os.path.join(input_dir, "Watch_Raw_Data_DETECT_*.csv")))
+    entries = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_materialize, f, cache_dir): f for f in data_files}
+        for future in concurrent.futures.as_completed(futures):
+            file_path = futures[future]
+            try:
+                entries[file_path] = future.result()
+            except Exception as e:
+                print(f"Error processing {file_path}: {e}")
+    return entries
+
+
+if __name__ == "__main__":
+    input_dir = r"C:\Users\nguyphu2\Desktop\OHSU_data\RAW"
+    entries = materialize(input_dir)
+    print(f"Per-minute step store ready for {len(entries)} files")
@@ -0,0 +1,144 @@
+import os
+import numpy as np
+import pandas as pd
+
+from areas import areaNameDict
+from daybounds import day_boundaries, nyce_tz
+from event_cache import cache_entry, load_columns, COLUMNS
+
+DAY_NS = 86400 * 10**9
+
+
+def iter_event_chunks(file_path, chunksize=1_000_000):
+    """
+    Time-ordered chunks of a pull file, each holding at most chunksize events.
+
+    Uses the memory-mapped event cache when the file has already been cached. Otherwise the
+    csv itself is streamed, which requires it to be written in time order.
+
+    Args:
+        file_path (str): Path to a NYCE_Area_Data_DETECT_<home>.csv file
+        chunksize (int): Events per chunk
+
+    Yields:
+        pd.DataFrame: 'stamp' (naive UTC), 'areaid' and 'event'
+    """
+    if os.path.isdir(cache_entry(file_path)):
+        columns = load_columns(file_path)
+        for i in range(0, len(columns['stamp']), chunksize):
+            yield pd.DataFrame({
+                'stamp': np.array(columns['stamp'][i:i + chunksize]).view('datetime64[ns]'),
+                'areaid': np.array(columns['areaid'][i:i + chunksize]),
+                'event': np.array(columns['event'][i:i + chunksize]),
+            })
+        return
+
+    last = None
+    reader = pd.read_csv(file_path, usecols=['stamp', 'areaid', 'event'], chunksize=chunksize)
+    for chunk in reader:
+        chunk['stamp'] = pd.to_datetime(chunk['stamp'], errors='coerce')
+        chunk = chunk.dropna(subset=['stamp'])
+        chunk = chunk.sort_values('stamp', kind='stable')
+        if chunk.empty:
+            continue
+        if last is not None and chunk['stamp'].iloc[0] < last:
+            raise ValueError(
+                f"{file_path} is not in time order; cache it first (event_cache.load_columns) to stream it"
+            )
+        last = chunk['stamp'].iloc[-1]
+        yield pd.DataFrame({
+            'stamp': chunk['stamp'].values,
+            'areaid': chunk['areaid'].values.astype(COLUMNS['areaid']),
+            'event': chunk['event'].values.astype(COLUMNS['event']),
+        })
+
+
+def iter_day_batches(chunks, day_of):
+    """
+    Regroup time-ordered chunks into batches of finished days.
+
+    The events of the last, possibly unfinished day of a chunk are carried into the next
+    chunk together with the state they represent (open dwells, door positions), so every
+    emitted day is complete. A day is emitted as soon as an event of a later day is seen.
+
+    Args:
+        chunks (iterable): Output of iter_event_chunks
+        day_of (callable): Maps int64 UTC ns to a non-decreasing day key
+
+    Yields:
+        pd.DataFrame: Events of one or more whole days
+    """
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        day = day_of(chunk['stamp'].values.astype(np.int64))
+        cut = np.searchsorted(day, day[-1], side='left')
+        if cut > 0:
+            yield chunk.iloc[:cut].reset_index(drop=True)
+        carry = chunk.iloc[cut:].reset_index(drop=True)
+    if carry is not None and not carry.empty:
+        yield carry
+
+
+def local_day_of(unique_date, tz=nyce_tz):
+    bounds = day_boundaries(unique_date, tz)
+    return lambda stamps: np.searchsorted(bounds, stamps, side='right')
+
+
+def utc_day_of(stamps):
+    return stamps // DAY_NS
+
+
+def _merge(out, part):
+    return np.where(np.isnan(out), part, out)
+
+
+def ilsa_streaming(file_path, unique_date, chunksize=1_000_000, k=2):
+    """
+    ILSA.ilsa_daily with peak memory bounded by chunksize (plus one day) instead of file size.
+    """
+    from ILSA import ilsa_daily
+
+    hours = np.full(len(unique_date) - 1, np.nan)
+    for batch in iter_day_batches(iter_event_chunks(file_path, chunksize), local_day_of(unique_date)):
+        hours = _merge(hours, ilsa_daily(batch, unique_date, k).values)
+    return pd.Series(hours, index=unique_date[:-1])
+
+
+def tooh_streaming(file_path, unique_date, areaDicts=None, chunksize=1_000_000):
+    """
+    TOOH.tooh_daily with peak memory bounded by chunksize (plus one day) instead of file size.
+    """
+    from TOOH import tooh_daily
+
+    areaDicts = areaDicts or areaNameDict()
+    hours = np.full(len(unique_date) - 1, np.nan)
+    periods = []
+    for batch in iter_day_batches(iter_event_chunks(file_path, chunksize), local_day_of(unique_date)):
+        daily, times_ooh = tooh_daily(batch, unique_date, areaDicts)
+        hours = _merge(hours, daily.values)
+        periods.append(times_ooh)
+    times_ooh = pd.concat(periods, ignore_index=True) if periods else pd.DataFrame(columns=['start', 'end', 'durations'])
+    return pd.Series(hours, index=unique_date[:-1]), times_ooh
+
+
+def occupancy_streaming(file_path, homeid, min_duration_seconds=90, chunksize=1_000_000):
+    """
+    self_script.daily_area_occupancy with peak memory bounded by chunksize (plus one day).
+    """
+    from self_script import daily_area_occupancy
+
+    parts = []
+    for batch in iter_day_batches(iter_event_chunks(file_path, chunksize), utc_day_of):
+        part = daily_area_occupancy(batch, homeid, min_duration_seconds)
+        if not part.empty:
+            parts.append(part)
+    if not parts:
+        return pd.DataFrame()
+
+    result = pd.concat(parts, ignore_index=True)
+    # The in-memory path reports the sleep window times of the last day on every row
+    times = ['Early_Start_Time', 'Early_End_Time', 'Late_Start_Time', 'Late_End_Time']
+    result[times] = parts[-1][times].iloc[-1].values
+    return result
@@ -0,0 +1,236 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+# Areas of a generated home: rooms with their share of the awake visits, and the doors used
+# for trips out of home (see area_registry.json)
+DEFAULT_ROOMS = {
+    1: 0.14,    # Bathroom 1
+    4: 0.12,    # Bedroom 1
+    13: 0.08,   # Dining Room 1
+    19: 0.16,   # Hallway 1
+    23: 0.2,    # Kitchen 1
+    29: 0.22,   # Living Room 1
+    33: 0.08,   # Office 1
+}
+DEFAULT_DOORS = [56, 61]   # Front Door, Garage Door
+BEDROOM, BATHROOM = 4, 1
+
+STAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+HOUR = 3600
+
+
+def _day_plan(rng, days, start, tz):
+    """
+    UTC midnight (seconds) and local bed / wake offsets (seconds from midnight) of every day.
+    """
+    midnights = pd.date_range(start, periods=days + 1, tz=tz).tz_convert('UTC').tz_localize(None)
+    midnight = midnights.values.astype('datetime64[s]').astype(np.int64).astype(np.float64)
+    wake = 6.5 * HOUR + rng.normal(0, 0.6 * HOUR, days + 1)
+    bed = 22.25 * HOUR + rng.normal(0, 0.75 * HOUR, days + 1)
+    return midnight, wake, bed
+
+
+def simulate_home(rng, days, start='2024-01-01', rooms=DEFAULT_ROOMS, doors=DEFAULT_DOORS,
+                  visits_per_hour=4.0, chatter=0.2, door_trips_per_day=1.5, missing_day_rate=0.02,
+                  tz='US/Pacific'):
+    """
+    Motion and door events of one home.
+
+    Awake hours are a sequence of room visits, each an activation (1) followed by the sensor
+    going idle (0) before the next visit. Trips out of home are a door open/close, a quiet gap
+    and a door open/close on return. Nights are a bedroom activation at bed time with a few
+    bathroom trips. Sensor chatter adds 1/0 flickers of a few seconds on random rooms.
+
+    Args:
+        rng (np.random.Generator): Random source
+        days (int): Number of local days starting at start
+        start (str): First local date
+        rooms (dict): Room areaid -> share of the awake visits
+        doors (list): Door areaids used for trips out of home
+        visits_per_hour (float): Mean awake room visits per hour (the event density)
+        chatter (float): Flickers per visit
+        door_trips_per_day (float): Mean trips out of home per day
+        missing_day_rate (float): Share of days dropped entirely, as in a sensor outage
+        tz (str): Timezone of the home
+
+    Returns:
+        tuple: (events, sleep) where events has 'stamp' (naive UTC), 'areaid' and 'event' sorted
+            by stamp, and sleep has the 'start_sleep'/'end_sleep' (naive UTC) and local 'date' of
+            every night
+    """
+    midnight, wake, bed = _day_plan(rng, days, start, tz)
+    room_ids = np.array(list(rooms))
+    weights = np.array(list(rooms.values()), dtype=np.float64)
+    weights /= weights.sum()
+
+    stamps, areas, events = [], [], []
+
+    def add(t, area, event):
+        stamps.append(np.asarray(t, dtype=np.float64))
+        areas.append(np.broadcast_to(np.asarray(area, dtype=np.int64), np.shape(t)))
+        events.append(np.full(np.shape(t), event, dtype=np.int8))
+
+    for d in range(days):
+        if rng.random() < missing_day_rate:
+            continue
+        t0, t1 = midnight[d] + wake[d], midnight[d] + bed[d]
+
+        # Awake visits, each ending before the next one starts
+        enter = np.sort(rng.uniform(t0, t1, rng.poisson(visits_per_hour * (t1 - t0) / HOUR)))
+        area = rng.choice(room_ids, enter.size, p=weights)
+        leave = enter + 30 + rng.exponential(150, enter.size)
+        leave[:-1] = np.minimum(leave[:-1], enter[1:] - 1)
+
+        # Trips out of home: no room activity between leaving and returning
+        away = np.zeros(enter.size, dtype=bool)
+        for _ in range(rng.poisson(door_trips_per_day)):
+            door = rng.choice(doors)
+            out = rng.uniform(t0, t1)
+            back = min(out + 300 + rng.exponential(1.5 * HOUR), t1)
+            away |= (enter >= out - 60) & (enter <= back + 60)
+            for t in (out, back):
+                add([t], door, 1)
+                add([t + rng.uniform(3, 15)], door, 0)
+        add(enter[~away], area[~away], 1)
+        add(leave[~away], area[~away], 0)
+
+        # Night in the bedroom, with bathroom trips until waking up the next day
+        night_end = midnight[d + 1] + wake[d + 1]
+        add([t1], BEDROOM, 1)
+        add([t1 + 120], BEDROOM, 0)
+        trips = np.sort(rng.uniform(t1 + 600, night_end - 600, rng.poisson(1.2)))
+        add(trips, BATHROOM, 1)
+        add(trips + rng.uniform(60, 400, trips.size), BATHROOM, 0)
+
+        # Sensor chatter
+        flicker = rng.uniform(t0, t1, rng.poisson(chatter * enter.size))
+        flicker_area = rng.choice(room_ids, flicker.size, p=weights)
+        add(flicker, flicker_area, 1)
+        add(flicker + rng.uniform(1, 20, flicker.size), flicker_area, 0)
+
+    stamp = np.concatenate(stamps) if stamps else np.array([])
+    order = np.argsort(stamp, kind='stable')
+    events_df = pd.DataFrame({
+        'stamp': pd.to_datetime(np.round(stamp[order] * 1000).astype(np.int64), unit='ms'),
+        'areaid': np.concatenate(areas)[order] if areas else np.array([], dtype=np.int64),
+        'event': np.concatenate(events)[order] if events else np.array([], dtype=np.int8),
+    })
+
+    dates = pd.date_range(start, periods=days + 1)
+    sleep = pd.DataFrame({
+        'date': dates[1:].date,
+        'start_sleep': pd.to_datetime(midnight[:-1] + bed[:-1], unit='s'),
+        'end_sleep': pd.to_datetime(midnight[1:] + wake[1:], unit='s'),
+    })
+    return events_df, sleep
+
+
+def simulate_watch(rng, sleep, steps_per_minute=12.0, coverage=0.85):
+    """
+    Per-minute watch readings of one subject while awake.
+
+    Args:
+        rng (np.random.Generator): Random source
+        sleep (pd.DataFrame): Nights of the subject from simulate_home
+        steps_per_minute (float): Mean steps per awake minute
+        coverage (float): Share of awake minutes with a reading
+
+    Returns:
+        pd.DataFrame: 'stamp' (naive UTC), 'steps' and 'heart_rate'
+    """
+    wake = sleep['end_sleep'].values[:-1].astype('datetime64[m]').astype(np.int64)
+    bed = sleep['start_sleep'].values[1:].astype('datetime64[m]').astype(np.int64)
+    minutes = np.concatenate([np.arange(a, b) for a, b in zip(wake, bed)] or [np.array([], dtype=np.int64)])
+    minutes = minutes[rng.random(minutes.size) < coverage]
+
+    # Bursts of activity on top of a low baseline
+    active = rng.random(minutes.size) < 0.25
+    steps = rng.poisson(np.where(active, steps_per_minute * 3, steps_per_minute * 0.3))
+    seconds = rng.integers(0, 60, minutes.size)
+    return pd.DataFrame({
+        'stamp': pd.to_datetime(minutes * 60 + seconds, unit='s'),
+        'steps': steps,
+        'heart_rate': np.where(active, 95, 70) + rng.integers(-8, 9, minutes.size),
+    })
+
+
+def generate_pull(output_dir, homes=5, days=30, start='2024-01-01', subjects_per_home=1,
+                  rooms=DEFAULT_ROOMS, doors=DEFAULT_DOORS, visits_per_hour=4.0, chatter=0.2,
+                  door_trips_per_day=1.5, missing_day_rate=0.02, watch=True, seed=0,
+                  tz='US/Pacific', first_homeid=1):
+    """
+    Write a synthetic data pull shaped like the real one, for benchmarks and tests without PHI.
+
+    Writes NYCE_Area_Data_DETECT_<homeid>.csv for every home, Watch_Raw_Data_DETECT_<subid>.csv
+    for every subject (when watch is set), subid_homeid.csv and sleep_summary.csv to output_dir.
+    Subjects are numbered homeid * 10 + 1, + 2, ...
+
+    Args:
+        output_dir (str): Directory to write to
+        homes (int): Number of homes
+        days (int): Days per home
+        seed (int): The same seed writes the same files
+        Other args: See simulate_home and simulate_watch
+
+    Returns:
+        dict: 'area_files' and 'watch_files' (paths), 'events' (rows per area file) and
+            'readings' (rows per watch file)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    summary = {'area_files': [], 'watch_files': [], 'events': {}, 'readings': {}}
+    subjects, nights = [], []
+
+    for homeid in range(first_homeid, first_homeid + homes):
+        events, sleep = simulate_home(
+            rng, days, start, rooms, doors, visits_per_hour, chatter, door_trips_per_day,
+            missing_day_rate, tz,
+        )
+        events.insert(0, 'homeid', homeid)
+        events.insert(2, 'itemid', events['areaid'] * 100 + homeid % 100)
+        path = os.path.join(output_dir, f"NYCE_Area_Data_DETECT_{homeid}.csv")
+        events.to_csv(path, index=False, date_format=STAMP_FORMAT)
+        summary['area_files'].append(path)
+        summary['events'][path] = len(events)
+
+        for i in range(1, subjects_per_home + 1):
+            subid = homeid * 10 + i
+            subjects.append((subid, homeid))
+            nights.append(sleep.assign(subid=subid))
+            if watch:
+                readings = simulate_watch(rng, sleep)
+                path = os.path.join(output_dir, f"Watch_Raw_Data_DETECT_{subid}.csv")
+                readings.to_csv(path, index=False, date_format=STAMP_FORMAT)
+                summary['watch_files'].append(path)
+                summary['readings'][path] = len(readings)
+
+    pd.DataFrame(subjects, columns=['subid', 'homeid']).to_csv(os.path.join(output_dir, 'subid_homeid.csv'), index=False)
+    if nights:
+        sleep_summary = pd.concat(nights, ignore_index=True)[['subid', 'date', 'start_sleep', 'end_sleep']]
+        sleep_summary.to_csv(os.path.join(output_dir, 'sleep_summary.csv'), index=False, date_format=STAMP_FORMAT)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic NYCE / watch data pull.")
+    parser.add_argument('output_dir')
+    parser.add_argument('--homes', type=int, default=5)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--start', default='2024-01-01')
+    parser.add_argument('--subjects-per-home', type=int, default=1)
+    parser.add_argument('--visits-per-hour', type=float, default=4.0)
+    parser.add_argument('--chatter', type=float, default=0.2)
+    parser.add_argument('--door-trips-per-day', type=float, default=1.5)
+    parser.add_argument('--no-watch', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    summary = generate_pull(
+        args.output_dir, args.homes, args.days, args.start, args.subjects_per_home,
+        visits_per_hour=args.visits_per_hour, chatter=args.chatter,
+        door_trips_per_day=args.door_trips_per_day, watch=not args.no_watch, seed=args.seed,
+    )
+    print(f"Wrote {len(summary['area_files'])} homes ({sum(summary['events'].values())} events) "
+          f"and {len(summary['watch_files'])} watch files to {args.output_dir}")
@@ -1,37 +1,25 @@
 import os
 import time
 import math
-import pytz
 import json
-import requests
 import numpy as np
 import pandas as pd
 import datetime
 from datetime import datetime as dt
-from pandas import json_normalize
+
+from areas import get_registry
+from dwell import dwell_table
+from event_cache import load_events
 
 def get_area_mapping():
     """
-    Fetch area mapping directly from the API with error handling
+    Area mapping from the local area registry (see areas.py); never blocks on the network
     
     Returns:
     --------
     dict: Comprehensive dictionary mapping area IDs to names
     """
-    r = requests.get("https://api.orcatech.org/orcatech/latest/homes/areas")
-    
-    # Raise an exception if request fails
-    r.raise_for_status()
-    
-    # Process the JSON data
-    df = json_normalize(r.json())
-    
-    # Create a mapping dictionary
-    area_map = {}
-    for _, row in df.iterrows():
-        area_map[row['areaid']] = row['areaname']
-    
-    return area_map
+    return get_registry().names
 
 def calculate_daily_area_occupancy(file_path, start_date=None, end_date=None):
     """
@@ -50,17 +38,28 @@ def calculate_daily_area_occupancy(file_path, start_date=None, end_date=None):
     --------
     DataFrame with daily area occupancy percentages
     """
-    # Set timezone
-    nyce_tz = pytz.timezone("US/Pacific")
+    # Read the events (parsed once per pull file, then loaded from the event cache)
+    return daily_area_percentages(load_events(file_path), start_date, end_date)
+
+def daily_area_percentages(df, start_date=None, end_date=None):
+    """
+    Daily area occupancy percentages of already loaded events
     
-    # Get area mapping
-    area_mapping = get_area_mapping()
+    Parameters:
+    -----------
+    df : DataFrame
+        Events with 'stamp' (UTC), 'areaid' and 'event'
+    start_date, end_date : str, optional
+        Date range for analysis (format: 'YYYY-MM-DD')
     
-    # Read the CSV file
-    df = pd.read_csv(file_path)
+    Returns:
+    --------
+    DataFrame with daily area occupancy percentages
+    """
+    # Get area mapping
+    registry = get_registry()
     
-    # Convert timestamp
-    df['stamp'] = pd.to_datetime(df['stamp'])
+    df = df.copy()
     df['date'] = df['stamp'].dt.date
     
     # Filter by date range if specified
@@ -72,33 +71,20 @@ def calculate_daily_area_occupancy(file_path, start_date=None, end_date=None):
     # Ignore non-areas and doors
     non_areas = [56, 57, 58, 59, 60, 61, 62, 63, 64, 65, 66, 67, 68, 69, -1]
     
+    # Occupancy periods of every area and date in one pass; a period still open at the
+    # area's last event of the day ends at that event
+    events = df[~df['areaid'].isin(non_areas)]
+    dwells = dwell_table(events, leading='keep', trailing='last_event')
+    dwells['hours'] = dwells['duration'] / 3600
+    area_hours = dwells.groupby(['local_date', 'areaid'])['hours'].sum()
+    area_hours = area_hours.reindex(events.groupby(['date', 'areaid']).size().index, fill_value=0)
+    
     # Prepare results
     daily_occupancy = {}
     
-    # Group by date and area
-    for (date, areaid), area_df in df[~df['areaid'].isin(non_areas)].groupby(['date', 'areaid']):
+    for (date, areaid), total_area_time in area_hours.items():
         # Determine area name
-        area_name = area_mapping.get(areaid, f'Area_{areaid}')
-        
-        # Calculate total time in this area for the day
-        area_df = area_df.sort_values('stamp')
-        
-        # Find occupancy periods
-        area_df['diff'] = area_df['event'].diff()
-        
-        # Identify start and stop times
-        start_list = area_df.loc[area_df['diff'] == 1, 'stamp'].tolist()
-        stop_list = area_df.loc[area_df['diff'] == -1, 'stamp'].tolist()
-        
-        # Handle edge cases
-        if area_df['event'].iloc[0] == 1:
-            start_list.insert(0, area_df['stamp'].iloc[0])
-        
-        if area_df['event'].iloc[-1] == 1:
-            stop_list.append(area_df['stamp'].iloc[-1])
-        
-        # Calculate total area occupancy time
-        total_area_time = sum((stop - start).total_seconds() / 3600 for start, stop in zip(start_list, stop_list))
+        area_name = registry.name(areaid)
         
         # Initialize or update daily occupancy
         if date not in daily_occupancy:
@@ -160,8 +146,6 @@ def main(file_path, output_path='daily_area_occupancy.csv', start_date=None, end
         print("\nOccupancy Data Summary:")
         print(occupancy_df.head())
         
-    except requests.RequestException as e:
-        print(f"API Request Error: {e}")
     except Exception as e:
         print(f"An error occurred: {e}")
 
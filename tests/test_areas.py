@@ -0,0 +1,88 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+import pytest
+
+import areas
+
+pytest.importorskip('requests')
+
+AREAS = [
+    {'areaid': 1, 'areaname': 'Bathroom 1'},
+    {'areaid': 4, 'areaname': 'Bedroom 1'},
+    {'areaid': 56, 'areaname': 'Front Door'},
+    {'areaid': 58, 'areaname': None},
+]
+
+
+class AreasHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps(AREAS).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def areas_server():
+    # Local stand-in for the ORCATECH areas endpoint
+    server = HTTPServer(('127.0.0.1', 0), AreasHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/areas"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def closed_url():
+    # A localhost port nothing listens on
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/areas"
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    areas.get_registry.cache_clear()
+    yield
+    areas.get_registry.cache_clear()
+
+
+def test_build_registry_from_api(areas_server, tmp_path):
+    path = str(tmp_path / 'area_registry.json')
+    registry = areas.build_registry('api', path=path, url=areas_server, timeout=5)
+
+    assert registry.name(1) == 'Bathroom 1'
+    assert registry.name(58) == 'None'
+    assert registry.name(999) == 'Area_999'
+    assert registry.area_name_dict()['DoorID'] == {56: 'FRONT_DOOR'}
+    assert registry.categories(np.array([1, 56, 999, -1])).tolist() == \
+        [areas.ROOM, areas.DOOR, areas.NON_AREA, areas.NON_AREA]
+
+    with open(path) as f:
+        cache = json.load(f)
+    assert cache['source'] == areas_server
+    assert areas.get_registry(path).names == registry.names
+
+
+def test_build_registry_unreachable_keeps_local(closed_url, tmp_path, capsys):
+    path = str(tmp_path / 'area_registry.json')
+    with open(path, 'w') as f:
+        json.dump({'source': 'test', 'areas': {'4': 'Bedroom 1'}}, f)
+
+    registry = areas.build_registry('api', path=path, url=closed_url, timeout=5)
+
+    assert registry.names == {4: 'Bedroom 1'}
+    assert 'keeping the local registry' in capsys.readouterr().out
+    with open(path) as f:
+        assert json.load(f)['source'] == 'test'
@@ -0,0 +1,106 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dwell import LEADING, TRAILING, dwell_intervals
+
+CAP = 7
+DAY = 1000
+
+
+def day_start(days):
+    return np.asarray(days) * DAY
+
+
+def day_end(days):
+    return np.asarray(days) * DAY + DAY - 1
+
+
+@pytest.fixture
+def events():
+    # (day, areaid) groups, in stamp units where day d spans [d * DAY, d * DAY + DAY)
+    rows = [
+        # Leading 1, repeated 1s, closed, then a trailing open dwell
+        (0, 1, 10, 1), (0, 1, 12, 1), (0, 1, 15, 0), (0, 1, 20, 1), (0, 1, 22, 1),
+        # Leading 0, repeated 0s, two closed dwells
+        (0, 2, 30, 0), (0, 2, 31, 0), (0, 2, 40, 1), (0, 2, 50, 0), (0, 2, 60, 1), (0, 2, 61, 1), (0, 2, 70, 0),
+        # A single 1 (leading and trailing open at once) and a lone 0
+        (1, 1, 1005, 1),
+        (1, 2, 1010, 0),
+        # Equal stamps keep their input order
+        (1, 3, 1100, 1), (1, 3, 1100, 0), (1, 3, 1200, 1), (1, 3, 1300, 0), (1, 3, 1300, 1),
+    ]
+    df = pd.DataFrame(rows, columns=['day', 'areaid', 'stamp', 'event'])
+    # Shuffle the groups; dwell_intervals sorts by (day, areaid, stamp) itself
+    return df.sample(frac=1, random_state=1).sort_values('stamp', kind='stable').reset_index(drop=True)
+
+
+def old_group_dwells(group, leading, trailing):
+    """
+    The per-(day, area) loop the scripts used before dwell_intervals.
+    """
+    group = group.sort_values('stamp', kind='stable')
+    day = group['day'].iloc[0]
+    periods = []
+    current = None
+    previous = None
+    for i, row in enumerate(group.itertuples()):
+        if row.event == 1 and (previous is None or previous == 0):
+            current = (row.stamp, i == 0)
+        elif row.event == 0 and previous == 1:
+            periods.append((current[0], row.stamp, current[1]))
+            current = None
+        previous = row.event
+    if current is not None:
+        if trailing == 'cap':
+            periods.append((current[0], current[0] + CAP, current[1]))
+        elif trailing == 'last_event':
+            periods.append((current[0], group['stamp'].iloc[-1], current[1]))
+        elif trailing == 'day_end':
+            periods.append((current[0], int(day_end(day)), current[1]))
+
+    out = []
+    for start, stop, leading_open in periods:
+        if leading_open and leading == 'drop':
+            continue
+        if leading_open and leading == 'day_start':
+            start = int(day_start(day))
+        out.append((int(day), int(group['areaid'].iloc[0]), int(start), int(stop)))
+    return out
+
+
+@pytest.mark.parametrize('leading, trailing', list(itertools.product(LEADING, TRAILING)))
+def test_matches_per_group_loop(events, leading, trailing):
+    out = dwell_intervals(
+        events['stamp'].values, events['areaid'].values, events['event'].values, events['day'].values,
+        leading=leading, trailing=trailing, cap=CAP, day_start=day_start, day_end=day_end,
+    )
+    got = list(zip(out['day'].tolist(), out['areaid'].tolist(), out['start'].tolist(), out['stop'].tolist()))
+
+    expected = []
+    for _, group in events.groupby(['day', 'areaid'], sort=True):
+        expected += old_group_dwells(group, leading, trailing)
+    assert got == expected
+
+
+def test_matches_getDwellTimes(events):
+    # ILSA's original per-area function: leading open dwells kept, trailing ones dropped
+    from ILSA import getDwellTimes
+
+    out = dwell_intervals(
+        events['stamp'].values, events['areaid'].values, events['event'].values, events['day'].values,
+    )
+    for (day, areaid), group in events.groupby(['day', 'areaid']):
+        pairs, _ = getDwellTimes(group.rename(columns={'stamp': 'unix'}).assign(stamp=group['stamp']))
+        mine = (out['day'] == day) & (out['areaid'] == areaid)
+        assert pairs == list(zip(out['start'][mine].tolist(), out['stop'][mine].tolist()))
+
+
+def test_empty_and_bad_policy():
+    empty = np.array([], dtype=np.int64)
+    out = dwell_intervals(empty, empty, empty, empty)
+    assert all(values.size == 0 for values in out.values())
+    with pytest.raises(ValueError):
+        dwell_intervals(empty, empty, empty, empty, leading='open')
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from daybounds import nyce_tz
+from event_stream import EventStream
+
+
+@pytest.fixture
+def events():
+    # Two local (US/Pacific) days, unsorted, with an event at local midnight and equal stamps
+    stamps = pd.to_datetime([
+        '2024-01-02 09:00:00', '2024-01-01 08:00:00', '2024-01-01 07:59:59', '2024-01-01 20:00:00',
+        '2024-01-02 08:00:00', '2024-01-02 08:00:00', '2024-01-01 21:00:00',
+    ])
+    return pd.DataFrame({
+        'stamp': stamps,
+        'areaid': np.array([1, 1, 2, 2, 4, 1, 1], dtype=np.int16),
+        'event': np.array([1, 0, 1, 0, 1, 1, 0], dtype=np.int8),
+    }).sort_values('stamp', kind='stable').reset_index(drop=True)
+
+
+def _local_dates(df):
+    return df['stamp'].dt.tz_localize('UTC').dt.tz_convert(nyce_tz).dt.date
+
+
+def test_slice_matches_masks(events):
+    s = EventStream.from_frame(events)
+    local = _local_dates(events)
+    assert s.n_days == 3
+    assert list(s.areas) == [1, 2, 4]
+
+    for day in range(s.n_days):
+        date = s.dates[day].date()
+        for areaid in s.areas:
+            expected = events[(local == date) & (events['areaid'] == areaid)]
+            got = s.slice(day, areaid)
+            assert np.array_equal(got['stamp'], expected['stamp'].values.astype(np.int64))
+            assert np.array_equal(got['event'], expected['event'].values)
+            assert np.shares_memory(got['stamp'], s.stamp) or got['stamp'].size == 0
+        assert s.slice(day)['stamp'].size == (local == date).sum()
+    assert s.slice(0, 99)['stamp'].size == 0
+
+
+def test_slice_rejects_days_outside(events):
+    s = EventStream.from_frame(events)
+    assert s.day_index('2023-12-01') == -1
+    with pytest.raises(IndexError):
+        s.slice(s.day_index('2023-12-01'), 1)
+    with pytest.raises(IndexError):
+        s.slice(s.n_days, 1)
+
+
+def test_counts(events):
+    s = EventStream.from_frame(events)
+    local = _local_dates(events)
+    expected = pd.crosstab(local, events['areaid']).reindex(columns=s.areas, fill_value=0)
+    assert np.array_equal(s.counts(), expected.values)
+    assert s.counts().sum() == len(events)
+
+
+def test_frame_round_trip(events):
+    s = EventStream.from_frame(events)
+    frame = s.to_frame()
+    pd.testing.assert_frame_equal(frame[['stamp', 'areaid', 'event']], events, check_dtype=False)
+    assert list(frame['local_date']) == list(_local_dates(events))
+
+    columns = s.to_columns()
+    assert np.array_equal(columns['stamp'], events['stamp'].values.astype(np.int64))
+    assert np.array_equal(EventStream.from_columns(columns).to_frame()['areaid'], frame['areaid'])
+
+
+def test_unique_date_drops_events_outside(events):
+    s = EventStream.from_frame(events, pd.date_range('2024-01-01', '2024-01-02'))
+    assert s.n_days == 1
+    assert len(s) == (_local_dates(events) == pd.Timestamp('2024-01-01').date()).sum()
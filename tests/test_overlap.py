@@ -0,0 +1,62 @@
+import collections
+import math
+
+import numpy as np
+import pytest
+
+from overlap import overlap_duration, overlap_seconds
+
+DAY = 86400
+
+
+def brute_force_seconds(start, stop, k, groups=None):
+    """
+    The per-second count ILSA used to make: every interval lists each integer second from
+    ceil(start) to floor(stop), and seconds listed k or more times (within a group) count.
+    """
+    groups = np.zeros(len(start), dtype=np.int64) if groups is None else np.asarray(groups)
+    totals = collections.Counter()
+    for g in np.unique(groups):
+        seconds = []
+        for s, e in zip(np.asarray(start)[groups == g], np.asarray(stop)[groups == g]):
+            seconds += list(range(math.ceil(s), math.floor(e) + 1))
+        totals[int(g)] = sum(1 for n in collections.Counter(seconds).values() if n >= k)
+    return totals
+
+
+def test_touching_intervals_share_their_second():
+    # [10, 20] and [20, 30] both list second 20
+    assert overlap_seconds([10, 20], [20, 30]) == brute_force_seconds([10, 20], [20, 30], 2)[0] == 1
+    # With sub-second ends, nothing is shared
+    assert overlap_seconds([10, 20.5], [20.4, 30]) == brute_force_seconds([10, 20.5], [20.4, 30], 2)[0] == 0
+    # The continuous overlap of touching intervals is empty
+    assert overlap_duration([10, 20], [20, 30]) == 0
+
+
+def test_day_boundaries():
+    # Intervals of day 0 ending exactly on the midnight that starts day 1, and day 1 intervals
+    # starting on it; seconds are only shared within a day
+    start = [DAY - 100, DAY - 50, DAY, DAY + 10]
+    stop = [DAY, DAY, DAY + 20, DAY + 30]
+    groups = [0, 0, 1, 1]
+    expected = brute_force_seconds(start, stop, 2, groups)
+    got = overlap_seconds(start, stop, 2, groups, n_groups=2)
+    assert got.tolist() == [expected[0], expected[1]] == [51, 11]
+
+
+@pytest.mark.parametrize('k', [1, 2, 3])
+def test_random_against_brute_force(k):
+    rng = np.random.default_rng(k)
+    n = 60
+    groups = rng.integers(0, 3, n)
+    start = groups * DAY + rng.integers(0, 2000, n) + rng.choice([0, 0.25, 0.5, 0.999], n)
+    stop = start + rng.choice([0, 0.3, 1, 5, 60, 400], n) + rng.choice([0, 0.5], n)
+    # Some intervals end exactly on the next midnight
+    stop[:5] = (groups[:5] + 1) * DAY
+    # and some are empty (stop before start)
+    stop[5:8] = start[5:8] - 1
+
+    expected = brute_force_seconds(start, stop, k, groups)
+    got = overlap_seconds(start, stop, k, groups, n_groups=3)
+    assert got.tolist() == [expected[g] for g in range(3)]
+    assert overlap_seconds(start, stop, k) == brute_force_seconds(start, stop, k)[0]
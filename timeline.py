@@ -0,0 +1,177 @@
+import os
+import json
+import hashlib
+import concurrent.futures
+import numpy as np
+import pandas as pd
+import matplotlib
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+
+class TimelineRenderer:
+    """
+    Room occupancy timelines drawn on one reused Figure.
+
+    Every room is a single LineCollection holding all of its segments, so a day costs the
+    same few artists however many periods it has. The Figure, Axes and collections are kept
+    between renders and only their data is replaced.
+    """
+
+    def __init__(self, linewidth=6, cmap='tab20', dpi=None):
+        self.figure = Figure(dpi=dpi or matplotlib.rcParams['figure.dpi'])
+        self.ax = self.figure.add_subplot()
+        self.linewidth = linewidth
+        self.cmap = cmap
+        self.rows = []
+
+    def _row(self, i):
+        while len(self.rows) <= i:
+            row = LineCollection([], linewidths=self.linewidth, capstyle='butt')
+            self.ax.add_collection(row)
+            self.rows.append(row)
+        return self.rows[i]
+
+    def render(self, day, rooms, segments, output_path, title, colors=None, figsize=(20, 10),
+               hour_interval=1, grid_alpha=0.7, legend=True, rotate_xticks=0,
+               title_size=None, label_size=None):
+        """
+        Draw one day and save it.
+
+        Args:
+            day (date): Day shown, from midnight to the next midnight
+            rooms (list): Room names, one row each from the bottom up
+            segments (dict): Room name -> (start, end) arrays of datetime64 periods
+            output_path (str): Image file to write
+            title (str): Axes title
+            colors (list, optional): One color per room; defaults to the cmap colors
+            figsize (tuple): Figure size in inches
+            hour_interval (int): Hours between x ticks
+            grid_alpha (float): Alpha of the vertical grid lines
+            legend (bool): Add a legend built from the room list
+            rotate_xticks (float): X tick label rotation
+            title_size, label_size (float, optional): Font sizes of the title and axis labels
+        """
+        ax = self.ax
+        self.figure.set_size_inches(*figsize)
+        if colors is None:
+            cmap = plt.get_cmap(self.cmap, max(len(rooms), 1))
+            colors = [cmap(i % cmap.N) for i in range(len(rooms))]
+
+        for i, room in enumerate(rooms):
+            start, end = segments.get(room, ((), ()))
+            x0 = mdates.date2num(np.asarray(start, dtype='datetime64[ns]'))
+            x1 = mdates.date2num(np.asarray(end, dtype='datetime64[ns]'))
+            lines = np.empty((x0.size, 2, 2))
+            lines[:, 0, 0], lines[:, 1, 0] = x0, x1
+            lines[:, :, 1] = i
+            row = self._row(i)
+            row.set_segments(lines)
+            row.set_color(colors[i])
+            row.set_visible(True)
+        for row in self.rows[len(rooms):]:
+            row.set_visible(False)
+
+        ax.set_yticks(range(len(rooms)))
+        ax.set_yticklabels(rooms)
+        ax.set_ylim(-0.5, max(len(rooms), 1) - 0.5)
+        ax.grid(False)
+        ax.grid(axis='x', linestyle='--', alpha=grid_alpha)
+        ax.set_title(title, fontsize=title_size)
+        ax.set_xlabel('Time of Day', fontsize=label_size)
+        ax.set_ylabel('Room', fontsize=label_size)
+
+        ax.xaxis.set_major_locator(mdates.HourLocator(interval=hour_interval))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+        midnight = mdates.date2num(pd.Timestamp(day))
+        ax.set_xlim(midnight, midnight + 1)
+        ax.tick_params(axis='x', labelrotation=rotate_xticks)
+
+        if ax.get_legend() is not None:
+            ax.get_legend().remove()
+        if legend and rooms:
+            # One entry per room name, from the room list rather than the drawn artists
+            by_label = {}
+            for i, room in enumerate(rooms):
+                by_label.setdefault(room, Line2D([], [], linewidth=self.linewidth, color=colors[i]))
+            if len(by_label) > 10:  # If there are many rooms, place legend outside
+                ax.legend(by_label.values(), by_label.keys(), loc='center left', bbox_to_anchor=(1, 0.5))
+            else:
+                ax.legend(by_label.values(), by_label.keys(), loc='best')
+
+        self.figure.tight_layout()
+        self.figure.savefig(output_path)
+
+
+# Content hashes of the rendered images, kept next to them in the output directory
+MANIFEST_NAME = 'timeline_manifest.json'
+
+
+def content_hash(rooms, segments, *params):
+    """
+    Hash of everything an image shows: its rooms, their periods and any render params.
+    """
+    h = hashlib.sha1(repr(params).encode('utf-8'))
+    for room in rooms:
+        h.update(str(room).encode('utf-8') + b'\0')
+        for values in segments.get(room, ((), ())):
+            values = np.asarray(values, dtype='datetime64[ns]').view(np.int64)
+            h.update(np.int64(values.size).tobytes())
+            h.update(np.ascontiguousarray(values).tobytes())
+    return h.hexdigest()
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def unchanged(manifest, output_dir, name, digest):
+    """
+    True when output_dir/name exists and was rendered from content with this digest.
+    """
+    return manifest.get(name) == digest and os.path.exists(os.path.join(output_dir, name))
+
+
+def run_render_jobs(render, jobs, max_workers=1):
+    """
+    Call render(chunk) on contiguous chunks of jobs, here or spread over a process pool.
+
+    Args:
+        render (callable): Module-level function rendering a list of jobs, returns the names rendered
+        jobs (list): Picklable job tuples
+        max_workers (int, optional): 1 renders in this process, None uses one process per core
+
+    Returns:
+        list: Names rendered by the chunks that succeeded
+    """
+    if not jobs:
+        return []
+    if max_workers == 1:
+        return list(render(jobs))
+
+    n_chunks = min(len(jobs), 4 * (max_workers or os.cpu_count() or 1))
+    chunks = [chunk for chunk in np.array_split(np.arange(len(jobs)), n_chunks) if chunk.size]
+    done = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(render, [jobs[i] for i in chunk]) for chunk in chunks]
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                done.extend(future.result())
+            except Exception as e:
+                print(f"Error rendering timelines: {e}")
+    return done
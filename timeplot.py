@@ -1,175 +1,190 @@
 import os
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 import glob
-from datetime import datetime, timedelta
-from matplotlib.cm import get_cmap
+import concurrent.futures
+from datetime import timedelta
+
+from areas import get_registry
+from daybounds import stamps_to_ns
+from dwell import DAY_NS, dwell_intervals
+from event_cache import load_events
+from sleep_windows import day_windows, window_of
+from timeline import (
+    TimelineRenderer, content_hash, load_manifest, run_render_jobs, save_manifest, unchanged
+)
 
 from self_script import (
-    NON_AREAS, TRACKING, standard_tracking_areas, area_mapping,
-    extract_patient_number, modified_tracking_logic, standard_tracking_logic, sleep_dict
+    NON_AREAS, TRACKING, standard_tracking_areas,
+    extract_patient_number, night_dwells
 )
+from shared_state import get_state, init_worker
 
-def load_and_track_dwell(file_path, min_duration_seconds=90):
-    df = pd.read_csv(
-        file_path,
-        usecols=['stamp', 'areaid', 'event'],
-        dtype={'areaid': 'int32', 'event': 'int8'}
-    )
-
-    df['stamp'] = pd.to_datetime(df['stamp'], errors='coerce')
-    df = df.dropna(subset=['stamp'])
-
-    df = df[~df['areaid'].isin(NON_AREAS)]
-    df['date'] = df['stamp'].dt.date
-    df = df.sort_values(['date', 'areaid', 'stamp'])
-    df['area_name'] = df['areaid'].map(area_mapping).fillna(df['areaid'].apply(lambda x: f'Area_{x}'))
+# Bedroom sleep windows of days without sleep_summary records, as offsets from midnight
+DEFAULT_SLEEP_WINDOWS = [
+    (timedelta(hours=0), timedelta(hours=6)),                                             # 00:00:00 - 06:00:00
+    (timedelta(hours=21), timedelta(hours=23, minutes=59, seconds=59, microseconds=999999)),  # 21:00:00 - end of day
+]
 
+def load_and_track_dwell(file_path, min_duration_seconds=90):
     patient_id = extract_patient_number(file_path)
     if not patient_id:
         return []
+    return track_dwell(load_events(file_path), patient_id, min_duration_seconds)
+
+def track_dwell(df, patient_id, min_duration_seconds=90, dwells=None):
+    """
+    Timeline dwell intervals of one home.
+
+    Args:
+        df (pd.DataFrame): Events with 'stamp' (UTC), 'areaid' and 'event'
+        patient_id (str or int): Homeid of the events
+        min_duration_seconds (float): Shorter dwells are dropped
+        dwells (dict, optional): self_script.standard_dwells of the room events of df when already
+            computed; only its bathroom and kitchen dwells are used
+
+    Returns:
+        list: One dict per dwell with subid, area_name, stamp_start, stamp_end and date
+    """
+    df = df[~df['areaid'].isin(NON_AREAS)].copy()
+    df['date'] = df['stamp'].dt.date
+    df = df.sort_values(['date', 'areaid', 'stamp'])
 
-    dwell_data = []
-
-    for (date, areaid), group in df.groupby(['date', 'areaid']):
-        area_name = group['area_name'].iloc[0]
-        end_of_day = datetime.combine(date, datetime.max.time()).replace(hour=23, minute=59, second=59)
-
-        group = group.sort_values('stamp').reset_index(drop=True)
-
-        if areaid in standard_tracking_areas:
-            start, stop = standard_tracking_logic(group, areaid, end_of_day)
-        elif areaid in TRACKING:
-            sleep_key = (int(patient_id), pd.to_datetime(date).date())
-            prev_sleep_key = (int(patient_id), (pd.to_datetime(date) - timedelta(days=1)).date())
-            sleep_windows = []
-
-            if sleep_key in sleep_dict:
-                for record in sleep_dict[sleep_key]:
-                    raw_start = pd.to_datetime(record['start_sleep'], errors='coerce')
-                    raw_end = pd.to_datetime(record['end_sleep'], errors='coerce')
-                    if pd.notna(raw_start) and pd.notna(raw_end):
-                        sleep_windows.append((raw_start, raw_end))
-
-            if prev_sleep_key in sleep_dict:
-                for record in sleep_dict[prev_sleep_key]:
-                    raw_start = pd.to_datetime(record['start_sleep'], errors='coerce')
-                    raw_end = pd.to_datetime(record['end_sleep'], errors='coerce')
-                    if pd.notna(raw_start) and pd.notna(raw_end) and raw_end.date() == date:
-                        sleep_windows.append((raw_start, raw_end))
-
-            if not sleep_windows:
-                sleep_windows = [
-                    (datetime.combine(date, datetime.min.time()), datetime.combine(date, datetime.min.time()).replace(hour=6)),
-                    (datetime.combine(date, datetime.min.time()).replace(hour=21), end_of_day)
-                ]
-
-            # Track night time
-            for sleep_start, sleep_end in sleep_windows:
-                night_data = group[(group['stamp'] >= sleep_start) & (group['stamp'] <= sleep_end)]
-                if not night_data.empty:
-                    start, stop = modified_tracking_logic(night_data, areaid, sleep_end)
-                    for s1, s2 in zip(start, stop):
-                        duration = (s2 - s1).total_seconds()
-                        if duration >= min_duration_seconds:
-                            dwell_data.append({
-                                'subid': int(patient_id),
-                                'area_name': area_name,
-                                'stamp_start': s1,
-                                'stamp_end': s2,
-                                'date': date
-                            })
-
-            # Track day time outside sleep windows
-            day_data = group.copy()
-            for sleep_start, sleep_end in sleep_windows:
-                mask = (day_data['stamp'] >= sleep_start) & (day_data['stamp'] <= sleep_end)
-                day_data = day_data[~mask]
-
-            if not day_data.empty:
-                start, stop = standard_tracking_logic(day_data, areaid, end_of_day)
-                for s1, s2 in zip(start, stop):
-                    duration = (s2 - s1).total_seconds()
-                    if duration >= min_duration_seconds:
-                        dwell_data.append({
-                            'subid': int(patient_id),
-                            'area_name': area_name,
-                            'stamp_start': s1,
-                            'stamp_end': s2,
-                            'date': date
-                        })
-            continue
-        else:
-            continue
-
-        for s1, s2 in zip(start, stop):
-            duration = (s2 - s1).total_seconds()
-            if duration >= min_duration_seconds:
-                dwell_data.append({
-                    'subid': int(patient_id),
-                    'area_name': area_name,
-                    'stamp_start': s1,
-                    'stamp_end': s2,
-                    'date': date
-                })
-
-    return dwell_data
-
-def plot_daily_timelines(dwell_df, output_dir='daily_timelines'):
+    stamps = stamps_to_ns(df['stamp'])
+    day = stamps // DAY_NS
+    areaid = df['areaid'].values.astype(np.int64)
+    event = df['event'].values
+    cap = int(timedelta(minutes=5).total_seconds()) * 10**9
+
+    # Bathrooms and kitchens: standard tracking
+    std = np.isin(areaid, standard_tracking_areas)
+    if dwells is None:
+        parts = [dwell_intervals(stamps[std], areaid[std], event[std], day[std], leading='keep', trailing='cap', cap=cap)]
+    else:
+        parts = [{key: values[np.isin(dwells['areaid'], standard_tracking_areas)] for key, values in dwells.items()}]
+
+    # Bedrooms: the day's sleep windows plus the previous day's windows ending on it, else
+    # the defaults; night dwells inside them, standard tracking for the events outside them
+    bed = np.flatnonzero(np.isin(areaid, TRACKING))
+    state = get_state()
+    subids = state.subids(int(patient_id))
+    windows = day_windows(
+        state.sleep_entry(subids[0]) if subids else None, day[bed], DEFAULT_SLEEP_WINDOWS, previous_day=True
+    )
+    parts.append(night_dwells(stamps[bed], areaid[bed], event[bed], day[bed], windows))
+    awake = bed[window_of(stamps[bed], day[bed], windows) < 0]
+    parts.append(dwell_intervals(
+        stamps[awake], areaid[awake], event[awake], day[awake], leading='keep', trailing='cap', cap=cap
+    ))
+
+    dwells = {key: np.concatenate([p[key] for p in parts]) for key in ('areaid', 'start', 'stop', 'day')}
+    keep = (dwells['stop'] - dwells['start']) / 1e9 >= min_duration_seconds
+    registry = get_registry()
+    return [
+        {
+            'subid': int(patient_id),
+            'area_name': registry.name(a),
+            'stamp_start': pd.Timestamp(s1),
+            'stamp_end': pd.Timestamp(s2),
+            'date': pd.Timestamp(d * DAY_NS).date(),
+        }
+        for a, s1, s2, d in zip(
+            dwells['areaid'][keep], dwells['start'][keep], dwells['stop'][keep], dwells['day'][keep]
+        )
+    ]
+
+_renderer = None
+
+def _render_timelines(jobs):
+    global _renderer
+    if _renderer is None:
+        # One figure per process, reused for every (subid, date)
+        _renderer = TimelineRenderer()
+    done = []
+    for name, output_path, date, rooms, segments, title, colors, figsize in jobs:
+        _renderer.render(
+            date, rooms, segments, output_path, title,
+            colors=colors, figsize=figsize, hour_interval=2, grid_alpha=0.5, legend=False,
+        )
+        done.append(name)
+    return done
+
+def plot_daily_timelines(dwell_df, output_dir='daily_timelines', max_workers=1, force=False):
+    """
+    Render one timeline per (subid, date), skipping those whose dwell intervals are unchanged.
+
+    A content hash of every image's intervals (and colors) is kept in output_dir, so after a new
+    data pull only the days that actually changed are rendered again.
+
+    Args:
+        dwell_df (pd.DataFrame): Records from load_and_track_dwell
+        output_dir (str): Directory of the timeline pngs
+        max_workers (int, optional): Render in this many processes; None uses one per core
+        force (bool): Re-render every image even if unchanged
+
+    Returns:
+        int: Number of images rendered
+    """
     os.makedirs(output_dir, exist_ok=True)
     dwell_df['stamp_start'] = pd.to_datetime(dwell_df['stamp_start'])
     dwell_df['stamp_end'] = pd.to_datetime(dwell_df['stamp_end'])
 
     unique_rooms = dwell_df['area_name'].unique()
-    cmap = get_cmap("tab20", len(unique_rooms))
+    cmap = plt.get_cmap("tab20", len(unique_rooms))
     color_map = {room: cmap(i) for i, room in enumerate(unique_rooms)}
 
+    manifest = {} if force else load_manifest(output_dir)
+    jobs = []
+    digests = {}
     for (subid, date), group in dwell_df.groupby(['subid', 'date']):
         rooms = sorted(group['area_name'].unique())
-        room_to_y = {room: idx for idx, room in enumerate(rooms)}
-
-        plt.figure(figsize=(14, max(5, len(rooms) * 0.4)))
-        for _, row in group.iterrows():
-            y = room_to_y[row['area_name']]
-            plt.hlines(y=y, xmin=row['stamp_start'], xmax=row['stamp_end'], linewidth=6, color=color_map.get(row['area_name'], 'gray'))
-
-        plt.yticks(list(room_to_y.values()), list(room_to_y.keys()))
-        plt.gca().xaxis.set_major_locator(mdates.HourLocator(interval=2))
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-
-        start_time = datetime.combine(date, datetime.min.time())
-        end_time = start_time + timedelta(days=1)
-        plt.xlim(start_time, end_time)
-
-        plt.title(f'Subject {subid} – Room Occupancy Timeline ({date})')
-        plt.xlabel('Time of Day')
-        plt.ylabel('Room')
-        plt.grid(axis='x', linestyle='--', alpha=0.5)
-        plt.tight_layout()
-
-        filename = f"{output_dir}/timeline_sub{subid}_{date}.png"
-        plt.savefig(filename)
-        plt.close()
-
-def main(input_dir):
+        segments = {
+            room: (rows['stamp_start'].values, rows['stamp_end'].values)
+            for room, rows in group.groupby('area_name')
+        }
+        colors = [color_map.get(room, 'gray') for room in rooms]
+        name = f"timeline_sub{subid}_{date}.png"
+        title = f'Subject {subid} – Room Occupancy Timeline ({date})'
+        figsize = (14, max(5, len(rooms) * 0.4))
+        digests[name] = content_hash(rooms, segments, title, colors, figsize)
+        if not unchanged(manifest, output_dir, name, digests[name]):
+            jobs.append((name, f"{output_dir}/{name}", date, rooms, segments, title, colors, figsize))
+
+    done = run_render_jobs(_render_timelines, jobs, max_workers)
+
+    skipped = set(digests) - {job[0] for job in jobs}
+    manifest.update({name: digests[name] for name in list(done) + list(skipped)})
+    save_manifest(output_dir, manifest)
+    print(f"Rendered {len(done)} timelines, {len(skipped)} unchanged")
+    return len(done)
+
+def main(input_dir, output_dir='daily_timelines', max_workers=None, force=False):
     pattern = os.path.join(input_dir, "*NYCE_Area_Data_DETECT_*.csv")
-    files = glob.glob(pattern)
-
-    all_dwell_records = []
-
-    for f in files:
-        print(f"Processing {os.path.basename(f)}...")
-        dwell_records = load_and_track_dwell(f)
-        all_dwell_records.extend(dwell_records)
-
+    files = sorted(glob.glob(pattern))
+
+    # Dwell extraction per home in parallel; workers map the parent's subject/sleep state
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, initializer=init_worker, initargs=(get_state().entry,)
+    ) as executor:
+        futures = {executor.submit(load_and_track_dwell, f): f for f in files}
+        for future in concurrent.futures.as_completed(futures):
+            f = futures[future]
+            print(f"Processed {os.path.basename(f)}")
+            try:
+                results[f] = future.result()
+            except Exception as e:
+                print(f"Error processing {f}: {e}")
+
+    all_dwell_records = [record for f in files for record in results.get(f, [])]
     if not all_dwell_records:
         print("No dwell records found.")
         return
 
     dwell_df = pd.DataFrame(all_dwell_records)
-    plot_daily_timelines(dwell_df)
-    print("Timeline plots saved to 'daily_timelines/'")
+    plot_daily_timelines(dwell_df, output_dir, max_workers=max_workers, force=force)
+    print(f"Timeline plots saved to '{output_dir}/'")
 
 if __name__ == "__main__":
     input_dir = r"C:\Users\nguyphu2\Desktop\OHSU_data\NYCE_Data_Pull_DETECT_2024-09-23 - Copy"